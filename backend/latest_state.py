@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class LatestState:
+    """
+    Last observation of every (producto, ciudad) pair, built once per dataset snapshot.
+
+    Arrays are aligned with the pair codes of the SeriesIndex. Pairs are also grouped
+    by city, so ranking the products of one city only touches that city's pairs.
+    """
+
+    def __init__(self, pair_product, pair_city, fecha, price, signal, score, n_cities):
+        self.pair_product = pair_product  # product code of every pair
+        self.pair_city = pair_city        # city code of every pair
+        self.fecha = fecha                # last capture date
+        self.price = price                # last price
+        self.signal = signal              # last moving-average signal (1 alza, 0 baja, NaN unknown)
+        self.score = score                # ranking score, higher first
+
+        # Pairs of city c are city_pairs[city_offsets[c]:city_offsets[c + 1]]
+        self.city_pairs = np.argsort(pair_city, kind='stable')
+        self.city_offsets = np.searchsorted(pair_city[self.city_pairs], np.arange(n_cities + 1))
+
+    def __len__(self):
+        return len(self.pair_product)
+
+    def top_pairs(self, city_code, limit, offset=0):
+        """
+        Pair codes of one city ranked by descending score (ties by product), positions
+        [offset, offset + limit). Only the first offset + limit candidates are sorted.
+        """
+        candidates = self.city_pairs[self.city_offsets[city_code]:self.city_offsets[city_code + 1]]
+        k = min(offset + limit, len(candidates))
+        if k <= offset:
+            return candidates[:0]
+        # Negated scores so an ascending partition puts the best k first; NaN sorts last
+        keys = -self.score[candidates]
+        if k < len(candidates):
+            candidates = candidates[np.argpartition(keys, k - 1)[:k]]
+            keys = -self.score[candidates]
+        order = np.lexsort((self.pair_product[candidates], keys))
+        return candidates[order][offset:k]
+
+
+def build_latest_state(data, series_index):
+    """
+    Builds the latest state table from an analyzed frame.
+
+    The score is the relative gap between the short and long moving averages, so pairs
+    with the strongest current trend in either direction rank first.
+    Args:
+        data (pd.DataFrame): Frame indexed by `series_index` (sorted by producto, ciudad and
+            fechaCaptura), with the columns added by `compute_indicators`.
+        series_index (SeriesIndex): Offsets of its (producto, ciudad) pairs.
+    Returns:
+        LatestState: One row per pair.
+    """
+    last_rows = np.asarray(series_index.pair_offsets[1:], dtype=np.int64) - 1
+
+    def last(column):
+        if column not in data.columns:
+            return np.full(len(last_rows), np.nan)
+        # Take the rows first: converting whole columns costs as much as the frame
+        return data[column].iloc[last_rows].to_numpy(dtype=np.float64, na_value=np.nan)
+
+    short_ma, long_ma = last('short_ma'), last('long_ma')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        score = np.abs(short_ma / long_ma - 1)
+
+    fecha = data['fechaCaptura'].iloc[last_rows].to_numpy() if 'fechaCaptura' in data.columns else None
+    return LatestState(
+        pair_product=np.asarray(series_index.pair_product, dtype=np.int64),
+        pair_city=np.asarray(series_index.pair_city, dtype=np.int64),
+        fecha=fecha,
+        price=last('precioPromedio'),
+        signal=last('signal'),
+        score=score,
+        n_cities=len(series_index.cities),
+    )
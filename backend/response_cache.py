@@ -0,0 +1,74 @@
+import threading
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    LRU cache of encoded response bodies, bounded by their total size in bytes.
+
+    Keys are (endpoint, params, version) tuples. Bumping the version with
+    `set_version` drops every entry built from the previous dataset, and bodies
+    computed against an old version are never stored.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def key(self, endpoint, params, version):
+        return (endpoint, tuple(sorted(params.items())), version)
+
+    def get(self, key):
+        """Returns the cached body for a key, or None on a miss."""
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body):
+        """Stores a body, evicting least recently used entries to stay under budget."""
+        with self._lock:
+            if key[-1] != self.version or len(body) > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._entries[key] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def set_version(self, version):
+        """Switches to a new dataset version, dropping all entries of the old one."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
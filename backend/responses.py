@@ -0,0 +1,115 @@
+import io
+import json
+
+import numpy as np
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+
+# Response layouts: a list of row objects (the default), parallel arrays, or an Arrow IPC stream
+FORMATS = ('records', 'columnar', 'arrow')
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_COMPRESSIONS = ('zstd', 'lz4')
+
+
+class Table(dict):
+    """
+    Columns of a response as equal-length NumPy arrays, in output order.
+
+    Endpoints return a Table (or a dict of Tables) instead of a list of dicts, and
+    `encode_response` lays it out in the format the client asked for.
+    """
+
+    @property
+    def n_rows(self):
+        return len(next(iter(self.values()))) if self else 0
+
+
+def negotiate_format(accept=None, requested=None):
+    """
+    The response format: an explicit `format` query value, else Arrow when the Accept
+    header asks for it, else records.
+    Raises:
+        ValueError: If the requested format is unknown.
+    """
+    if requested is not None:
+        if requested not in FORMATS:
+            raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+        return requested
+    if accept and ARROW_MEDIA_TYPE in accept:
+        return 'arrow'
+    return 'records'
+
+
+def media_type(fmt):
+    return ARROW_MEDIA_TYPE if fmt == 'arrow' else "application/json"
+
+
+def _json_values(values):
+    # Whole-column conversion to Python values; dates become ISO strings
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        unit = 'D' if values.dtype == np.dtype('datetime64[D]') else 'auto'
+        return np.datetime_as_string(values, unit=unit).tolist()
+    return values.tolist()
+
+
+def _records(table):
+    # Row objects built from whole columns, without touching NumPy scalars row by row
+    names = list(table)
+    return [dict(zip(names, row)) for row in zip(*(_json_values(values) for values in table.values()))]
+
+
+def _to_json(result, columnar):
+    if isinstance(result, Table):
+        if columnar:
+            return {name: _json_values(values) for name, values in result.items()}
+        return _records(result)
+    if isinstance(result, dict):
+        return {key: _to_json(value, columnar) for key, value in result.items()}
+    return jsonable_encoder(result)
+
+
+def _column(values):
+    values = np.asarray(values)
+    if values.dtype.kind in 'OU':
+        return pa.array(values.tolist(), type=pa.string())
+    return pa.array(values)
+
+
+def _struct_list(table):
+    # One list value holding a whole Table, for responses made of several tables
+    struct = pa.StructArray.from_arrays([_column(values) for values in table.values()], names=list(table))
+    return pa.ListArray.from_arrays(pa.array([0, table.n_rows], type=pa.int32()), struct)
+
+
+def _to_arrow(result):
+    if isinstance(result, Table):
+        return pa.table({name: _column(values) for name, values in result.items()})
+    if isinstance(result, dict) and result and all(isinstance(value, Table) for value in result.values()):
+        # A single row with one list<struct> column per table
+        return pa.table({key: _struct_list(value) for key, value in result.items()})
+    if isinstance(result, list):
+        return pa.Table.from_pylist(result)
+    raise TypeError(f"cannot encode {type(result).__name__} as Arrow")
+
+
+def encode_response(result, fmt='records', compression=None):
+    """
+    Encodes an endpoint result.
+    Args:
+        result: A Table, a dict of Tables or of other JSON values, or plain JSON values.
+        fmt (str): 'records' (Tables become lists of row objects), 'columnar' (Tables become
+            objects of parallel arrays) or 'arrow' (an Arrow IPC stream).
+        compression (str): Arrow buffer compression, 'zstd' or 'lz4' (Arrow only).
+    Returns:
+        bytes: The response body.
+    """
+    if fmt == 'arrow':
+        table = _to_arrow(result)
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    return json.dumps(_to_json(result, fmt == 'columnar'), ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
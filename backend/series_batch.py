@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+# Most (product, city) pairs one batch request may ask for
+MAX_BATCH_PAIRS = 500
+
+
+def parse_date_range(start=None, end=None):
+    """
+    Parses optional YYYY-MM-DD bounds, both inclusive.
+    Returns:
+        tuple: (first day, day after the last one) as Timestamps or None.
+    Raises:
+        ValueError: If a bound is not a date, or start is after end.
+    """
+    first = pd.Timestamp(start).normalize() if start is not None else None
+    stop = pd.Timestamp(end).normalize() + pd.Timedelta(days=1) if end is not None else None
+    if first is not None and stop is not None and first >= stop:
+        raise ValueError("start is after end")
+    return first, stop
+
+
+def _as_column_time(bound, dates):
+    # Bounds are local calendar days; compare them in the time zone of the capture dates
+    if bound is None or dates.tz is None:
+        return bound
+    return bound.tz_localize(dates.tz)
+
+
+def iter_series_ndjson(current, pairs, start=None, end=None):
+    """
+    Encodes the daily prices of many (product, city) pairs as NDJSON, one line per pair
+    in request order, yielding each line as soon as it is encoded.
+
+    Every pair is a positional slice of the snapshot frame found through its series
+    index, narrowed to the date range by binary search, so no line scans the frame and
+    only one series is held in memory at a time.
+    Args:
+        current (DataSnapshot): Snapshot to read; fixed for the whole response.
+        pairs (list): (product_id, city) tuples.
+        start, end (pd.Timestamp): Bounds from `parse_date_range`.
+    Yields:
+        bytes: {"productId", "city", "dates", "prices"} or {"productId", "city", "error"} lines,
+        with null for missing prices.
+    """
+    products, series_index = current.products, current.series_index
+    dates = pd.DatetimeIndex(current.data['fechaCaptura'])
+    prices = current.data['precioPromedio'].to_numpy()
+    first, stop = _as_column_time(start, dates), _as_column_time(end, dates)
+
+    for product_id, city in pairs:
+        line = {"productId": product_id, "city": city}
+        rows = None
+        if 0 <= product_id < len(products):
+            rows = series_index.pair_slice(products[product_id], city)
+        if rows is None:
+            line["error"] = "No data found for this product and city"
+        else:
+            # Rows of a pair are in date order
+            series_dates = dates[rows]
+            lo = series_dates.searchsorted(first) if first is not None else 0
+            hi = series_dates.searchsorted(stop) if stop is not None else len(series_dates)
+            days = series_dates[lo:hi]
+            if days.tz is not None:
+                days = days.tz_localize(None)
+            line["dates"] = np.datetime_as_string(days.to_numpy(), unit='D').tolist()
+            values = np.round(prices[rows][lo:hi].astype(np.float64), 2)
+            # NaN and inf are not JSON, so missing prices are sent as null
+            missing = ~np.isfinite(values)
+            if missing.any():
+                values = values.astype(object)
+                values[missing] = None
+            line["prices"] = values.tolist()
+        yield json.dumps(line, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8") + b"\n"
@@ -0,0 +1,159 @@
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple, Optional, Sequence
+
+import pandas as pd
+
+from data_cleaning.clean_data import load_and_clean_data, load_cleaned_data
+from data_cleaning.schema import memory_report
+from analysis.indicators import compute_indicators
+from analysis.price_cube import PriceCube, build_price_cube
+from analysis.series_index import SeriesIndex, build_series_index
+from storage.analysis_snapshot import open_analysis_snapshot, source_signature, write_analysis_snapshot
+
+from latest_state import LatestState, build_latest_state
+
+API_COLUMNS = ['producto', 'ciudad', 'fechaCaptura', 'precioPromedio']
+
+
+class DataSnapshot(NamedTuple):
+    """
+    Everything the endpoints read, built together and never modified afterwards.
+    A reload builds a new snapshot and replaces the reference to the old one in a single
+    assignment, so a request sees either the old dataset or the new one, never a mix.
+    """
+    data: pd.DataFrame
+    products: List[str]
+    cities: List[str]
+    trend_params: pd.DataFrame
+    series_index: SeriesIndex
+    version: Optional[str]
+    loaded_at: Optional[datetime]
+    load_seconds: Optional[float]
+    # Defaults are shared by every snapshot built without the field, so they are immutable
+    sources: Sequence = ()
+    analysis_version: Optional[str] = None  # Precomputed analysis snapshot, when one was opened or written
+    latest: Optional[LatestState] = None  # Last observation of every pair, for the recommendations
+    price_cube: Optional[PriceCube] = None     # Prices of every pair by year and month
+    national_cube: Optional[PriceCube] = None  # Same rolled up to products over all cities
+    stage_seconds: Mapping = MappingProxyType({})  # Duration of each step of the build that produced this snapshot
+    data_bytes: int = 0       # Heap memory held by the frame
+    mapped_bytes: int = 0     # Columns read in place from the memory-mapped snapshot file
+
+
+def empty_snapshot():
+    return DataSnapshot(
+        data=pd.DataFrame(),
+        products=[],
+        cities=[],
+        trend_params=pd.DataFrame(),
+        series_index=build_series_index(pd.DataFrame(columns=['producto', 'ciudad'])),
+        version=None,
+        loaded_at=None,
+        load_seconds=None,
+    )
+
+
+def analysis_inputs(data_path, cleaned_path):
+    # The analyzed frame comes from the cleaned dataset, or from the raw CSV without one
+    return [cleaned_path] if os.path.exists(cleaned_path) else [data_path]
+
+
+@contextmanager
+def timed_stage(stages, name):
+    # Records the duration of a build step in `stages`
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stages[name] = time.perf_counter() - start
+
+
+def build_snapshot(data_path, cleaned_path, params_path, snapshot_dir=None):
+    """
+    Opens or builds the dataset snapshot served by the API. Runs off the event loop.
+
+    The analyzed frame and its series index are memory-mapped from the precomputed
+    snapshot in `snapshot_dir` (written by run_analysis.py) when it was computed from the
+    current inputs. Otherwise they are recomputed, and written there for the next start.
+    Args:
+        data_path (str): Raw CSV, cleaned on the fly when there is no cleaned dataset.
+        cleaned_path (str): Cleaned Parquet dataset written by data_cleaning/clean_data.py.
+        params_path (str): ARIMA parameter CSV.
+        snapshot_dir (str): Precomputed analysis snapshot directory (not used when None).
+    Returns:
+        DataSnapshot: The new snapshot.
+    """
+    start = time.perf_counter()
+    stages = {}
+    sources = source_signature([cleaned_path, data_path, params_path])
+    inputs = source_signature(analysis_inputs(data_path, cleaned_path))
+
+    opened = None
+    if snapshot_dir:
+        with timed_stage(stages, 'open_analysis_snapshot'):
+            opened = open_analysis_snapshot(snapshot_dir, inputs)
+    if opened is not None:
+        data, series_index, manifest, mapped_bytes = opened
+        analysis_version = manifest['version']
+    else:
+        mapped_bytes = 0
+        if os.path.exists(cleaned_path):
+            # Only the columns the endpoints use, with categorical product and city
+            with timed_stage(stages, 'load_cleaned_data'):
+                data = load_cleaned_data(cleaned_path, columns=API_COLUMNS)
+        else:
+            with timed_stage(stages, 'load_and_clean_data'):
+                data = load_and_clean_data(data_path)
+
+        # Perform all necessary analysis (inflation, moving averages, anomalies, RSI)
+        with timed_stage(stages, 'compute_indicators'):
+            data = compute_indicators(data)
+
+        # Index the contiguous (producto, ciudad) blocks so lookups are slices
+        with timed_stage(stages, 'build_series_index'):
+            series_index = build_series_index(data)
+        analysis_version = None
+        if snapshot_dir:
+            try:
+                with timed_stage(stages, 'write_analysis_snapshot'):
+                    analysis_version = write_analysis_snapshot(data, snapshot_dir, inputs)['version']
+            except OSError as e:
+                print(f"Could not write the analysis snapshot: {e}")
+
+    with timed_stage(stages, 'build_latest_state'):
+        latest = build_latest_state(data, series_index)
+    with timed_stage(stages, 'build_price_cube'):
+        price_cube = build_price_cube(data, series_index.row_pair_codes(), series_index.n_pairs)
+        national_cube = price_cube.rollup(series_index.pair_product, len(series_index.products))
+    with timed_stage(stages, 'read_trend_params'):
+        trend_params = pd.read_csv(params_path)
+    products = [str(name) for name in series_index.products]
+    cities = [str(name) for name in series_index.cities]
+
+    loaded_at = datetime.now()
+    load_seconds = round(time.perf_counter() - start, 3)
+    origin = "opened from snapshot" if opened is not None else "computed"
+    print(f"Data {origin} in {load_seconds}s. {len(products)} products and {len(cities)} cities.")
+    print(memory_report(data))
+    return DataSnapshot(
+        data=data,
+        products=products,
+        cities=cities,
+        trend_params=trend_params,
+        series_index=series_index,
+        version=loaded_at.strftime("%Y%m%d%H%M%S%f"),
+        loaded_at=loaded_at,
+        load_seconds=load_seconds,
+        sources=sources,
+        analysis_version=analysis_version,
+        latest=latest,
+        price_cube=price_cube,
+        national_cube=national_cube,
+        stage_seconds=stages,
+        data_bytes=int(data.memory_usage(deep=True).sum()) - mapped_bytes,
+        mapped_bytes=mapped_bytes,
+    )
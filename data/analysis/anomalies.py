@@ -1,11 +1,12 @@
 import pandas as pd
 import numpy as np
 
+from analysis.indicators import PriceSegments
+
 def detect_anomalies(data, window_size=50):
     # Z-score based anomaly detection
-    data['z_score'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-        lambda x: (x - x.rolling(window=window_size, min_periods=10).mean()) /
-                  x.rolling(window=window_size, min_periods=10).std(ddof=0)
-    )
+    segments = PriceSegments(data)
+    z_score = segments.z_score(segments.gather(data['precioPromedio']), window_size)
+    data['z_score'] = segments.scatter(z_score)
     data['anomaly'] = data['z_score'].abs() > 2
     return data
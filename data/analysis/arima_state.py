@@ -0,0 +1,107 @@
+import hashlib
+import os
+import pickle
+
+import numpy as np
+from statsmodels.tsa.arima.model import ARIMA
+from statsmodels.tsa.statespace.initialization import Initialization
+
+
+def _state_path(state_dir, producto, ciudad):
+    # One file per pair; the digest keeps names filesystem-safe for accents and punctuation
+    digest = hashlib.sha1(f"{producto}\x1f{ciudad}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(state_dir, f"{digest}.pkl")
+
+
+def _digest(values):
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+def load_state(state_dir, producto, ciudad):
+    path = _state_path(state_dir, producto, ciudad)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as handle:
+            return pickle.load(handle)
+    except Exception as e:
+        print(f"Discarding unreadable ARIMA state {path}: {e}")
+        return None
+
+
+def save_state(state_dir, producto, ciudad, state):
+    os.makedirs(state_dir, exist_ok=True)
+    path = _state_path(state_dir, producto, ciudad)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as handle:
+        pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _compact_state(order, results, nobs, updates):
+    # Only what is needed to keep filtering: the parameters and the last predicted state
+    return {
+        "order": tuple(order),
+        "params": np.asarray(results.params),
+        "state": results.predicted_state[:, -1].copy(),
+        "state_cov": results.predicted_state_cov[:, :, -1].copy(),
+        "forecast": float(results.forecast(steps=1)[0]),
+        "nobs": nobs,
+        "updates": updates,
+    }
+
+
+def extend_results(state, new_values):
+    """
+    Filters new observations starting from a stored state, with the stored parameters.
+    Same as `results.extend(new_values)` on the original fit, without keeping the fit around.
+    """
+    model = ARIMA(new_values, order=state["order"])
+    model.ssm.initialization = Initialization(
+        model.k_states, "known", constant=state["state"], stationary_cov=state["state_cov"]
+    )
+    return model.filter(state["params"])
+
+
+def incremental_trend(producto, ciudad, series, order, state_dir, refit_every=30):
+    """
+    One-step ARIMA trend for a pair, reusing the fitted state stored in `state_dir`.
+
+    When the stored fit covers a prefix of `series`, the new observations are absorbed
+    by a Kalman filter update from the last predicted state (no re-estimation).
+    The model is re-estimated on the full history when there is no stored state, the
+    order changed, the already absorbed history was revised, or `refit_every` updates
+    have been applied since the last full fit.
+    Args:
+        producto, ciudad (str): Pair the series belongs to.
+        series (pd.Series): Full price history of the pair, in date order.
+        order (tuple): ARIMA (p, d, q) order.
+        state_dir (str): Directory holding one state file per pair.
+        refit_every (int): Number of incremental updates allowed before a full refit.
+    Returns:
+        float: Forecast for the next period minus the last observed price.
+    """
+    values = np.asarray(series, dtype=np.float64)
+    state = load_state(state_dir, producto, ciudad)
+
+    refit = (
+        state is None
+        or state["order"] != tuple(order)
+        or len(values) < state["nobs"]
+        or state["updates"] >= refit_every
+        or _digest(values[:state["nobs"]]) != state["digest"]
+    )
+
+    if refit:
+        results = ARIMA(values, order=order).fit()
+        state = _compact_state(order, results, len(values), updates=0)
+    elif len(values) > state["nobs"]:
+        results = extend_results(state, values[state["nobs"]:])
+        state = _compact_state(order, results, len(values), updates=state["updates"] + 1)
+    else:
+        # Nothing new arrived, the stored forecast is still current
+        return state["forecast"] - values[-1]
+
+    state["digest"] = _digest(values)
+    save_state(state_dir, producto, ciudad, state)
+    return state["forecast"] - values[-1]
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+
+def _level_codes(values, level):
+    # Position of every value in `level`, -1 when absent; categoricals map their few categories only
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        mapping = np.r_[level.get_indexer(values.cat.categories), -1]
+        return mapping[values.cat.codes.to_numpy()]  # code -1 (missing) picks the trailing -1
+    return level.get_indexer(values)
+
+
+def group_codes(data, keys, levels):
+    """
+    Code of every row of `data` combining its `keys` values, or -1 when one of them is
+    not in the matching level. Codes are positions in the product of the levels.
+    """
+    combined = np.zeros(len(data), dtype=np.int64)
+    missing = np.zeros(len(data), dtype=bool)
+    for key, level in zip(keys, levels):
+        codes = _level_codes(data[key], level)
+        missing |= codes < 0
+        combined = combined * len(level) + codes
+    combined[missing] = -1
+    return combined
+
+
+def broadcast_table(data, table, keys, columns):
+    """
+    Values of `table` for every row of `data`, matched on the `keys` columns: a left merge
+    that returns the new columns only, so the frame itself is never copied.
+    Args:
+        data (pd.DataFrame): Frame to broadcast to.
+        table (pd.DataFrame): One row per combination of keys (e.g. per pair or per month).
+        keys (list): Columns present in both.
+        columns (list): Columns of `table` to broadcast.
+    Returns:
+        dict: One array per column aligned with `data`, NaN (or None) where no row of
+        `table` matches, as in a left merge.
+    Raises:
+        ValueError: If `table` has several rows for one combination of keys.
+    """
+    levels = [pd.Index(pd.unique(table[key].to_numpy())) for key in keys]
+    table_codes = group_codes(table, keys, levels)
+    if len(np.unique(table_codes)) != len(table_codes):
+        raise ValueError(f"table has repeated {keys} combinations")
+
+    # Dense lookup from combined code to table row (levels are small: products, cities, months)
+    lookup = np.full(int(np.prod([len(level) for level in levels])) + 1, -1, dtype=np.int64)
+    lookup[table_codes] = np.arange(len(table))
+    positions = lookup[group_codes(data, keys, levels)]  # code -1 hits the trailing -1
+    matched = positions >= 0
+
+    result = {}
+    for column in columns:
+        values = table[column].to_numpy()
+        if not matched.all():
+            # Unmatched rows need a missing value, as in a merge
+            if values.dtype.kind != 'f':
+                values = values.astype(np.float64 if values.dtype.kind in 'biu' else object)
+            values = np.append(values, np.array([np.nan], dtype=values.dtype))
+        result[column] = values[positions]
+    return result
@@ -0,0 +1,251 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis.indicators import INDICATOR_COLUMNS, PriceSegments, compute_indicators
+
+# Windows of `compute_indicators`; a state only updates indicators computed with its own windows
+DEFAULT_WINDOWS = {'short_window': 10, 'long_window': 50, 'vol_window': 30, 'z_window': 50, 'rsi_window': 14}
+
+
+def history_length(windows):
+    """
+    Rows of history every new row needs: the longest window, and the RSI window plus
+    the row its first price change is taken from. The crossover of a new row looks at
+    the signal of the previous row, whose window also ends inside this history.
+    """
+    return max(windows['short_window'], windows['long_window'], windows['vol_window'],
+               windows['z_window'], windows['rsi_window'] + 1)
+
+
+class IndicatorState:
+    """
+    Compact rolling state of every (producto, ciudad) pair: its last `length` prices,
+    right-aligned in a dense array, its last non-missing price (the daily inflation
+    compares to it even when it is older than the kept history) and the capture date of
+    its last row, which tells the rows a daily update still has to apply.
+    """
+
+    def __init__(self, producto, ciudad, tail, tail_len, last_valid, windows, last_date=None, date_tz=None):
+        self.producto = np.asarray(producto, dtype=str)
+        self.ciudad = np.asarray(ciudad, dtype=str)
+        self.tail = tail              # (pairs, length) prices, NaN before the first kept row
+        self.tail_len = tail_len      # kept rows of every pair
+        self.last_valid = last_valid  # last non-missing price, NaN if none yet
+        self.windows = dict(windows)
+        # UTC capture date of the last row of every pair (NaT when unknown), and the
+        # time zone of the capture dates of the data
+        if last_date is None:
+            last_date = np.full(len(self.producto), np.datetime64('NaT'), dtype='datetime64[ns]')
+        self.last_date = np.asarray(last_date, dtype='datetime64[ns]')
+        self.date_tz = date_tz or None
+        self.index = pd.MultiIndex.from_arrays([self.producto, self.ciudad])
+
+    @property
+    def length(self):
+        return self.tail.shape[1]
+
+    def __len__(self):
+        return len(self.producto)
+
+    def latest_date(self):
+        """Latest capture date of the state, in the time zone of the data (None if unknown)."""
+        dates = self.last_date[~np.isnat(self.last_date)]
+        if not len(dates):
+            return None
+        latest = pd.Timestamp(dates.max(), tz='UTC')
+        return latest.tz_convert(self.date_tz) if self.date_tz else latest.tz_localize(None)
+
+    def unseen_rows(self, data):
+        """
+        Rows of `data` captured after the last row of their pair in the state: those of pairs
+        the state has not seen and, for the others, those after its last capture date.
+        """
+        if not len(self):
+            return data
+        keys = pd.MultiIndex.from_arrays([data['producto'].astype(str), data['ciudad'].astype(str)])
+        codes = self.index.get_indexer(keys)
+        last = np.where(codes >= 0, self.last_date[np.maximum(codes, 0)], np.datetime64('NaT'))
+        dates = _utc_dates(data['fechaCaptura'])
+        return data[np.isnat(last) | (dates > last)]
+
+    def save(self, path):
+        """Writes the state to an .npz file, replacing it once complete."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            np.savez(handle, producto=self.producto, ciudad=self.ciudad, tail=self.tail, tail_len=self.tail_len,
+                     last_valid=self.last_valid, windows=np.array(json.dumps(self.windows)),
+                     last_date=self.last_date, date_tz=np.array(self.date_tz or ''))
+        os.replace(tmp_path, path)
+
+
+def load_indicator_state(path):
+    """Reads a state written by `IndicatorState.save`."""
+    with np.load(path, allow_pickle=False) as saved:
+        return IndicatorState(saved['producto'], saved['ciudad'], saved['tail'], saved['tail_len'],
+                              saved['last_valid'], json.loads(str(saved['windows'])),
+                              saved['last_date'], str(saved['date_tz']))
+
+
+def _utc_dates(values):
+    # Capture dates as naive UTC datetime64[ns], whatever their unit and time zone
+    dates = pd.to_datetime(values)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_convert('UTC').dt.tz_localize(None)
+    return dates.to_numpy(dtype='datetime64[ns]')
+
+
+def _date_tz(data):
+    # Time zone of the capture dates of a frame, None when it has none or no dates
+    if 'fechaCaptura' not in data.columns:
+        return None
+    tz = getattr(data['fechaCaptura'].dtype, 'tz', None)
+    return str(tz) if tz is not None else None
+
+
+def _last_dates(data, rows):
+    # UTC capture date of the given rows, NaT for all of them without a 'fechaCaptura' column
+    if 'fechaCaptura' not in data.columns:
+        return np.full(len(rows), np.datetime64('NaT'), dtype='datetime64[ns]')
+    return _utc_dates(data['fechaCaptura'].iloc[rows])
+
+
+def _segment_positions(counts):
+    # Start of every segment and the position of every row inside its segment
+    starts = np.r_[0, np.cumsum(counts)[:-1]].astype(np.int64)
+    within = np.arange(counts.sum(), dtype=np.int64) - np.repeat(starts, counts)
+    return starts, within
+
+
+def _tails(prices, counts, length):
+    # Last `length` values of every segment, right-aligned, with the number kept
+    starts, within = _segment_positions(counts)
+    from_end = np.repeat(counts, counts) - 1 - within
+    keep = from_end < length
+    tail = np.full((len(counts), length), np.nan)
+    tail[np.repeat(np.arange(len(counts)), counts)[keep], length - 1 - from_end[keep]] = prices[keep]
+    return tail, np.minimum(counts, length)
+
+
+def _last_valid(prices, counts):
+    # Last non-missing value of every segment (NaN when there is none)
+    segments = PriceSegments(pd.DataFrame({'pair': np.repeat(np.arange(len(counts)), counts)}), ('pair',))
+    filled = segments.ffill(prices)
+    ends = np.cumsum(counts) - 1
+    return np.where(counts > 0, filled[np.maximum(ends, 0)], np.nan)
+
+
+def build_indicator_state(data, **windows):
+    """
+    Builds the rolling state of every pair from a full price history.
+    Args:
+        data (pd.DataFrame): Frame with 'producto', 'ciudad' and 'precioPromedio' columns,
+            every pair in date order.
+        **windows: Windows of `compute_indicators` (defaults to DEFAULT_WINDOWS).
+    Returns:
+        IndicatorState: State ready for `update_indicators`.
+    """
+    windows = {**DEFAULT_WINDOWS, **windows}
+    segments = PriceSegments(data)
+    prices = segments.gather(data['precioPromedio'])
+    counts = np.diff(np.r_[np.flatnonzero(segments.is_start), len(prices)]).astype(np.int64)
+
+    first_rows = np.flatnonzero(segments.is_start)
+    last_rows = np.r_[first_rows[1:], len(prices)] - 1
+    if segments.order is not None:
+        first_rows, last_rows = segments.order[first_rows], segments.order[last_rows]
+    tail, tail_len = _tails(prices, counts, history_length(windows))
+    return IndicatorState(data['producto'].to_numpy()[first_rows], data['ciudad'].to_numpy()[first_rows],
+                          tail, tail_len, _last_valid(prices, counts), windows,
+                          _last_dates(data, last_rows), _date_tz(data))
+
+
+def empty_indicator_state(**windows):
+    """State without any pair, from which `update_indicators` computes a full history."""
+    windows = {**DEFAULT_WINDOWS, **windows}
+    return IndicatorState(np.empty(0, dtype=str), np.empty(0, dtype=str), np.empty((0, history_length(windows))),
+                          np.empty(0, dtype=np.int64), np.empty(0), windows)
+
+
+def update_indicators(state, new_rows):
+    """
+    Computes the indicators of newly appended rows from the rolling state, so the cost
+    depends on the new rows (plus one window of history per pair they touch) and not on
+    the full history. The values are those of `compute_indicators` over the full history,
+    bit for bit except the rolling standard deviations (volatility and z_score): pandas
+    accumulates them online, so the full recompute drifts slightly (around 1e-9 relative
+    after years of daily prices) while the update starts from a single window.
+    Args:
+        state (IndicatorState): State of every row seen so far.
+        new_rows (pd.DataFrame): Rows with 'producto', 'ciudad' and 'precioPromedio' columns
+            (and 'fechaCaptura' to keep the last dates of the state) that come after every
+            row of the state, each pair in date order; see `IndicatorState.unseen_rows`.
+            Pairs the state has not seen start a new history.
+    Returns:
+        tuple: (pd.DataFrame of the indicator columns with the index of `new_rows`,
+        IndicatorState including the new rows).
+    """
+    if new_rows.empty:
+        return pd.DataFrame({column: [] for column in INDICATOR_COLUMNS}, index=new_rows.index), state
+
+    keys = pd.MultiIndex.from_arrays([new_rows['producto'].astype(str), new_rows['ciudad'].astype(str)])
+    codes = state.index.get_indexer(keys)
+
+    producto, ciudad = state.producto, state.ciudad
+    tail, tail_len, last_valid = state.tail.copy(), state.tail_len.copy(), state.last_valid.copy()
+    last_date = state.last_date.copy()
+    unseen = codes < 0
+    if unseen.any():
+        added = keys[unseen].unique()
+        producto = np.r_[producto, added.get_level_values(0).to_numpy(dtype=str)]
+        ciudad = np.r_[ciudad, added.get_level_values(1).to_numpy(dtype=str)]
+        tail = np.vstack([tail, np.full((len(added), state.length), np.nan)])
+        tail_len = np.r_[tail_len, np.zeros(len(added), dtype=tail_len.dtype)]
+        last_valid = np.r_[last_valid, np.full(len(added), np.nan)]
+        last_date = np.r_[last_date, np.full(len(added), np.datetime64('NaT'), dtype=last_date.dtype)]
+        codes[unseen] = len(state) + added.get_indexer(keys[unseen])
+
+    order = np.argsort(codes, kind='stable')
+    new_prices = new_rows['precioPromedio'].to_numpy(dtype=np.float64, na_value=np.nan)[order]
+    touched, new_counts = np.unique(codes[order], return_counts=True)
+
+    # Kept history of the touched pairs followed by their new rows, one segment per pair
+    kept = tail_len[touched]
+    counts = kept + new_counts
+    starts, _ = _segment_positions(counts)
+    _, new_within = _segment_positions(new_counts)
+    new_positions = np.repeat(starts + kept, new_counts) + new_within
+    history = tail[touched][np.arange(state.length) >= (state.length - kept)[:, None]]
+    _, history_within = _segment_positions(kept)
+    prices = np.empty(counts.sum())
+    prices[np.repeat(starts, kept) + history_within] = history
+    prices[new_positions] = new_prices
+
+    frame = pd.DataFrame({'pair': np.repeat(np.arange(len(touched)), counts), 'precioPromedio': prices})
+    frame = compute_indicators(frame, keys=('pair',), **state.windows)
+
+    # The previous non-missing price may be older than the kept history: seed each pair with it
+    seeded = np.empty(len(new_prices) + len(touched))
+    seed_starts, _ = _segment_positions(new_counts + 1)
+    seeded[seed_starts] = last_valid[touched]
+    seeded_new = np.repeat(seed_starts + 1, new_counts) + new_within
+    seeded[seeded_new] = new_prices
+    seeded_segments = PriceSegments(pd.DataFrame({'pair': np.repeat(np.arange(len(touched)), new_counts + 1)}),
+                                    ('pair',))
+    daily_inflation = seeded_segments.pct_change(seeded)[seeded_new]
+
+    result = pd.DataFrame(index=new_rows.index)
+    for column in INDICATOR_COLUMNS:
+        values = daily_inflation if column == 'daily_inflation' else frame[column].to_numpy()[new_positions]
+        ordered = np.empty_like(values)
+        ordered[order] = values
+        result[column] = ordered
+
+    tail[touched], tail_len[touched] = _tails(prices, counts, state.length)
+    last_valid[touched] = _last_valid(seeded, new_counts + 1)
+    if 'fechaCaptura' in new_rows.columns:
+        last_date[touched] = _last_dates(new_rows, order[np.cumsum(new_counts) - 1])
+    return result, IndicatorState(producto, ciudad, tail, tail_len, last_valid, state.windows, last_date,
+                                  state.date_tz or _date_tz(new_rows))
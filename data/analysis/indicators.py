@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from pandas.api.indexers import BaseIndexer
+
+# Columns added by `compute_indicators`, in order
+INDICATOR_COLUMNS = ['daily_inflation', 'short_ma', 'long_ma', 'volatility', 'signal', 'crossover',
+                     'z_score', 'anomaly', 'RSI']
+
+
+class SegmentWindowIndexer(BaseIndexer):
+    """Trailing windows of `window_size` rows that never reach back past the start of their segment."""
+
+    def get_window_bounds(self, num_values=0, min_periods=None, center=None, closed=None, step=None):
+        end = np.arange(1, num_values + 1, dtype=np.int64)
+        start = np.maximum(end - self.window_size, self.segment_starts)
+        return start, end
+
+
+class PriceSegments:
+    """
+    Contiguous (producto, ciudad) segments of a price frame.
+
+    Rows are taken in frame order when every pair is already contiguous (as after
+    `load_and_clean_data`), otherwise through a stable sort by pair. Kernels run on
+    the concatenated segments and results are scattered back to frame order.
+    """
+
+    def __init__(self, data, keys=('producto', 'ciudad')):
+        codes = data.groupby(list(keys), sort=False, observed=True).ngroup().to_numpy()
+        self.order = None if (np.diff(codes) >= 0).all() else np.argsort(codes, kind='stable')
+        if self.order is not None:
+            codes = codes[self.order]
+
+        n = len(codes)
+        self.is_start = np.ones(n, dtype=bool)
+        self.is_start[1:] = codes[1:] != codes[:-1]
+        positions = np.arange(n, dtype=np.int64)
+        self.row_start = np.maximum.accumulate(np.where(self.is_start, positions, 0)) if n else positions
+
+    def gather(self, column):
+        values = column.to_numpy(dtype=np.float64, na_value=np.nan)
+        return values if self.order is None else values[self.order]
+
+    def scatter(self, values):
+        if self.order is None:
+            return values
+        out = np.empty_like(values)
+        out[self.order] = values
+        return out
+
+    def shift(self, values):
+        # Previous value inside the segment, NaN on the first row of each segment
+        shifted = np.empty_like(values, dtype=np.float64)
+        shifted[1:] = values[:-1]
+        shifted[self.is_start] = np.nan
+        return shifted
+
+    def ffill(self, values):
+        # Forward fill that does not carry values across segments
+        valid = ~np.isnan(values) | self.is_start
+        last = np.maximum.accumulate(np.where(valid, np.arange(len(values)), 0)) if len(values) else valid
+        return values[last]
+
+    def count(self, values, window):
+        # Non-missing observations in each trailing window, from a segmented cumulative sum
+        seen = np.r_[0, np.cumsum(~np.isnan(values))]
+        end = np.arange(1, len(values) + 1)
+        start = np.maximum(end - window, self.row_start)
+        return seen[end] - seen[start]
+
+    def rolling(self, values, window, min_periods):
+        indexer = SegmentWindowIndexer(window_size=window, segment_starts=self.row_start)
+        return pd.Series(values).rolling(indexer, min_periods=min_periods)
+
+    def pct_change(self, prices):
+        # Matches groupby().pct_change(): forward fill inside each pair, then compare to the previous row
+        filled = self.ffill(prices)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (filled / self.shift(filled) - 1) * 100
+
+    def z_score(self, prices, window, mean=None):
+        if mean is None:
+            mean = self.rolling(prices, window, 10).mean().to_numpy()
+        std = self.rolling(prices, window, 10).std(ddof=0).to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return (prices - mean) / std
+
+    def rsi(self, prices, window):
+        delta = prices - self.shift(prices)
+        gain = self.rolling(np.where(delta > 0, delta, 0), window, 1).mean().to_numpy()
+        loss = self.rolling(np.where(delta < 0, -delta, 0), window, 1).mean().to_numpy()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = gain / loss
+            return 100 - (100 / (1 + rs))
+
+
+def indicator_columns(data, short_window=10, long_window=50, vol_window=30, z_window=50, rsi_window=14,
+                      keys=('producto', 'ciudad')):
+    """
+    Computes every per-pair rolling indicator in one pass over the price segments,
+    without touching `data`.
+
+    Produces the same columns as `compute_daily_inflation`, `add_moving_averages`,
+    `detect_anomalies` and `compute_rsi` applied in sequence: daily_inflation,
+    short_ma, long_ma, volatility, signal, crossover, z_score, anomaly and RSI.
+    Args:
+        data (pd.DataFrame): Frame with 'producto', 'ciudad' and 'precioPromedio' columns.
+        short_window, long_window (int): Windows of the moving averages.
+        vol_window (int): Window of the volatility (rolling standard deviation).
+        z_window (int): Window of the anomaly z-score.
+        rsi_window (int): Window of the RSI.
+        keys (tuple): Columns identifying a series.
+    Returns:
+        dict: One array per indicator column, aligned with the rows of `data`.
+    """
+    segments = PriceSegments(data, keys)
+    prices = segments.gather(data['precioPromedio'])
+    columns = {}
+
+    columns['daily_inflation'] = segments.pct_change(prices)
+
+    columns['short_ma'] = segments.rolling(prices, short_window, 1).mean().to_numpy()
+    columns['long_ma'] = segments.rolling(prices, long_window, 1).mean().to_numpy()
+    columns['volatility'] = segments.rolling(prices, vol_window, 2).std().to_numpy()
+    columns['signal'] = (columns['short_ma'] > columns['long_ma']).astype(np.int64)
+    columns['crossover'] = columns['signal'] - segments.shift(columns['signal'])
+
+    # The z-score mean is the long moving average wherever both windows match
+    z_mean = None
+    if z_window == long_window:
+        z_mean = np.where(segments.count(prices, z_window) >= 10, columns['long_ma'], np.nan)
+    columns['z_score'] = segments.z_score(prices, z_window, z_mean)
+    columns['anomaly'] = np.abs(columns['z_score']) > 2
+
+    columns['RSI'] = segments.rsi(prices, rsi_window)
+
+    return {name: segments.scatter(values) for name, values in columns.items()}
+
+
+def compute_indicators(data, **kwargs):
+    """
+    Adds the columns of `indicator_columns` (which takes the same keyword arguments)
+    to `data`.
+    Returns:
+        pd.DataFrame: The same frame with the indicator columns added.
+    """
+    for name, values in indicator_columns(data, **kwargs).items():
+        data[name] = values
+    return data
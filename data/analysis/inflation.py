@@ -1,16 +1,18 @@
 import pandas as pd
 
+from analysis.indicators import PriceSegments
+from analysis.price_cube import pair_price_cube
+
 def compute_yoy_inflation(data):
-    # Compute YoY inflation per product-city pair
-    avg_price_by_year = (
-        data.groupby(['producto', 'ciudad', 'año'])['precioPromedio']
-        .mean()
-        .unstack(fill_value=0)
-    )
-    yoy_inflation = avg_price_by_year.pct_change(axis=1) * 100
+    # Compute YoY inflation per product-city pair from the yearly means of the price cube.
+    # Years without prices give NaN (as does the year after), not -100% and inf as a 0 fill did
+    cube, pairs, _ = pair_price_cube(data)
+    yoy_inflation = pd.DataFrame(cube.yoy_inflation(), index=pd.MultiIndex.from_frame(pairs),
+                                 columns=pd.Index(cube.years, name='año'))
     return yoy_inflation
 
 def compute_daily_inflation(data):
     # Compute daily inflation per product-city pair
-    data['daily_inflation'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].pct_change() * 100
+    segments = PriceSegments(data)
+    data['daily_inflation'] = segments.scatter(segments.pct_change(segments.gather(data['precioPromedio'])))
     return data
@@ -0,0 +1,9 @@
+import pandas as pd
+
+from analysis.indicators import PriceSegments
+
+def compute_rsi(data, window=14):
+    # Relative strength index per product-city pair
+    segments = PriceSegments(data)
+    data['RSI'] = segments.scatter(segments.rsi(segments.gather(data['precioPromedio']), window))
+    return data
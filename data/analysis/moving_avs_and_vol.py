@@ -1,19 +1,19 @@
 import pandas as pd
 
+from analysis.indicators import PriceSegments
+
 def add_moving_averages(data, short_window=10, long_window=50, vol_window=30):
     # Add short and long moving averages, and volatility
-    data['short_ma'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-        lambda x: x.rolling(window=short_window, min_periods=1).mean()
-    )
-    data['long_ma'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-        lambda x: x.rolling(window=long_window, min_periods=1).mean()
-    )
-    data['volatility'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-        lambda x: x.rolling(window=vol_window, min_periods=2).std()
-    )
+    segments = PriceSegments(data)
+    prices = segments.gather(data['precioPromedio'])
+    short_ma = segments.rolling(prices, short_window, 1).mean().to_numpy()
+    long_ma = segments.rolling(prices, long_window, 1).mean().to_numpy()
+    data['short_ma'] = segments.scatter(short_ma)
+    data['long_ma'] = segments.scatter(long_ma)
+    data['volatility'] = segments.scatter(segments.rolling(prices, vol_window, 2).std().to_numpy())
     # --- Detect crossover events ---
-    data['signal'] = 0
-    data.loc[data['short_ma'] > data['long_ma'], 'signal'] = 1
-    data['crossover'] = data.groupby(['producto', 'ciudad'])['signal'].diff()
+    signal = (short_ma > long_ma).astype(int)
+    data['signal'] = segments.scatter(signal)
+    data['crossover'] = segments.scatter(signal - segments.shift(signal))
     
     return data
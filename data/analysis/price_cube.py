@@ -0,0 +1,164 @@
+import numpy as np
+
+from analysis.series_index import build_series_index
+
+MONTHS = 12
+
+
+class PriceCube:
+    """
+    Sum, count, min and max of the prices of every group by calendar year and month,
+    built once per dataset snapshot. Groups are (producto, ciudad) pairs, or products,
+    cities or a single all-product group after a `rollup`.
+
+    Every array has shape (groups, years, 12): cell [g, y, m] holds the prices of group g
+    captured in month m + 1 of `years[y]`. Years form a contiguous range, so a year without
+    prices is an empty cell (count 0, NaN min and max) instead of a missing one, and every
+    lookup is array indexing.
+    """
+
+    def __init__(self, years, sums, counts, mins, maxes):
+        self.years = years    # calendar year of every position of the year axis
+        self.sums = sums      # float64 sum of the prices of every cell
+        self.counts = counts  # number of prices of every cell
+        self.mins = mins      # lowest price of every cell, NaN when empty
+        self.maxes = maxes    # highest price of every cell, NaN when empty
+
+    @property
+    def n_groups(self):
+        return len(self.counts)
+
+    def rollup(self, codes, n_groups):
+        """
+        Aggregates the groups into coarser ones, e.g. pairs into products (national level)
+        with `series_index.pair_product`, or into one all-product group with zeros.
+        Args:
+            codes (np.ndarray): New group of every current group.
+            n_groups (int): Number of new groups.
+        Returns:
+            PriceCube: Cube of the new groups over the same years.
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        shape = (n_groups,) + self.counts.shape[1:]
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=self.counts.dtype)
+        mins = np.full(shape, np.nan, dtype=self.mins.dtype)
+        maxes = np.full(shape, np.nan, dtype=self.maxes.dtype)
+        np.add.at(sums, codes, self.sums)
+        np.add.at(counts, codes, self.counts)
+        # fmin and fmax skip the NaN of empty cells
+        np.fmin.at(mins, codes, self.mins)
+        np.fmax.at(maxes, codes, self.maxes)
+        return PriceCube(self.years, sums, counts, mins, maxes)
+
+    def _mean(self, groups, axis):
+        # Mean over the trailing (year, month) axes in `axis`, NaN where there are no prices
+        sums = self.sums[groups].sum(axis=axis)
+        counts = self.counts[groups].sum(axis=axis)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def mean(self, groups=slice(None)):
+        """Mean price of every (year, month) cell of the selected groups."""
+        return self._mean(groups, ())
+
+    def yearly_mean(self, groups=slice(None)):
+        """Mean price of every year of the selected groups (years axis last)."""
+        return self._mean(groups, -1)
+
+    def monthly_mean(self, groups=slice(None)):
+        """Mean price of every calendar month of the selected groups, over all years."""
+        return self._mean(groups, -2)
+
+    def overall_mean(self, groups=slice(None)):
+        """Mean price of the selected groups over all years and months."""
+        return self._mean(groups, (-2, -1))
+
+    def yoy_inflation(self, groups=slice(None)):
+        """
+        Change (%) of the yearly mean price from the previous calendar year, years axis
+        last. NaN for the first year and whenever this year or the previous one has no
+        prices, where zero-filled missing years would give -100% and inf.
+        """
+        yearly = self.yearly_mean(groups)
+        yoy = np.full_like(yearly, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            yoy[..., 1:] = (yearly[..., 1:] / yearly[..., :-1] - 1) * 100
+        return yoy
+
+
+def build_price_cube(data, codes, n_groups):
+    """
+    Builds the price cube of a frame in one pass over its rows.
+    Args:
+        data (pd.DataFrame): Frame with 'precioPromedio' and either the 'año' and 'mes' of
+            the capture date or 'fechaCaptura' itself.
+        codes (np.ndarray): Group of every row, e.g. `series_index.row_pair_codes()`;
+            rows with a negative code are left out.
+        n_groups (int): Number of groups.
+    Returns:
+        PriceCube: Aggregates of the rows with a price and a capture date.
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    prices = data['precioPromedio'].to_numpy()
+    # The cleaned 'año' and 'mes' columns are much cheaper than the parts of zoned dates
+    if 'año' in data.columns and 'mes' in data.columns:
+        years, months = data['año'], data['mes']
+    else:
+        years, months = data['fechaCaptura'].dt.year, data['fechaCaptura'].dt.month
+    years = years.to_numpy(dtype=np.float64, na_value=np.nan)
+    months = months.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    keep = (codes >= 0) & ~np.isnan(years) & ~np.isnan(prices)
+    if keep.all():
+        values = prices
+    else:
+        codes, years, months, values = codes[keep], years[keep], months[keep], prices[keep]
+    first, last = (int(years.min()), int(years.max())) if len(values) else (0, -1)
+    n_years = last - first + 1
+
+    cells = (codes * n_years + (years.astype(np.int64) - first)) * MONTHS + months.astype(np.int64) - 1
+    # Rows sorted by pair and capture date already come in cell order
+    if (np.diff(cells) < 0).any():
+        order = np.argsort(cells, kind='stable')
+        cells, values = cells[order], values[order]
+
+    n_cells = n_groups * n_years * MONTHS
+    dtype = values.dtype if values.dtype.kind == 'f' else np.float64
+    sums = np.zeros(n_cells)
+    counts = np.zeros(n_cells, dtype=np.int32)
+    mins = np.full(n_cells, np.nan, dtype=dtype)
+    maxes = np.full(n_cells, np.nan, dtype=dtype)
+    if len(cells):
+        starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        at = cells[starts]
+        sums[at] = np.add.reduceat(values, starts, dtype=np.float64)
+        counts[at] = np.diff(np.r_[starts, len(cells)])
+        mins[at] = np.minimum.reduceat(values, starts)
+        maxes[at] = np.maximum.reduceat(values, starts)
+
+    shape = (n_groups, n_years, MONTHS)
+    return PriceCube(np.arange(first, last + 1), sums.reshape(shape), counts.reshape(shape),
+                     mins.reshape(shape), maxes.reshape(shape))
+
+
+def pair_price_cube(data):
+    """
+    Builds the price cube of every (producto, ciudad) pair of a frame, pairs in sorted order.
+    Frames sorted by pair, as the analysis keeps them, are split by their series index
+    instead of being grouped.
+    Returns:
+        tuple: (PriceCube, pd.DataFrame with the 'producto' and 'ciudad' of every pair,
+        pair code of every row, -1 for rows without a product or city).
+    """
+    keys = data[['producto', 'ciudad']]
+    try:
+        series_index = build_series_index(data)
+    except ValueError:
+        pairs = keys.groupby(['producto', 'ciudad'], observed=True)
+        codes = pairs.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+        labels = pairs.size().index.to_frame(index=False)
+        return build_price_cube(data, codes, pairs.ngroups), labels, codes
+    codes = series_index.row_pair_codes()
+    labels = keys.iloc[series_index.pair_offsets[:-1]].reset_index(drop=True)
+    return build_price_cube(data, codes, series_index.n_pairs), labels, codes
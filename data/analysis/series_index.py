@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+class SeriesIndex:
+    """
+    Row offsets of every product and (product, city) series in a frame sorted by
+    ['producto', 'ciudad', 'fechaCaptura'], as returned by `load_and_clean_data`.
+
+    Each series is a contiguous block of rows, so a lookup is a dictionary hit
+    followed by a positional slice instead of a boolean mask over the full frame.
+    """
+
+    def __init__(self, products, cities, product_offsets, pair_offsets, pair_product, pair_city):
+        self.products = products            # sorted product names, position == product code
+        self.cities = cities                # sorted city names, position == city code
+        self.product_offsets = product_offsets  # rows [offsets[i], offsets[i + 1]) belong to product i
+        self.pair_offsets = pair_offsets        # same for every (product, city) pair
+        self.pair_product = pair_product    # product code of every pair
+        self.pair_city = pair_city          # city code of every pair
+
+        self._product_lookup = {name: code for code, name in enumerate(products)}
+        self._city_lookup = {name: code for code, name in enumerate(cities)}
+        self._pair_lookup = {
+            (products[p], cities[c]): i for i, (p, c) in enumerate(zip(pair_product, pair_city))
+        }
+
+    def __len__(self):
+        return int(self.pair_offsets[-1]) if len(self.pair_offsets) else 0
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_product)
+
+    def city_code(self, ciudad):
+        """Code of a city, or None if it has no rows."""
+        return self._city_lookup.get(ciudad)
+
+    def pair_code(self, producto, ciudad):
+        """Code of a (producto, ciudad) pair, or None if the pair has no rows."""
+        return self._pair_lookup.get((producto, ciudad))
+
+    def pair_slice(self, producto, ciudad):
+        """Positional slice of the rows for a (producto, ciudad) pair, or None."""
+        code = self._pair_lookup.get((producto, ciudad))
+        if code is None:
+            return None
+        return slice(int(self.pair_offsets[code]), int(self.pair_offsets[code + 1]))
+
+    def product_slice(self, producto):
+        """Positional slice of all the rows for a product, or None."""
+        code = self._product_lookup.get(producto)
+        if code is None:
+            return None
+        return slice(int(self.product_offsets[code]), int(self.product_offsets[code + 1]))
+
+    def pairs(self):
+        """Iterate over (producto, ciudad, slice) for every pair, in row order."""
+        for i, (p, c) in enumerate(zip(self.pair_product, self.pair_city)):
+            yield self.products[p], self.cities[c], slice(int(self.pair_offsets[i]), int(self.pair_offsets[i + 1]))
+
+    def row_pair_codes(self):
+        """Pair code of every row of the indexed frame."""
+        return np.repeat(np.arange(self.n_pairs), np.diff(self.pair_offsets))
+
+
+def build_series_index(data):
+    """
+    Builds a SeriesIndex over a DataFrame sorted by producto and ciudad.
+    Args:
+        data (pd.DataFrame): Frame with 'producto' and 'ciudad' columns, sorted by both.
+    Returns:
+        SeriesIndex: Offsets of every product and product-city series.
+    """
+    product_codes, products = pd.factorize(data['producto'], sort=True)
+    city_codes, cities = pd.factorize(data['ciudad'], sort=True)
+    n = len(data)
+
+    # Rows must already be grouped by product, then by city inside each product
+    product_step = np.diff(product_codes)
+    city_step = np.diff(city_codes)
+    if (product_step < 0).any() or ((product_step == 0) & (city_step < 0)).any():
+        raise ValueError("data must be sorted by ['producto', 'ciudad'] to build a series index")
+
+    product_starts = np.flatnonzero(np.r_[True, product_step != 0]) if n else np.array([], dtype=np.int64)
+    pair_starts = np.flatnonzero(np.r_[True, (product_step != 0) | (city_step != 0)]) if n else np.array([], dtype=np.int64)
+
+    return SeriesIndex(
+        products=list(products),
+        cities=list(cities),
+        product_offsets=np.r_[product_starts, n].astype(np.int64),
+        pair_offsets=np.r_[pair_starts, n].astype(np.int64),
+        pair_product=product_codes[pair_starts],
+        pair_city=city_codes[pair_starts],
+    )
@@ -2,6 +2,25 @@ import pandas as pd
 from statsmodels.tsa.arima.model import ARIMA
 import traceback
 import numpy as np
+import multiprocessing
+import os
+import signal
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from analysis.arima_state import incremental_trend
+from analysis.broadcast import broadcast_table
+
+
+# Pools are started without fork(): they may be created from a thread of the stage runner while
+# other threads run, and a forked child can inherit locks those threads were holding
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+class FitTimeout(BaseException):
+    # BaseException so the broad `except Exception` around the ARIMA fit does not swallow it
+    pass
 
 def compute_fast_trend_with_params(series, p, d, q):
     # ARIMA-based trend computation
@@ -15,6 +34,15 @@ def compute_fast_trend_with_params(series, p, d, q):
         traceback.print_exc()
         return np.nan
 
+def compute_incremental_trend(producto, ciudad, series, order, state_dir, refit_every=30):
+    # ARIMA trend that extends the stored fit of the pair instead of re-estimating it
+    try:
+        return incremental_trend(producto, ciudad, series, order, state_dir, refit_every)
+    except Exception as e:
+        print(f"Error in incremental ARIMA update for {producto}, {ciudad}: {e}")
+        traceback.print_exc()
+        return np.nan
+
 def get_latest_series(producto, ciudad, full_data):
     # Retrieve the latest series for a product-city pair
     subset = full_data[(full_data['producto'] == producto) & (full_data['ciudad'] == ciudad)]
@@ -41,31 +69,143 @@ def app_compute_trend(producto, ciudad, full_data, param_df):
     return compute_fast_trend_with_params(series, p, d, q)
 
 
-def compute_trends(df: pd.DataFrame, param_path: str = "data/parameters/arima_trend_params.csv") -> pd.DataFrame:
+def split_trend_tasks(df, param_df):
+    """
+    Splits the price series and ARIMA orders once, instead of masking the full frame per pair.
+    Args:
+        df: DataFrame with ['producto', 'ciudad', 'precioPromedio'] columns.
+        param_df: ARIMA parameters with ['producto', 'ciudad', 'p', 'd', 'q'] columns.
+    Returns:
+        list of ((producto, ciudad), series, order) tuples, with order None when the
+        pair has no usable parameters.
+    """
+    params = param_df.drop_duplicates(['producto', 'ciudad']).set_index(['producto', 'ciudad'])[['p', 'd', 'q']]
+    orders = {}
+    for key, (p, d, q) in zip(params.index, params.itertuples(index=False)):
+        try:
+            orders[key] = (int(p), int(d), int(q))
+        except (TypeError, ValueError) as e:
+            print(f"Error extracting parameters: {e}")
+            orders[key] = None
+
+    tasks = []
+    for key, series in df.groupby(['producto', 'ciudad'], sort=True, observed=True)['precioPromedio']:
+        tasks.append((key, series, orders.get(key)))
+    return tasks
+
+
+def _on_fit_timeout(signum, frame):
+    raise FitTimeout()
+
+
+def _fit_timer_available():
+    # Fit timeouts use SIGALRM, whose handler can only be installed from the main thread
+    return hasattr(signal, "SIGALRM") and threading.current_thread() is threading.main_thread()
+
+
+def fit_trend_chunk(tasks, fit_timeout=None, state_dir=None, refit_every=30):
+    """
+    Fits every task of a chunk, giving each ARIMA fit at most `fit_timeout` seconds.
+    With a `state_dir`, stored fits are extended with new observations instead of refitted.
+    Returns:
+        list of ((producto, ciudad), trend_slope) tuples.
+    """
+    # Pool workers run chunks on their main thread; `compute_trend_slopes` only runs one
+    # elsewhere when the platform has no SIGALRM
+    use_timer = fit_timeout is not None and _fit_timer_available()
+    if fit_timeout is not None and not use_timer:
+        print(f"ARIMA fit timeout of {fit_timeout}s not enforced: SIGALRM is not available here")
+    if use_timer:
+        previous = signal.signal(signal.SIGALRM, _on_fit_timeout)
+
+    results = []
+    try:
+        for key, series, order in tasks:
+            if order is None:
+                results.append((key, np.nan))
+                continue
+            try:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, fit_timeout)
+                if state_dir is None:
+                    slope = compute_fast_trend_with_params(series, *order)
+                else:
+                    slope = compute_incremental_trend(*key, series, order, state_dir, refit_every)
+            except FitTimeout:
+                print(f"ARIMA fit for {key} exceeded {fit_timeout}s, skipping")
+                slope = np.nan
+            finally:
+                if use_timer:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            results.append((key, slope))
+    finally:
+        if use_timer:
+            signal.signal(signal.SIGALRM, previous)
+    return results
+
+
+def compute_trend_slopes(df: pd.DataFrame, param_path: str = "data/parameters/arima_trend_params.csv",
+                         n_jobs: int = None, chunksize: int = None, fit_timeout: float = 120,
+                         state_dir: str = None, refit_every: int = 30) -> pd.DataFrame:
     """
     Computes ARIMA-based trend slope per (producto, ciudad) using pre-estimated ARIMA parameters.
+
+    The fits are independent, so they are fanned out over a process pool in chunks.
     
     Args:
         df: The input DataFrame with at least ['producto', 'ciudad', 'precioPromedio'] columns.
         param_path: Path to the CSV containing ARIMA parameters per product-city pair.
+        n_jobs: Number of worker processes (defaults to the number of cores, 1 runs serially).
+        chunksize: Pairs sent to a worker at once (defaults to ~4 chunks per worker).
+        fit_timeout: Seconds allowed for a single ARIMA fit before its slope is set to NaN
+            (where SIGALRM exists; off the main thread, fits then run in a worker process).
+        state_dir: Directory of persisted fits per pair. When given, pairs with a stored fit
+            only filter their new observations, and are re-estimated every `refit_every` updates.
+        refit_every: Incremental updates allowed before a pair is fully refitted.
 
     Returns:
-        DataFrame with new column `trend_slope` merged in.
+        DataFrame with one ['producto', 'ciudad', 'trend_slope'] row per pair.
     """
     # Load ARIMA parameters
     param_df = pd.read_csv(param_path)
 
-    # Apply trend computation per group
-    trend_results = (
-        df.groupby(['producto', 'ciudad'])
-        .apply(lambda group: app_compute_trend(group['producto'].iloc[0],
-                                               group['ciudad'].iloc[0],
-                                               df,
-                                               param_df))
-        .reset_index(name='trend_slope')
+    # Split series and parameters once per pair
+    tasks = split_trend_tasks(df, param_df)
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    if chunksize is None:
+        chunksize = max(1, -(-len(tasks) // (n_jobs * 4)))
+    chunks = [tasks[i:i + chunksize] for i in range(0, len(tasks), chunksize)]
+
+    # Off the main thread (e.g. in a stage of the pipeline runner) the fit timer cannot be
+    # armed, so even one job goes to a worker process, where it can
+    timer_needs_worker = fit_timeout is not None and hasattr(signal, "SIGALRM") and not _fit_timer_available()
+    if not chunks or ((n_jobs == 1 or len(chunks) <= 1) and not timer_needs_worker):
+        fitted = [fit_trend_chunk(chunk, fit_timeout, state_dir, refit_every) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(n_jobs, len(chunks)), mp_context=POOL_CONTEXT) as pool:
+            repeat = len(chunks)
+            fitted = list(pool.map(fit_trend_chunk, chunks, [fit_timeout] * repeat,
+                                   [state_dir] * repeat, [refit_every] * repeat))
+
+    return pd.DataFrame(
+        [(producto, ciudad, slope) for chunk in fitted for (producto, ciudad), slope in chunk],
+        columns=['producto', 'ciudad', 'trend_slope'],
     )
 
-    # Merge back to main DataFrame
-    df = df.merge(trend_results, on=['producto', 'ciudad'], how='left')
 
-    return df
\ No newline at end of file
+def compute_trends(df: pd.DataFrame, param_path: str = "data/parameters/arima_trend_params.csv",
+                   **kwargs) -> pd.DataFrame:
+    """
+    Adds the slopes of `compute_trend_slopes` (which takes the same keyword arguments)
+    into every row of `df`.
+    Returns:
+        The same DataFrame with the new column `trend_slope`.
+    """
+    trend_results = compute_trend_slopes(df, param_path, **kwargs)
+
+    # Broadcast to every row of the pair by group code, instead of merging a copy of the frame
+    keys = ['producto', 'ciudad']
+    df['trend_slope'] = broadcast_table(df, trend_results, keys, ['trend_slope'])['trend_slope']
+
+    return df
@@ -1,20 +1,55 @@
-import pandas as pd
+import numpy as np
+
+from analysis.indicators import PriceSegments
+from analysis.price_cube import MONTHS, pair_price_cube
+
+# Monthly average price added by `detect_seasonal_patterns` (the baseline merge produced it
+# as 'precioPromedio_y', renaming the price itself to 'precioPromedio_x')
+MONTHLY_AVG_COLUMN = 'precioPromedioMensual'
+
+def price_drop_columns(data):
+    # Previous price of the pair and whether the price fell, for every row, without touching `data`
+    segments = PriceSegments(data)
+    prices = segments.gather(data['precioPromedio'])
+    prev_price = segments.scatter(segments.shift(prices))
+    price_drop = segments.scatter(prices) < prev_price
+    # Keep the price precision, as groupby().shift() did
+    if data['precioPromedio'].dtype.kind == 'f':
+        prev_price = prev_price.astype(data['precioPromedio'].dtype)
+    return {'prev_price': prev_price, 'price_drop': price_drop}
+
+def flag_price_drops(data):
+    # Flag every row whose price is below the previous price of its pair
+    for name, values in price_drop_columns(data).items():
+        data[name] = values
+    return data
 
 def detect_price_drops(data):
-    # Detect price drops in the dataset
-    data['prev_price'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].shift(1)
-    data['price_drop'] = data['precioPromedio'] < data['prev_price']
-    price_drops = data[data['price_drop'] == True]
+    # Detect price drops in the dataset; only the drop rows are returned
+    data = flag_price_drops(data)
+    price_drops = data[data['price_drop']]
     return price_drops
 
+def _as_price_dtype(values, data):
+    # Keep the price precision, as groupby().mean() did
+    if data['precioPromedio'].dtype.kind == 'f':
+        return values.astype(data['precioPromedio'].dtype)
+    return values
+
+def monthly_price_averages(data):
+    # Average price per product, city and calendar month, read from the price cube
+    cube, pairs, _ = pair_price_cube(data)
+    pair, month = np.nonzero(cube.counts.sum(axis=1))
+    monthly_avg = pairs.iloc[pair].reset_index(drop=True)
+    monthly_avg['mes'] = (month + 1).astype(data['mes'].dtype)
+    monthly_avg[MONTHLY_AVG_COLUMN] = _as_price_dtype(cube.monthly_mean()[pair, month], data)
+    return monthly_avg
+
 def detect_seasonal_patterns(data):
     # Detect seasonal patterns based on monthly averages
-    monthly_avg = (
-        data.groupby(['producto', 'ciudad', 'mes'])['precioPromedio']
-        .mean()
-        .reset_index()
-    )
-        # Merge the monthly average back to the main data
-    data = data.merge(monthly_avg, on=['producto', 'ciudad', 'mes'], how='left')
+    cube, _, codes = pair_price_cube(data)
+    # Index the cube's monthly means by the pair and month of every row; code -1 hits the NaN row
+    monthly = np.vstack([cube.monthly_mean(), np.full(MONTHS, np.nan)])
+    data[MONTHLY_AVG_COLUMN] = _as_price_dtype(monthly[codes, data['mes'].to_numpy() - 1], data)
 
     return data
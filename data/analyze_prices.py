@@ -4,6 +4,10 @@ from statsmodels.tsa.arima.model import ARIMA
 import warnings
 import traceback
 
+from analysis.indicators import compute_indicators
+from analysis.inflation import compute_yoy_inflation
+from storage.columnar import save_frame
+
 
 warnings.filterwarnings("ignore")
 
@@ -19,78 +23,25 @@ data['año'] = data['fechaCaptura'].dt.year
 data['mes'] = data['fechaCaptura'].dt.month
 
 # --- Compute Inflation per product-city pair (YoY %) ---
-avg_price_by_year = (
-    data.groupby(['producto', 'ciudad', 'año'])['precioPromedio']
-    .mean()
-    .unstack(fill_value=0)
-)
-yoy_inflation = avg_price_by_year.pct_change(axis=1) * 100
+yoy_inflation = compute_yoy_inflation(data)
 yoy_inflation.to_csv("outputs/inflation_by_product_city.csv")
 
 # --- Sort for rolling metrics ---
 data = data.sort_values(['producto', 'ciudad', 'fechaCaptura'])
 
-# --- Compute Inflation per product-city pair (DoD %) ---
-# Group by product and city, then calculate day-to-day inflation (% change)
-data['daily_inflation'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].pct_change() * 100
-
-# Save to CSV
-data[['producto', 'ciudad', 'fechaCaptura', 'precioPromedio', 'daily_inflation']].to_csv("outputs/daily_inflation.csv", index=False)
-
-
-# --- Moving Averages and Volatility (per product-city pair) ---
-short_window = 10
-long_window = 50
-vol_window = 30
-
-data['short_ma'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-    lambda x: x.rolling(window=short_window, min_periods=1).mean()
-)
-data['long_ma'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-    lambda x: x.rolling(window=long_window, min_periods=1).mean()
-)
-data['volatility'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-    lambda x: x.rolling(window=vol_window, min_periods=2).std()
-)
-
-# --- Detect crossover events ---
-data['signal'] = 0
-data.loc[data['short_ma'] > data['long_ma'], 'signal'] = 1
-data['crossover'] = data.groupby(['producto', 'ciudad'])['signal'].diff()
-
-
-# --- Momentum (RSI Calculation) ---
-def compute_rsi(series, window=14):
-    delta = series.diff()
-    gain = pd.Series(np.where(delta > 0, delta, 0), index=series.index)
-    loss = pd.Series(np.where(delta < 0, -delta, 0), index=series.index)
-
-    gain = gain.rolling(window=window, min_periods=1).mean()
-    loss = loss.rolling(window=window, min_periods=1).mean()
-
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+# --- Rolling indicators per product-city pair ---
+# Daily inflation (DoD %), moving averages (10/50), volatility (30), crossover signals,
+# RSI (14) and rolling z-score anomalies (50), all in one pass over the sorted pairs
+data = compute_indicators(data, short_window=10, long_window=50, vol_window=30, z_window=50, rsi_window=14)
 
-data['RSI'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(lambda x: compute_rsi(x, window=14))
+# Save the daily inflation as Parquet
+save_frame(data[['producto', 'ciudad', 'fechaCaptura', 'precioPromedio', 'daily_inflation']], "outputs/daily_inflation.parquet")
 
 # Optional: flag high/low RSI conditions
 data['rsi_signal'] = np.where(data['RSI'] > 70, 'Overbought',
                        np.where(data['RSI'] < 30, 'Oversold', 'Neutral'))
 
 
-# --- Anomaly Detection using Rolling Z-Score ---
-window_size = 50
-
-data['z_score'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].transform(
-    lambda x: (x - x.rolling(window=window_size, min_periods=10).mean()) /
-              x.rolling(window=window_size, min_periods=10).std(ddof=0)
-)
-
-# Mark as anomaly if z-score > 2 (or < -2)
-data['anomaly'] = data['z_score'].abs() > 2
-
-
 # --- Trend Analysis using ARIMA(p=50, d, q) ---
 
 # Fitting p,q,d parameters
@@ -193,13 +144,13 @@ trend_results = (
 data = data.merge(trend_results, on=['producto', 'ciudad'], how='left')
 
 # Save the updated dataset with trend analysis
-data.to_csv("outputs/trend_anomaly_analysis.csv", index=False)
+save_frame(data, "outputs/trend_anomaly_analysis.parquet", partition_by='producto')
 
 # --- User-centric metrics: Price Drop Detection ---
 data['prev_price'] = data.groupby(['producto', 'ciudad'])['precioPromedio'].shift(1)
 data['price_drop'] = data['precioPromedio'] < data['prev_price']
 price_drops = data[data['price_drop'] == True]
-price_drops.to_csv("outputs/price_drops.csv", index=False)
+save_frame(price_drops, "outputs/price_drops.parquet")
 
 # --- (Optional) Detect Seasonal Price Patterns ---
 monthly_avg = (
@@ -0,0 +1,85 @@
+"""
+Peak memory of harvesting one large promediosSipsaCiudad response through zeep objects
+(serialize_object, as soap.py does) versus the streaming iterparse path of the harvester.
+
+The stand-in service runs in its own process and each mode in a fresh one, so the peak
+resident size of a mode only counts the client.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_harvest_memory.py --rows 1000000 --modes streaming zeep
+"""
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "raw")
+sys.path.insert(0, RAW_DIR)
+
+METHOD = 'promediosSipsaCiudad'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_mode(mode, wsdl, out_dir):
+    # Child process: one harvest, then report its own peak memory
+    from harvester import harvest
+    start = time.perf_counter()
+    result = harvest([METHOD], out_dir=out_dir, wsdl=wsdl, workers=1, streaming=(mode == "streaming"))[0]
+    print(json.dumps({
+        'mode': mode,
+        'rows': result['rows'],
+        'seconds': round(time.perf_counter() - start, 1),
+        'peak_rss_mib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024,
+        'file_mib': round(os.path.getsize(os.path.join(out_dir, f"{METHOD}.csv")) / 2**20, 1),
+    }))
+
+
+def run(n_rows, modes):
+    port = free_port()
+    server = subprocess.Popen([sys.executable, os.path.join(RAW_DIR, "sipsa_stub.py"),
+                               "--port", str(port), "--rows", str(n_rows), "--rows-per-day", "1000"],
+                              stdout=subprocess.DEVNULL)
+    wsdl = f"http://127.0.0.1:{port}/sipsaWS/SrvSipsaUpraBeanService?WSDL"
+    try:
+        time.sleep(1.0)
+        from sipsa_stub import build_response
+        row_bytes = len(build_response(METHOD, 1000).encode("utf-8")) / 1000
+        print(f"{n_rows:,} rows, response of about {n_rows * row_bytes / 2**20:,.0f} MiB")
+        for mode in modes:
+            with tempfile.TemporaryDirectory() as out_dir:
+                output = subprocess.run([sys.executable, __file__, "--child", mode, "--wsdl", wsdl, "--out", out_dir],
+                                        capture_output=True, text=True)
+                lines = [line for line in output.stdout.splitlines() if line.startswith("{")]
+                if output.returncode != 0 or not lines:
+                    print(f"{mode:>10}: failed (exit code {output.returncode}) {output.stderr.strip()[-200:]}")
+                    continue
+                report = json.loads(lines[-1])
+                print(f"{mode:>10}: peak RSS {report['peak_rss_mib']:,} MiB, {report['seconds']} s, "
+                      f"{report['rows']:,} rows, CSV {report['file_mib']} MiB")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--modes", nargs="+", default=["streaming", "zeep"], choices=["streaming", "zeep"])
+    parser.add_argument("--child", choices=["streaming", "zeep"], help=argparse.SUPPRESS)
+    parser.add_argument("--wsdl", help=argparse.SUPPRESS)
+    parser.add_argument("--out", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.child, args.wsdl, args.out)
+    else:
+        run(args.rows, args.modes)
@@ -0,0 +1,68 @@
+"""
+Daily indicator refresh: recomputing every pair's full history versus updating the
+per-pair rolling state with the newly arrived days only.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_incremental_indicators.py --rows 1000000 10000000 --days 1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis.indicators import INDICATOR_COLUMNS, compute_indicators
+from analysis.indicator_state import build_indicator_state, update_indicators
+from benchmarks.synthetic import make_price_frame
+
+# Rolling standard deviations accumulate online, so over long histories the full recompute
+# drifts (about 1e-9 relative after 7000 days) while the update restarts from one window;
+# every other column is bit-identical
+APPROXIMATE_COLUMNS = ('volatility', 'z_score')
+
+
+def run(n_rows, n_days, missing=0.02, seed=0):
+    data = make_price_frame(n_rows, seed=seed)
+    prices = data['precioPromedio'].to_numpy(dtype=np.float64).copy()
+    prices[np.random.default_rng(seed).random(len(prices)) < missing] = np.nan
+    data['precioPromedio'] = prices
+
+    days = np.sort(data['fechaCaptura'].unique())
+    is_new = (data['fechaCaptura'] >= days[-n_days]).to_numpy()
+    history, new_rows = data[~is_new], data[is_new]
+
+    start = time.perf_counter()
+    state = build_indicator_state(history)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    expected = compute_indicators(data.copy())
+    full_time = time.perf_counter() - start
+
+    update_time = 0.0
+    for day in days[-n_days:]:
+        rows = new_rows[new_rows['fechaCaptura'] == day]
+        start = time.perf_counter()
+        result, state = update_indicators(state, rows)
+        update_time += time.perf_counter() - start
+        for column in INDICATOR_COLUMNS:
+            want, got = expected.loc[rows.index, column].to_numpy(), result[column].to_numpy()
+            if column in APPROXIMATE_COLUMNS:
+                assert np.allclose(want, got, rtol=1e-7, atol=0, equal_nan=True), column
+            else:
+                assert np.array_equal(want, got, equal_nan=True), column
+
+    print(f"rows={len(data):,} new rows={len(new_rows):,} full recompute={full_time:.3f} s  "
+          f"incremental={update_time:.3f} s  speedup={full_time / update_time:.0f}x  "
+          f"(state build {build_time:.3f} s, {state.tail.nbytes / 2 ** 20:.1f} MiB)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--days", type=int, default=1, help="New days applied one update at a time")
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows, args.days)
@@ -0,0 +1,75 @@
+"""
+Wall time of the per-pair rolling indicators: the groupby().transform(lambda ...) chain
+versus the fused single-pass engine in analysis.indicators.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_indicators.py --rows 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis.indicators import compute_indicators
+from benchmarks.synthetic import make_price_frame
+
+
+def transform_chain(data, short_window=10, long_window=50, vol_window=30, window_size=50, rsi_window=14):
+    # The groupby/transform implementation the engine replaces
+    grouped = data.groupby(['producto', 'ciudad'])['precioPromedio']
+    data['daily_inflation'] = grouped.pct_change() * 100
+    data['short_ma'] = grouped.transform(lambda x: x.rolling(window=short_window, min_periods=1).mean())
+    data['long_ma'] = grouped.transform(lambda x: x.rolling(window=long_window, min_periods=1).mean())
+    data['volatility'] = grouped.transform(lambda x: x.rolling(window=vol_window, min_periods=2).std())
+    data['signal'] = 0
+    data.loc[data['short_ma'] > data['long_ma'], 'signal'] = 1
+    data['crossover'] = data.groupby(['producto', 'ciudad'])['signal'].diff()
+    data['z_score'] = grouped.transform(
+        lambda x: (x - x.rolling(window=window_size, min_periods=10).mean()) /
+                  x.rolling(window=window_size, min_periods=10).std(ddof=0)
+    )
+    data['anomaly'] = data['z_score'].abs() > 2
+
+    def rsi(series):
+        delta = series.diff()
+        gain = pd.Series(np.where(delta > 0, delta, 0), index=series.index).rolling(rsi_window, min_periods=1).mean()
+        loss = pd.Series(np.where(delta < 0, -delta, 0), index=series.index).rolling(rsi_window, min_periods=1).mean()
+        return 100 - (100 / (1 + gain / loss))
+
+    data['RSI'] = grouped.transform(rsi)
+    return data
+
+
+def best_of(func, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        frame = data.copy()
+        start = time.perf_counter()
+        result = func(frame)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def run(n_rows, repeat=3):
+    data = make_price_frame(n_rows)
+    chain_time, expected = best_of(transform_chain, data, repeat)
+    engine_time, result = best_of(compute_indicators, data, repeat)
+
+    for column in ['daily_inflation', 'short_ma', 'long_ma', 'volatility', 'crossover', 'z_score', 'RSI']:
+        assert np.allclose(expected[column], result[column], equal_nan=True), column
+    assert (expected['signal'] == result['signal']).all() and (expected['anomaly'] == result['anomaly']).all()
+
+    print(f"rows={len(data):,} transform chain={chain_time:.3f} s  engine={engine_time:.3f} s  "
+          f"speedup={chain_time / engine_time:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows)
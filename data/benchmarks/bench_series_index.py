@@ -0,0 +1,71 @@
+"""
+Latency of a (producto, ciudad) lookup through boolean masks versus the SeriesIndex slices.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_series_index.py --rows 1000000 10000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis.series_index import build_series_index
+from benchmarks.synthetic import make_price_frame
+
+
+def time_lookups(lookup, keys, repeat):
+    # Median wall time of a single lookup, in milliseconds
+    timings = []
+    for _ in range(repeat):
+        for producto, ciudad in keys:
+            start = time.perf_counter()
+            lookup(producto, ciudad)
+            timings.append(time.perf_counter() - start)
+    return np.median(timings) * 1000
+
+
+def run(n_rows, n_keys=20, repeat=3):
+    data = make_price_frame(n_rows)
+
+    start = time.perf_counter()
+    index = build_series_index(data)
+    build_time = time.perf_counter() - start
+
+    rng = np.random.default_rng(1)
+    pairs = list(zip(*[(p, c) for p, c, _ in index.pairs()]))
+    picks = rng.choice(index.n_pairs, size=n_keys, replace=False)
+    keys = [(pairs[0][i], pairs[1][i]) for i in picks]
+
+    def mask_pair(producto, ciudad):
+        return data[(data['producto'] == producto) & (data['ciudad'] == ciudad)]
+
+    def index_pair(producto, ciudad):
+        return data.iloc[index.pair_slice(producto, ciudad)]
+
+    def mask_product(producto, _):
+        return data[data['producto'] == producto]
+
+    def index_product(producto, _):
+        return data.iloc[index.product_slice(producto)]
+
+    # Both paths must return the same rows
+    for producto, ciudad in keys[:3]:
+        assert mask_pair(producto, ciudad).index.equals(index_pair(producto, ciudad).index)
+        assert mask_product(producto, None).index.equals(index_product(producto, None).index)
+
+    print(f"rows={len(data):,} pairs={index.n_pairs} index build={build_time * 1000:.1f} ms")
+    for label, mask, indexed in [("pair", mask_pair, index_pair), ("product", mask_product, index_product)]:
+        mask_ms = time_lookups(mask, keys, repeat)
+        index_ms = time_lookups(indexed, keys, repeat)
+        print(f"  {label:<8} mask={mask_ms:9.3f} ms  index={index_ms:7.3f} ms  speedup={mask_ms / index_ms:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows)
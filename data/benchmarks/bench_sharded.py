@@ -0,0 +1,57 @@
+"""
+Wall time of the per-pair analysis chain (indicators, price drops, ARIMA trends and
+seasonality) sharded by product, for several process counts.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_sharded.py --rows 1000000 --processes 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.synthetic import make_price_frame
+from pipeline.sharded import analyze_sharded
+
+
+def run(n_rows, processes, trend_pairs):
+    warnings.filterwarnings("ignore")
+    data = make_price_frame(n_rows)
+    data['año'] = data['fechaCaptura'].dt.year.astype('int16')
+    data['mes'] = data['fechaCaptura'].dt.month.astype('int8')
+    data = data[['producto', 'ciudad', 'año', 'mes', 'precioPromedio']].astype({'producto': 'category', 'ciudad': 'category'})
+
+    # ARIMA orders for a sample of pairs; the others only get the vectorized stages
+    pairs = data[['producto', 'ciudad']].drop_duplicates()
+    params = pairs.sample(min(trend_pairs, len(pairs)), random_state=0).assign(p=1, d=1, q=1)
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+        params.to_csv(handle, index=False)
+
+    baseline = None
+    try:
+        for n_workers in processes:
+            start = time.perf_counter()
+            result = analyze_sharded(data, n_workers=n_workers, trend_kwargs={'param_path': handle.name})
+            elapsed = time.perf_counter() - start
+            if baseline is None:
+                baseline = (elapsed, result)
+            for name, frame in result.items():
+                pd.testing.assert_frame_equal(baseline[1][name], frame, obj=name)
+            print(f"rows={len(data):,} trend pairs={len(params)} processes={n_workers:<3} {elapsed:8.2f} s  "
+                  f"speedup={baseline[0] / elapsed:.2f}x")
+    finally:
+        os.remove(handle.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    parser.add_argument("--trend-pairs", type=int, default=200, help="Pairs given an ARIMA order")
+    args = parser.parse_args()
+    run(args.rows, args.processes, args.trend_pairs)
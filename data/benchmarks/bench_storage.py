@@ -0,0 +1,92 @@
+"""
+File size and load time of the cleaned price history stored as CSV (today's format,
+parsed with parse_dates/dayfirst like the backend did) versus Parquet partitioned by
+product and a single Feather file.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_storage.py --rows 1000000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.synthetic import make_price_frame
+from storage.columnar import load_frame, save_frame
+
+API_COLUMNS = ['producto', 'ciudad', 'fechaCaptura', 'precioPromedio']
+
+
+def size_of(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files)
+    return os.path.getsize(path)
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(n_rows):
+    data = make_price_frame(n_rows)
+    product = data['producto'].iloc[0]
+    workdir = tempfile.mkdtemp()
+    try:
+        paths = {
+            "csv": os.path.join(workdir, "cleaned_data.csv"),
+            "parquet": os.path.join(workdir, "cleaned_data.parquet"),
+            "feather": os.path.join(workdir, "cleaned_data.feather"),
+        }
+        for fmt, path in paths.items():
+            save_frame(data, path, partition_by='producto' if fmt == "parquet" else None)
+
+        def read_csv(**kwargs):
+            return pd.read_csv(paths["csv"], parse_dates=["fechaCaptura", "fechaCreacion"], dayfirst=True, **kwargs)
+
+        cases = {
+            "csv": {
+                "full": lambda: read_csv(),
+                "api columns": lambda: read_csv(usecols=API_COLUMNS + ["fechaCreacion"]),
+                "one product": lambda: (lambda d: d[d['producto'] == product])(read_csv()),
+            },
+            "parquet": {
+                "full": lambda: load_frame(paths["parquet"]),
+                "api columns": lambda: load_frame(paths["parquet"], columns=API_COLUMNS),
+                "one product": lambda: load_frame(paths["parquet"], filters=[('producto', '==', product)]),
+            },
+            "feather": {
+                "full": lambda: load_frame(paths["feather"]),
+                "api columns": lambda: load_frame(paths["feather"], columns=API_COLUMNS),
+                "one product": lambda: load_frame(paths["feather"], filters=[('producto', '==', product)]),
+            },
+        }
+
+        print(f"rows={len(data):,}")
+        for fmt, reads in cases.items():
+            line = f"  {fmt:<8} size={size_of(paths[fmt]) / 2**20:8.1f} MiB"
+            for label, read in reads.items():
+                elapsed, frame = timed(read)
+                line += f"  {label}={elapsed:7.3f} s"
+            _, frame = timed(reads["full"], repeat=1)
+            line += f"  in memory={frame.memory_usage(deep=True).sum() / 2**20:7.1f} MiB"
+            print(line)
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    args = parser.parse_args()
+    for n_rows in args.rows:
+        run(n_rows)
@@ -0,0 +1,324 @@
+"""
+End-to-end benchmark of the price pipeline on SIPSA-shaped synthetic data: time and
+memory of every stage, from cleaning through each data/analysis function and the trends
+to the backend snapshot and endpoints.
+
+Each stage reports its wall time, the peak resident memory above the level it started
+at (sampled every few milliseconds) and the resident memory it leaves behind. Endpoints
+report request latency percentiles with the response cache disabled. The report is
+written as JSON; pass an earlier report with --compare to print the change per stage.
+
+Raw files are generated once per size and seed in --workdir and reused. Sizes above
+--max-in-memory-rows only run the generator and the streaming cleaner.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_suite.py --rows 1e5 1e6 --report bench.json
+    python data/benchmarks/bench_suite.py --rows 1e6 --compare bench.json
+    python data/benchmarks/bench_suite.py --rows 1e8 --streaming --workdir /data/bench
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+BACKEND_DIR = os.path.join(DATA_DIR, "..", "backend")
+sys.path.insert(0, DATA_DIR)
+from benchmarks.synthetic import write_sipsa_csv
+from data_cleaning.clean_data import clean_data_streaming, load_and_clean_data, save_cleaned_data
+from analysis.inflation import compute_daily_inflation, compute_yoy_inflation
+from analysis.moving_avs_and_vol import add_moving_averages
+from analysis.anomalies import detect_anomalies
+from analysis.momentum import compute_rsi
+from analysis.indicators import compute_indicators
+from analysis.series_index import build_series_index
+from analysis.trend import compute_trends
+from analysis.user_metrics import detect_price_drops, detect_seasonal_patterns
+
+
+def resident_bytes():
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakSampler:
+    """Highest resident memory seen by a background thread while a stage runs."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = resident_bytes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, resident_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_bytes())
+
+
+class Run:
+    """Stage measurements of one dataset size."""
+
+    def __init__(self, n_rows):
+        self.n_rows = n_rows
+        self.meta = {}
+        self.stages = []
+
+    def measure(self, name, func, **extra):
+        gc.collect()
+        start_rss = resident_bytes()
+        with PeakSampler() as sampler:
+            start = time.perf_counter()
+            result = func()
+            seconds = time.perf_counter() - start
+        entry = {
+            'stage': name,
+            'seconds': round(seconds, 4),
+            'peak_mib': round((sampler.peak - start_rss) / 2**20, 1),
+            'rss_mib': round(resident_bytes() / 2**20, 1),
+            **extra,
+        }
+        self.stages.append(entry)
+        print(format_entry(entry))
+        return result
+
+    def skip(self, name, reason):
+        entry = {'stage': name, 'skipped': reason}
+        self.stages.append(entry)
+        print(format_entry(entry))
+
+    def to_dict(self):
+        return {'rows': self.n_rows, 'meta': self.meta, 'stages': self.stages}
+
+
+def format_entry(entry, previous=None):
+    if 'skipped' in entry:
+        return f"  {entry['stage']:<34} skipped ({entry['skipped']})"
+    line = f"  {entry['stage']:<34} {entry['seconds']:9.3f} s  peak +{entry['peak_mib']:8.1f} MiB  rss {entry['rss_mib']:8.1f} MiB"
+    if 'p50_ms' in entry:
+        line += f"  p50 {entry['p50_ms']:7.2f} ms  p95 {entry['p95_ms']:7.2f} ms  {entry['bytes']:,} B"
+    if previous and 'seconds' in previous and previous['seconds'] > 0:
+        line += f"  (was {previous['seconds']:.3f} s, x{previous['seconds'] / max(entry['seconds'], 1e-9):.2f}"
+        line += f", peak was +{previous['peak_mib']:.1f} MiB)"
+    return line
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=DATA_DIR).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'cpus': os.cpu_count(),
+        'machine': platform.machine(),
+    }
+
+
+def raw_file(run, workdir, seed):
+    # Generated once per size and seed, then reused by later runs
+    path = os.path.join(workdir, f"sipsa_{run.n_rows}_seed{seed}.csv")
+    info_path = path + ".json"
+    if os.path.exists(path) and os.path.exists(info_path):
+        with open(info_path) as handle:
+            return path, json.load(handle)
+    info = run.measure("generate.write_sipsa_csv", lambda: write_sipsa_csv(path, run.n_rows, seed=seed))
+    with open(info_path, "w") as handle:
+        json.dump(info, handle)
+    return path, info
+
+
+def analysis_stages(run, cleaned):
+    # Each function gets a fresh copy of the cleaned frame, made outside the timing
+    stages = [
+        ("analysis.compute_daily_inflation", compute_daily_inflation),
+        ("analysis.compute_yoy_inflation", compute_yoy_inflation),
+        ("analysis.add_moving_averages", add_moving_averages),
+        ("analysis.detect_anomalies", detect_anomalies),
+        ("analysis.compute_rsi", compute_rsi),
+        ("analysis.compute_indicators", compute_indicators),
+        ("analysis.build_series_index", build_series_index),
+        ("analysis.detect_price_drops", detect_price_drops),
+        ("analysis.detect_seasonal_patterns", detect_seasonal_patterns),
+    ]
+    for name, func in stages:
+        frame = cleaned.copy()
+        run.measure(name, lambda: func(frame))
+        del frame
+
+
+def trend_stage(run, cleaned, workdir, n_pairs):
+    # ARIMA fits cost the same per pair at any size, so only a sample of pairs is fitted
+    pairs = cleaned[['producto', 'ciudad']].drop_duplicates().head(n_pairs)
+    sample = cleaned.merge(pairs, on=['producto', 'ciudad'])
+    params_path = os.path.join(workdir, "bench_trend_params.csv")
+    pairs.assign(trend_slope=0.0, p=1.0, d=1.0, q=1.0).to_csv(params_path, index=False)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        run.measure(f"analysis.compute_trends ({len(pairs)} pairs)", lambda: compute_trends(sample, params_path))
+    return params_path
+
+
+def backend_stages(run, raw_path, cleaned_path, params_path, workdir, requests_per_endpoint):
+    sys.path.insert(0, BACKEND_DIR)
+    from snapshot import build_snapshot
+    import main
+
+    snapshot_dir = os.path.join(workdir, "analysis_snapshot")
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    run.measure("backend.build_snapshot (compute)",
+                lambda: build_snapshot(raw_path, cleaned_path, params_path, snapshot_dir))
+    current = run.measure("backend.build_snapshot (open)",
+                          lambda: build_snapshot(raw_path, cleaned_path, params_path, snapshot_dir))
+
+    from fastapi.testclient import TestClient
+    main.snapshot = current
+    main.response_cache.set_version(current.version)
+    main.response_cache.max_bytes = 0  # Every request is computed
+    client = TestClient(main.app)
+
+    rng = np.random.default_rng(0)
+    products, cities = current.products, current.cities
+    pair_index = current.series_index
+
+    def random_pair():
+        code = int(rng.integers(pair_index.n_pairs))
+        return int(pair_index.pair_product[code]), cities[pair_index.pair_city[code]]
+
+    def batch():
+        return {"pairs": [dict(zip(("productId", "city"), random_pair())) for _ in range(50)]}
+
+    endpoints = [
+        ("GET /products", lambda: client.get("/products")),
+        ("GET /cities", lambda: client.get("/cities")),
+        ("GET /price-data", lambda: client.get("/price-data/%d/%s" % random_pair())),
+        ("GET /price-data arrow", lambda: client.get("/price-data/%d/%s" % random_pair(), params={"format": "arrow"})),
+        ("GET /product-detail", lambda: client.get(f"/product-detail/{rng.integers(len(products))}")),
+        ("GET /recommendations", lambda: client.get("/recommendations",
+                                                     params={"city": cities[rng.integers(len(cities))], "limit": 10})),
+        ("POST /price-series (50 pairs)", lambda: client.post("/price-series", json=batch())),
+    ]
+    for name, call in endpoints:
+        def requests():
+            latencies, sizes = [], []
+            for _ in range(requests_per_endpoint):
+                start = time.perf_counter()
+                response = call()
+                latencies.append(time.perf_counter() - start)
+                sizes.append(len(response.content))
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}: HTTP {response.status_code} {response.text[:200]}")
+            return latencies, sizes
+
+        latencies, sizes = run.measure(name, requests)
+        entry = run.stages[-1]
+        entry['p50_ms'] = round(float(np.percentile(latencies, 50)) * 1000, 3)
+        entry['p95_ms'] = round(float(np.percentile(latencies, 95)) * 1000, 3)
+        entry['bytes'] = int(np.median(sizes))
+        entry['requests'] = requests_per_endpoint
+
+
+def run_size(n_rows, args):
+    print(f"rows={n_rows:,}")
+    run = Run(n_rows)
+    run.meta.update(environment())
+
+    raw_path, info = raw_file(run, args.workdir, args.seed)
+    run.meta.update(raw_rows=info['rows'], pairs=info['pairs'], days=info['days'], raw_mib=round(info['bytes'] / 2**20, 1))
+    print(f"  raw file {raw_path}: {info['rows']:,} rows, {info['pairs']} pairs, {info['days']} days, "
+          f"{info['bytes'] / 2**20:.0f} MiB")
+
+    stage_dir = os.path.join(args.workdir, f"run_{n_rows}")
+    shutil.rmtree(stage_dir, ignore_errors=True)
+    os.makedirs(stage_dir)
+    try:
+        if args.streaming or n_rows > args.max_in_memory_rows:
+            run.measure("clean.clean_data_streaming",
+                        lambda: clean_data_streaming(raw_path, os.path.join(stage_dir, "streamed.parquet")))
+        if n_rows > args.max_in_memory_rows:
+            run.skip("in-memory stages", f"more than {args.max_in_memory_rows:,} rows")
+            return run
+
+        cleaned = run.measure("clean.load_and_clean_data", lambda: load_and_clean_data(raw_path))
+        cleaned_path = os.path.join(stage_dir, "cleaned_data.parquet")
+        run.measure("clean.save_cleaned_data", lambda: save_cleaned_data(cleaned, cleaned_path))
+        run.meta['cleaned_rows'] = len(cleaned)
+
+        analysis_stages(run, cleaned)
+        if args.trend_pairs:
+            params_path = trend_stage(run, cleaned, stage_dir, args.trend_pairs)
+        else:
+            params_path = os.path.join(stage_dir, "bench_trend_params.csv")
+            pd.DataFrame(columns=['producto', 'ciudad', 'trend_slope', 'p', 'd', 'q']).to_csv(params_path, index=False)
+        del cleaned
+
+        if args.endpoint_requests:
+            backend_stages(run, raw_path, cleaned_path, params_path, stage_dir, args.endpoint_requests)
+    finally:
+        shutil.rmtree(stage_dir, ignore_errors=True)
+    return run
+
+
+def compare(runs, previous_path):
+    with open(previous_path) as handle:
+        previous = {run['rows']: run for run in json.load(handle)['runs']}
+    for run in runs:
+        before = previous.get(run.n_rows)
+        if before is None:
+            print(f"rows={run.n_rows:,}: not in {previous_path}")
+            continue
+        print(f"rows={run.n_rows:,} against {previous_path} ({before['meta'].get('commit')})")
+        stages = {entry['stage']: entry for entry in before['stages']}
+        for entry in run.stages:
+            print(format_entry(entry, stages.get(entry['stage'])))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=lambda value: int(float(value)), nargs="+", default=[100_000, 1_000_000],
+                        help="Raw rows per run, e.g. 1e5 1e6 1e7 1e8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=os.path.join(DATA_DIR, "benchmarks", "generated"),
+                        help="Where raw files are generated and kept")
+    parser.add_argument("--report", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Earlier JSON report to compare against")
+    parser.add_argument("--streaming", action="store_true", help="Also time the streaming cleaner")
+    parser.add_argument("--max-in-memory-rows", type=lambda value: int(float(value)), default=20_000_000)
+    parser.add_argument("--trend-pairs", type=int, default=20, help="Pairs fitted in the trend stage (0 skips it)")
+    parser.add_argument("--endpoint-requests", type=int, default=50, help="Requests per endpoint (0 skips them)")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    runs = [run_size(n_rows, args) for n_rows in args.rows]
+    if args.report:
+        with open(args.report, "w") as handle:
+            json.dump({'runs': [run.to_dict() for run in runs]}, handle, indent=1)
+    if args.compare:
+        compare(runs, args.compare)
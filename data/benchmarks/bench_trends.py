@@ -0,0 +1,52 @@
+"""
+Wall time of compute_trends for several worker counts.
+
+Usage (from the repository root):
+    python data/benchmarks/bench_trends.py --rows 200000 --jobs 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from analysis.trend import compute_trends
+from benchmarks.synthetic import make_price_frame
+
+
+def run(n_rows, jobs):
+    warnings.filterwarnings("ignore")
+    data = make_price_frame(n_rows)
+    pairs = data[['producto', 'ciudad']].drop_duplicates()
+    params = pairs.assign(trend_slope=0.0, p=1.0, d=1.0, q=1.0)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as handle:
+        params.to_csv(handle, index=False)
+
+    baseline = None
+    try:
+        for n_jobs in jobs:
+            start = time.perf_counter()
+            result = compute_trends(data, handle.name, n_jobs=n_jobs)
+            elapsed = time.perf_counter() - start
+            slopes = result['trend_slope'].to_numpy()
+            if baseline is None:
+                baseline = (elapsed, slopes)
+            assert np.array_equal(baseline[1], slopes, equal_nan=True)
+            print(f"rows={len(data):,} pairs={len(pairs)} n_jobs={n_jobs:<3} {elapsed:8.2f} s  "
+                  f"speedup={baseline[0] / elapsed:.2f}x")
+    finally:
+        os.remove(handle.name)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+    run(args.rows, args.jobs)
@@ -0,0 +1,219 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+
+def make_price_frame(n_rows, n_products=33, n_cities=21, seed=0):
+    """
+    Builds a synthetic price history shaped like the output of `load_and_clean_data`.
+    Args:
+        n_rows (int): Approximate number of rows to generate.
+        n_products (int): Number of distinct products.
+        n_cities (int): Number of distinct cities.
+        seed (int): Seed for the random generator.
+    Returns:
+        pd.DataFrame: Frame sorted by producto, ciudad and fechaCaptura.
+    """
+    rng = np.random.default_rng(seed)
+    n_pairs = n_products * n_cities
+    days = max(n_rows // n_pairs, 1)
+
+    products = np.array([f"producto {i:03d}" for i in range(n_products)], dtype=object)
+    cities = np.array([f"ciudad {i:02d}" for i in range(n_cities)], dtype=object)
+    dates = pd.date_range("2000-01-01", periods=days, freq="D")
+
+    # Random walk around a per-pair base price
+    base = rng.uniform(500, 20000, size=(n_pairs, 1))
+    steps = rng.normal(0, 0.01, size=(n_pairs, days))
+    prices = np.round(base * np.exp(np.cumsum(steps, axis=1)))
+
+    fechas = np.tile(dates.values, n_pairs)
+    data = pd.DataFrame({
+        'producto': np.repeat(products, n_cities * days),
+        'ciudad': np.tile(np.repeat(cities, days), n_products),
+        'codProducto': np.repeat(np.arange(n_products), n_cities * days),
+        'fechaCaptura': fechas,
+        'fechaCreacion': fechas,
+        'precioPromedio': prices.ravel(),
+    })
+    data['año'] = data['fechaCaptura'].dt.year
+    data['mes'] = data['fechaCaptura'].dt.month
+    return data
+
+
+RAW_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "raw")
+# Field order of promediosSipsaCiudad, as the harvester writes it
+SIPSA_COLUMNS = ['ciudad', 'codProducto', 'enviado', 'fechaCaptura', 'fechaCreacion', 'precioPromedio',
+                 'producto', 'regId']
+
+
+def sipsa_names(n_products, n_cities):
+    """Product and city names from the SIPSA lists in data/raw, with numbered variants beyond them."""
+    foods = pd.read_csv(os.path.join(RAW_DIR, "food.csv"))['producto'].tolist()
+    places = pd.read_csv(os.path.join(RAW_DIR, "location.csv"))['ciudad'].tolist()
+    products = [foods[i % len(foods)] + (f" tipo {i // len(foods)}" if i >= len(foods) else "")
+                for i in range(n_products)]
+    cities = [places[i % len(places)] + (f", mercado {i // len(places)}" if i >= len(places) else "")
+              for i in range(n_cities)]
+    return products, cities
+
+
+def default_shape(n_rows, coverage=0.7, quoted_days=2600):
+    """
+    Products and cities for a file of `n_rows`: about the ~600 pairs of the real service for
+    small files, and more pairs beyond ~10 years of quotes each, so histories stay plausible.
+    """
+    n_pairs = max(600, int(np.ceil(n_rows / quoted_days)))
+    n_cities = int(np.clip(np.round(np.sqrt(n_pairs / coverage / 3)), 21, 400))
+    n_products = int(np.ceil(n_pairs / coverage / n_cities))
+    return n_products, n_cities
+
+
+class SipsaGenerator:
+    """
+    Raw promediosSipsaCiudad rows with the irregularities of the real service, generated
+    window by window in date order (as a daily harvest appends them), so files of 10^8
+    rows are written in bounded memory.
+
+    - Products are not quoted in every city, and pairs start and stop at different dates.
+    - Quotes are missing on Sundays, on random days and over multi-week outages per pair.
+    - Prices follow a per-pair random walk with yearly seasonality per product.
+    - A few rows repeat (re-harvested days), carry zero or missing prices, or have names
+      with stray blanks and capitals.
+    """
+
+    def __init__(self, n_rows, n_products=None, n_cities=None, coverage=0.7, gap_rate=0.05,
+                 outages_per_pair=3, outage_days=14, noise_rate=0.001, seed=0, start="2013-01-01"):
+        self.rng = np.random.default_rng(seed)
+        rng = self.rng
+        self.noise_rate = noise_rate
+        self.gap_rate = gap_rate
+        if n_products is None or n_cities is None:
+            default_products, default_cities = default_shape(n_rows, coverage)
+            n_products = n_products or default_products
+            n_cities = n_cities or default_cities
+
+        products, cities = sipsa_names(n_products, n_cities)
+        self.products = np.array(products, dtype=object)
+        self.cities = np.array(cities, dtype=object)
+        # Names as they sometimes arrive: padded and upper-cased
+        self.noisy_products = np.array([f" {name.upper()} " for name in products], dtype=object)
+        self.noisy_cities = np.array([f"{name.lower()}  " for name in cities], dtype=object)
+
+        pairs = np.argwhere(rng.random((n_products, n_cities)) < coverage)
+        if not len(pairs):
+            pairs = np.array([[0, 0]])
+        self.pair_product, self.pair_city = pairs[:, 0], pairs[:, 1]
+        n_pairs = len(pairs)
+
+        # Days needed for about n_rows quotes: share of days quoted (no Sundays, gaps, late
+        # starts, early stops) times the share outside outages, which depends on the length
+        days = n_rows / n_pairs
+        for _ in range(20):
+            outage_share = np.exp(-outages_per_pair * outage_days / days)
+            days = n_rows / (n_pairs * (6 / 7) * (1 - gap_rate) * (1 - 0.2 / 4 - 0.1 / 4) * outage_share)
+        self.days = max(int(np.ceil(days)), 1)
+        self.start = pd.Timestamp(start)
+
+        # Late starters and early stops, and outage intervals per pair
+        self.first_day = np.where(rng.random(n_pairs) < 0.2, rng.integers(0, max(self.days // 2, 1), n_pairs), 0)
+        self.last_day = np.where(rng.random(n_pairs) < 0.1,
+                                 rng.integers(self.days // 2, self.days, n_pairs) if self.days > 1 else 1, self.days)
+        self.outage_start = rng.integers(0, self.days, (n_pairs, outages_per_pair))
+        self.outage_end = self.outage_start + rng.geometric(1 / outage_days, (n_pairs, outages_per_pair))
+
+        # Price model: level per pair, seasonality per product, walk state per pair
+        self.level = np.log(rng.uniform(500, 20000, n_products))[self.pair_product] \
+            + rng.normal(0, 0.1, n_cities)[self.pair_city]
+        self.season = rng.uniform(0, 0.15, n_products)[self.pair_product]
+        self.phase = rng.uniform(0, 2 * np.pi, n_products)[self.pair_product]
+        self.walk = np.zeros(n_pairs)
+        self.next_reg_id = 1
+
+    @property
+    def n_pairs(self):
+        return len(self.pair_product)
+
+    def windows(self, window_days=30):
+        """Yields raw frames of consecutive `window_days` days, rows in date then pair order."""
+        rng = self.rng
+        for first in range(0, self.days, window_days):
+            days = np.arange(first, min(first + window_days, self.days))
+            dates = self.start + pd.to_timedelta(days, unit="D")
+
+            # Underlying prices move every day, quoted or not
+            steps = rng.normal(0, 0.01, (len(days), self.n_pairs))
+            walk = self.walk + np.cumsum(steps, axis=0)
+            self.walk = walk[-1]
+            doy = dates.dayofyear.to_numpy()[:, None]
+            log_price = self.level + walk + self.season * np.sin(2 * np.pi * doy / 365.25 + self.phase)
+
+            d = days[:, None]
+            quoted = (d >= self.first_day) & (d < self.last_day) & (dates.dayofweek.to_numpy()[:, None] != 6)
+            quoted &= rng.random(quoted.shape) >= self.gap_rate
+            in_outage = (d[:, :, None] >= self.outage_start) & (d[:, :, None] < self.outage_end)
+            quoted &= ~in_outage.any(axis=2)
+
+            day_index, pair = np.nonzero(quoted)
+            n = len(pair)
+            if not n:
+                continue
+            prices = np.round(np.exp(log_price[day_index, pair]))
+            noise = rng.random((4, n)) < self.noise_rate
+            prices[noise[0]] = 0
+            prices[noise[1]] = np.nan
+
+            product, city = self.pair_product[pair], self.pair_city[pair]
+            capture = np.char.add(dates.strftime("%Y-%m-%d").to_numpy().astype(str), "T00:00:00-05:00")
+            created = np.char.add(dates.strftime("%Y-%m-%d").to_numpy().astype(str), "T14:00:00-05:00")
+            frame = pd.DataFrame({
+                'ciudad': np.where(noise[2], self.noisy_cities[city], self.cities[city]),
+                'codProducto': product + 1,
+                'enviado': np.zeros(n, dtype=np.int8),
+                'fechaCaptura': capture[day_index],
+                'fechaCreacion': created[day_index],
+                'precioPromedio': prices,
+                'producto': np.where(noise[3], self.noisy_products[product], self.products[product]),
+                'regId': np.arange(self.next_reg_id, self.next_reg_id + n),
+            }, columns=SIPSA_COLUMNS)
+            self.next_reg_id += n
+
+            # Days harvested twice repeat their rows verbatim
+            repeated = rng.random(n) < self.noise_rate
+            if repeated.any():
+                frame = pd.concat([frame, frame[repeated]], ignore_index=True)
+            yield frame
+
+
+def write_sipsa_csv(path, n_rows, **kwargs):
+    """
+    Writes a raw SIPSA-shaped price CSV of about `n_rows` rows, window by window.
+    Args:
+        path (str): Output CSV path (replaced once complete).
+        n_rows (int): Approximate number of rows.
+        **kwargs: Passed on to `SipsaGenerator` (products, cities, gaps, seed...).
+    Returns:
+        dict: Rows written, pairs, days and the file size in bytes.
+    """
+    generator = SipsaGenerator(n_rows, **kwargs)
+    tmp_path = f"{path}.tmp"
+    rows = 0
+    writer = schema = None
+    # Arrow's CSV writer: several times faster than to_csv, which matters at 10^8 rows
+    options = pacsv.WriteOptions(quoting_style="needed")
+    try:
+        for frame in generator.windows():
+            table = pa.Table.from_pandas(frame, preserve_index=False)
+            if writer is None:
+                schema = table.schema
+                writer = pacsv.CSVWriter(tmp_path, schema, write_options=options)
+            writer.write_table(table if table.schema == schema else table.cast(schema))
+            rows += len(frame)
+    finally:
+        if writer is not None:
+            writer.close()
+    os.replace(tmp_path, path)
+    return {'rows': rows, 'pairs': generator.n_pairs, 'days': generator.days, 'bytes': os.path.getsize(path)}
@@ -1,6 +1,17 @@
+import os
+import sys
+import shutil
+import argparse
+from urllib.parse import unquote
 import pandas as pd
 import numpy as np
 
+# Make the sibling `storage` package importable when this file is run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage.columnar import save_frame, load_frame, write_partition
+from storage.sqlite_store import PriceStore
+from data_cleaning.schema import read_raw_prices, parse_dates, add_year_month, normalize_names, memory_report
+
 def load_and_clean_data(filepath):
     """
     Loads the data, cleans it by ensuring correct data types and handles missing values.
@@ -9,20 +20,16 @@ def load_and_clean_data(filepath):
     Returns:
         pd.DataFrame: Cleaned DataFrame.
     """
-    # Load data
-    data = pd.read_csv(filepath, parse_dates=["fechaCaptura", "fechaCreacion"], dayfirst=True)
+    # Load data with the declared column types and parse the dates once, in their known format
+    data = read_raw_prices(filepath)
+    data = parse_dates(data)
 
-    # Ensure datetime fields are correctly parsed
-    data["fechaCaptura"] = pd.to_datetime(data["fechaCaptura"], errors="coerce")
-    data["fechaCreacion"] = pd.to_datetime(data["fechaCreacion"], errors="coerce")
-    
-    # Extract year and month from fechaCaptura
-    data['año'] = data['fechaCaptura'].dt.year
-    data['mes'] = data['fechaCaptura'].dt.month
-    
     # Remove rows with any essential columns being NaT or NaN
     data.dropna(subset=['fechaCaptura', 'producto', 'ciudad', 'precioPromedio'], inplace=True)
 
+    # Extract year and month from fechaCaptura
+    data = add_year_month(data)
+
     # Remove duplicates (if any)
     data.drop_duplicates(inplace=True)
     
@@ -46,6 +53,11 @@ def clean_product_and_city(data):
     Returns:
         pd.DataFrame: DataFrame with cleaned product and city columns.
     """
+    if isinstance(data['producto'].dtype, pd.CategoricalDtype) and isinstance(data['ciudad'].dtype, pd.CategoricalDtype):
+        # Typed ingest: normalize the categories, blank names become missing and are dropped
+        data = data.assign(producto=normalize_names(data['producto']), ciudad=normalize_names(data['ciudad']))
+        return data[data['producto'].notnull() & data['ciudad'].notnull()]
+
     # Remove rows with invalid product or city entries (empty, null, or non-sensible values)
     data = data[data['producto'].notnull() & data['ciudad'].notnull()]
     data = data[data['producto'].str.strip() != '']
@@ -57,20 +69,147 @@ def clean_product_and_city(data):
 
     return data
 
-def save_cleaned_data(data, output_filepath):
+def _drop_seen_rows(chunk, seen):
+    """
+    Drops rows whose hash was already seen, in this chunk or an earlier one.
+    Returns:
+        tuple: (deduplicated chunk, sorted array of every hash seen so far)
+    """
+    # Numbers are hashed as floats, so a value reads the same whether or not its chunk had gaps
+    hashed = chunk.apply(lambda c: c.astype(np.float64) if pd.api.types.is_numeric_dtype(c) else c)
+    hashes = pd.util.hash_pandas_object(hashed, index=False).to_numpy()
+    # First occurrence of each hash inside the chunk
+    _, first = np.unique(hashes, return_index=True)
+    keep = np.zeros(len(chunk), dtype=bool)
+    keep[first] = True
+    # ...that no earlier chunk contained
+    if len(seen):
+        positions = np.minimum(np.searchsorted(seen, hashes), len(seen) - 1)
+        keep &= seen[positions] != hashes
+    # Merge the new hashes into the sorted history instead of sorting it again
+    new = np.sort(hashes[keep])
+    seen = np.insert(seen, np.searchsorted(seen, new), new)
+    return chunk[keep], seen
+
+def clean_data_streaming(filepath, output_path, chunksize=500_000, partition_col='producto'):
+    """
+    Cleans a raw file too large for memory, chunk by chunk, with the same steps as
+    `load_and_clean_data`, and writes a Parquet dataset partitioned by `partition_col`.
+
+    Peak memory is one chunk, 8 bytes per distinct row for the duplicate hashes, and the
+    largest partition while it is sorted. Duplicates are found by 64-bit row hashes across
+    all chunks, and the price forward fill carries over chunk boundaries, so the rows kept
+    match the in-memory cleaning.
+    Args:
+        filepath (str): Path to the raw CSV file to be cleaned.
+        output_path (str): Directory of the partitioned dataset (replaced if it exists).
+        chunksize (int): Rows read per chunk.
+        partition_col (str): Column the output is partitioned by.
+    Returns:
+        dict: Rows read, duplicates dropped and rows written.
+    """
+    spill_root = output_path + ".spill"
+    tmp_root = output_path + ".tmp"
+    for path in (spill_root, tmp_root):
+        shutil.rmtree(path, ignore_errors=True)
+
+    seen = np.empty(0, dtype=np.uint64)
+    last_price = np.nan
+    stats = {'rows_read': 0, 'duplicates': 0, 'rows_written': 0}
+
+    for number, chunk in enumerate(read_raw_prices(filepath, chunksize=chunksize)):
+        stats['rows_read'] += len(chunk)
+        chunk = parse_dates(chunk)
+        # A copy, not a slice of the chunk read, since the next steps add and replace columns
+        chunk = chunk.dropna(subset=['fechaCaptura', 'producto', 'ciudad', 'precioPromedio']).copy()
+        chunk = add_year_month(chunk)
+
+        before = len(chunk)
+        chunk, seen = _drop_seen_rows(chunk, seen)
+        stats['duplicates'] += before - len(chunk)
+
+        # Forward fill prices, continuing from the last price of the previous chunk
+        prices = chunk['precioPromedio'].replace(0, np.nan)
+        if len(prices) and pd.isna(prices.iloc[0]):
+            prices.iloc[0] = last_price
+        chunk['precioPromedio'] = prices.ffill()
+        if len(chunk):
+            last_price = chunk['precioPromedio'].iloc[-1]
+
+        chunk = clean_product_and_city(chunk)
+
+        # Spill the chunk into one file per partition value
+        for value, part in chunk.groupby(partition_col, sort=False, observed=True):
+            write_partition(part, os.path.join(spill_root, f"chunk-{number:05d}"), partition_col, value)
+
+    # Gather each partition from every chunk, sort it and write it out
+    partitions = {}
+    for chunk_dir in sorted(os.listdir(spill_root)) if os.path.isdir(spill_root) else []:
+        for name in os.listdir(os.path.join(spill_root, chunk_dir)):
+            partitions.setdefault(name, []).append(os.path.join(spill_root, chunk_dir, name, "part-0.parquet"))
+
+    for name, files in partitions.items():
+        part = pd.concat([pd.read_parquet(path) for path in files], ignore_index=True)
+        part = part.sort_values(by=['ciudad', 'fechaCaptura'], kind='stable', ignore_index=True)
+        write_partition(part, tmp_root, partition_col, unquote(name.split("=", 1)[1]))
+        stats['rows_written'] += len(part)
+
+    shutil.rmtree(spill_root, ignore_errors=True)
+    shutil.rmtree(output_path, ignore_errors=True)
+    if os.path.isdir(tmp_root):
+        os.replace(tmp_root, output_path)
+    return stats
+
+def save_cleaned_data(data, output_filepath, partition_by='producto'):
     """
     Save the cleaned data to a specified file.
     Args:
         data (pd.DataFrame): Cleaned data.
-        output_filepath (str): Path where the cleaned data will be saved.
+        output_filepath (str): Path where the cleaned data will be saved. '.db' and '.sqlite'
+            paths are upserted into a PriceStore, '.csv' and '.feather' paths are written as
+            single files, anything else as a Parquet dataset.
+        partition_by (str): Column the Parquet dataset is partitioned by (None for one file).
     """
-    data.to_csv(output_filepath, index=False)
+    if output_filepath.endswith(('.db', '.sqlite')):
+        store = PriceStore(output_filepath)
+        try:
+            store.upsert_prices(data)
+        finally:
+            store.close()
+        return
+    save_frame(data, output_filepath, partition_by=partition_by)
+
+def load_cleaned_data(filepath, columns=None, filters=None):
+    """
+    Loads data saved by `save_cleaned_data`, reading only what is needed.
+    Args:
+        filepath (str): Path of the cleaned data.
+        columns (list): Columns to load (all when None).
+        filters (list): Row filters as (column, op, value) tuples, e.g. [('producto', '==', 'arroz')].
+    Returns:
+        pd.DataFrame: Cleaned DataFrame, sorted by product, city and capture date.
+    """
+    return load_frame(filepath, columns=columns, filters=filters)
 
 # Example usage
 if __name__ == "__main__":
-    raw_data_filepath = 'data/raw/dummy.csv'  # Path to the raw data
-    cleaned_data_filepath = 'data/processed/cleaned_data.csv'  # Path to save the cleaned data
-    
-    cleaned_data = load_and_clean_data(raw_data_filepath)
-    save_cleaned_data(cleaned_data, cleaned_data_filepath)
-    print(f"Data cleaned and saved to {cleaned_data_filepath}")
+    parser = argparse.ArgumentParser(description="Cleans the raw SIPSA prices")
+    parser.add_argument("--raw", default="data/raw/dummy.csv", help="Raw price CSV")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Clean in chunks, for files that do not fit in memory (skips the SQLite store)")
+    parser.add_argument("--chunksize", type=int, default=500_000, help="Rows per chunk in streaming mode")
+    args = parser.parse_args()
+
+    raw_data_filepath = args.raw  # Path to the raw data
+    cleaned_data_filepath = 'data/processed/cleaned_data.parquet'  # Path to save the cleaned data
+    price_store_filepath = 'data/processed/prices.db'  # SQLite store queried by the API
+
+    if args.streaming:
+        stats = clean_data_streaming(raw_data_filepath, cleaned_data_filepath, chunksize=args.chunksize)
+        print(f"Data cleaned and saved to {cleaned_data_filepath}: {stats}")
+    else:
+        cleaned_data = load_and_clean_data(raw_data_filepath)
+        print(memory_report(cleaned_data))
+        save_cleaned_data(cleaned_data, cleaned_data_filepath)
+        save_cleaned_data(cleaned_data, price_store_filepath)
+        print(f"Data cleaned and saved to {cleaned_data_filepath} and {price_store_filepath}")
@@ -0,0 +1,95 @@
+import numpy as np
+import pandas as pd
+
+
+# Column types of the raw SIPSA price CSV (promediosSipsaCiudad), declared instead of inferred.
+# Dates are read as categoricals: a few thousand distinct strings repeated over millions of rows.
+RAW_DTYPES = {
+    'producto': 'category',
+    'ciudad': 'category',
+    'precioPromedio': np.float32,
+    'fechaCaptura': 'category',
+    'fechaCreacion': 'category',
+}
+RAW_DATE_COLUMNS = ('fechaCaptura', 'fechaCreacion')
+# Zeep dumps dates as '2017-11-23 00:00:00-05:00', the web service as '2017-11-23T00:00:00-05:00'
+RAW_DATE_FORMAT = 'ISO8601'
+
+YEAR_DTYPE = np.int16
+MONTH_DTYPE = np.int8
+
+
+def read_raw_prices(filepath, **kwargs):
+    """
+    Reads a raw SIPSA price CSV with the declared column types.
+    Args:
+        filepath (str): Path to the raw CSV file.
+        **kwargs: Passed on to `pd.read_csv` (e.g. chunksize).
+    Returns:
+        pd.DataFrame: Raw frame with categorical keys, float32 prices and unparsed dates
+        (see `parse_dates`), or a reader of such frames when chunksize is given.
+    """
+    header = pd.read_csv(filepath, nrows=0).columns
+    dtypes = {column: dtype for column, dtype in RAW_DTYPES.items() if column in header}
+    return pd.read_csv(filepath, dtype=dtypes, **kwargs)
+
+
+def parse_dates(data):
+    """
+    Parses the date columns in place with the declared format. Each distinct date string is
+    parsed once, without per-row format inference, and invalid dates become NaT. A column where
+    no value matches the format (e.g. a hand-made '23/11/2017' file) falls back to day-first inference.
+    """
+    for column in RAW_DATE_COLUMNS:
+        if column not in data.columns:
+            continue
+        raw = data[column]
+        if isinstance(raw.dtype, pd.CategoricalDtype):
+            values, codes = pd.Index(raw.cat.categories), raw.cat.codes.to_numpy()
+        else:
+            values, codes = pd.Index(raw), None
+
+        parsed = pd.to_datetime(values, format=RAW_DATE_FORMAT, errors="coerce")
+        if len(values) and parsed.isna().all():
+            parsed = pd.to_datetime(values, dayfirst=True, errors="coerce")
+        if codes is not None:
+            parsed = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+        data[column] = pd.Series(parsed, index=data.index)
+    return data
+
+
+def add_year_month(data):
+    data['año'] = data['fechaCaptura'].dt.year.astype(YEAR_DTYPE)
+    data['mes'] = data['fechaCaptura'].dt.month.astype(MONTH_DTYPE)
+    return data
+
+
+def normalize_names(values):
+    """
+    Strips and lowercases a categorical column by rewriting its few categories instead of
+    every row. Names that become equal are merged and blank names become missing.
+    """
+    names = values.cat.categories.astype(str).str.strip().str.lower()
+    categories, new_codes = np.unique(np.asarray(names, dtype=object), return_inverse=True)
+    codes = values.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, new_codes[codes], -1)
+    if len(categories) and categories[0] == '':
+        codes = np.where(codes == 0, -1, codes - 1)
+        categories = categories[1:]
+    normalized = pd.Categorical.from_codes(codes, categories=categories)
+    return pd.Series(normalized, index=values.index, name=values.name).cat.remove_unused_categories()
+
+
+def memory_report(data):
+    """
+    Memory used by each column of a frame.
+    Returns:
+        pd.DataFrame: dtype and MiB per column, largest first, with a total row.
+    """
+    usage = data.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({
+        'dtype': data.dtypes.astype(str),
+        'MiB': usage / 2**20,
+    }).sort_values('MiB', ascending=False)
+    report.loc['total'] = ['', report['MiB'].sum()]
+    return report.round({'MiB': 2})
@@ -1,43 +1,38 @@
+"""
+Searches ARIMA (p, d, q) orders per product-city pair with auto_arima and stores them
+in arima_trend_params.csv.
+
+Finished pairs are appended to a checkpoint file as soon as their search ends, so an
+interrupted run resumes where it stopped. Pairs whose price series did not change since
+their stored fit are skipped, and the others start their search from the stored order.
+
+Usage (from the repository root):
+    python data/parameters/train_arima_params.py --data data/dummy.csv --workers 4
+"""
 from pmdarima import auto_arima
 import pandas as pd
 import numpy as np
+import argparse
+import hashlib
+import json
+import os
 import warnings
 import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 
-warnings.filterwarnings("ignore")
-data = pd.read_csv("dummy.csv", parse_dates=["fechaCaptura"], dayfirst=True)
-data = data.sort_values(['producto', 'ciudad', 'fechaCaptura'])
-
-# Number of unique cities
-num_cities = data['ciudad'].nunique()
-
-# Number of unique products
-num_products = data['producto'].nunique()
-
-# Number of unique (city, product) pairs
-num_city_product_pairs = data[['ciudad', 'producto']].drop_duplicates().shape[0]
+PARAM_COLUMNS = ['producto', 'ciudad', 'trend_slope', 'p', 'd', 'q', 'n_obs', 'data_hash']
 
-print(f"Unique cities: {num_cities}")
-print(f"Unique products: {num_products}")
-print(f"Unique city-product pairs: {num_city_product_pairs}")
-
-
-def compute_arima_trend_and_params(series):
-    if not hasattr(compute_arima_trend_and_params, "call_count"):
-        compute_arima_trend_and_params.call_count = 0
-
-    # Increment the counter
-    compute_arima_trend_and_params.call_count += 1
-    print(f"\nFunction call #{compute_arima_trend_and_params.call_count}")
 
+def compute_arima_trend_and_params(series, start_p=5, start_q=0):
+    warnings.filterwarnings("ignore")
     try:
         # Fit ARIMA, letting it select d (limited to 0 or 1) and q, but p is fixed
         model = auto_arima(
             series,
-            start_p=5,
+            start_p=start_p,
             max_p=10,
-            start_q=0,
+            start_q=start_q,
             max_q=5,
             d=None,         # Let auto_arima decide
             max_d=1,        # Limit differencing to 1
@@ -49,74 +44,147 @@ def compute_arima_trend_and_params(series):
 
         # Forecast the next period
         forecast = model.predict(n_periods=1)
-        trend = forecast.iloc[0] - series.iloc[-1]
+        trend = np.asarray(forecast)[0] - series[-1]
 
         # Extract ARIMA order (p, d, q)
         p, d, q = model.order
 
         return {'trend_slope': trend, 'p': p, 'd': d, 'q': q}
-    
+
     except Exception as e:
         print("Error processing series:")
         traceback.print_exc()  # This prints the full error stack trace
-        print("Series preview:", series.head())
         print("Series length:", len(series))
-        print("Series unique values:", series.unique())
+        print("Series unique values:", np.unique(series))
         return {'trend_slope': np.nan, 'p': None, 'd': None, 'q': None}
 
 
-# Optional: limit to a few city-product pairs
-n_test = 5
-test_keys = data[['producto', 'ciudad']].drop_duplicates().head(n_test)
-filtered_data = data.merge(test_keys, on=['producto', 'ciudad'])
-
-# try:
-#     # Store results manually per group
-#     results = []
-#     
-#     for (producto, ciudad), group in filtered_data.groupby(['producto', 'ciudad']):
-#         series = group['precioPromedio']
-#         result = compute_arima_trend_and_params(series)
-#         result['producto'] = producto
-#         result['ciudad'] = ciudad
-#         results.append(result)
-#     
-#     # Build proper DataFrame
-#     trend_results = pd.DataFrame(results)
-#     
-#     # Reorder columns if needed
-#     trend_results = trend_results[['producto', 'ciudad', 'trend_slope', 'p', 'd', 'q']]
-#     
-#     # Save
-#     trend_results.to_csv('arima_trend_params.csv', index=False)
-#     print(trend_results.head())
-# 
-# 
-# except Exception as e:
-#     print(f"Error in data processing: {e}")
-
-
-try:
-# Apply ARIMA parameter computation
-    # Store results manually per group
-    results = []
-    
+def series_hash(values):
+    # Identifies the exact price history a pair was fitted on
+    return hashlib.sha1(np.ascontiguousarray(values, dtype=np.float64).tobytes()).hexdigest()
+
+
+def train_pair(producto, ciudad, values, start_p, start_q):
+    result = compute_arima_trend_and_params(values, start_p=start_p, start_q=start_q)
+    result.update({'producto': producto, 'ciudad': ciudad,
+                   'n_obs': len(values), 'data_hash': series_hash(values)})
+    return result
+
+
+def read_checkpoint(checkpoint_path):
+    # Results of the pairs finished by an interrupted run, keyed by pair
+    done = {}
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # Partially written last line of a crashed run
+            done[(row['producto'], row['ciudad'])] = row
+    return done
+
+
+def read_params(params_path):
+    if not os.path.exists(params_path):
+        return pd.DataFrame(columns=PARAM_COLUMNS)
+    params = pd.read_csv(params_path)
+    for column in PARAM_COLUMNS:
+        if column not in params.columns:
+            params[column] = np.nan
+    return params
+
+
+def warm_start(row, default_p=5, default_q=0):
+    # Stored order of a pair as the starting point of its search
+    if row is None or pd.isna(row['p']) or pd.isna(row['q']):
+        return default_p, default_q
+    return int(row['p']), int(row['q'])
+
+
+def train(data_path, params_path, workers=None, checkpoint_path=None, retrain_all=False):
+    """
+    Runs the auto_arima search for every pair whose data changed and updates the parameter file.
+    Args:
+        data_path (str): Raw SIPSA CSV with producto, ciudad, fechaCaptura and precioPromedio.
+        params_path (str): Parameter CSV to warm start from and to update.
+        workers (int): Number of worker processes (defaults to the number of cores).
+        checkpoint_path (str): JSON-lines file of finished pairs (defaults to params_path + '.checkpoint').
+        retrain_all (bool): Search every pair, even those whose data did not change.
+    Returns:
+        pd.DataFrame: The updated parameters.
+    """
+    checkpoint_path = checkpoint_path or params_path + ".checkpoint"
+
+    data = pd.read_csv(data_path, parse_dates=["fechaCaptura"], dayfirst=True)
+    data = data.sort_values(['producto', 'ciudad', 'fechaCaptura'])
+
+    print(f"Unique cities: {data['ciudad'].nunique()}")
+    print(f"Unique products: {data['producto'].nunique()}")
+    print(f"Unique city-product pairs: {data[['ciudad', 'producto']].drop_duplicates().shape[0]}")
+
+    params = read_params(params_path)
+    stored = {(row['producto'], row['ciudad']): row for row in params.to_dict('records')}
+    done = read_checkpoint(checkpoint_path)
+
+    pending = []
+    results = {}
     for (producto, ciudad), group in data.groupby(['producto', 'ciudad']):
-        series = group['precioPromedio']
-        result = compute_arima_trend_and_params(series)
-        result['producto'] = producto
-        result['ciudad'] = ciudad
-        results.append(result)
-    
-    # Build proper DataFrame
-    trend_results = pd.DataFrame(results)
-    
-    # Reorder columns if needed
-    trend_results = trend_results[['producto', 'ciudad', 'trend_slope', 'p', 'd', 'q']]
-    
-    # Save
-    trend_results.to_csv('arima_trend_params.csv', index=False)
+        key = (producto, ciudad)
+        values = group['precioPromedio'].to_numpy(dtype=np.float64)
+        digest = series_hash(values)
+        previous = stored.get(key)
+
+        if key in done and done[key]['data_hash'] == digest:
+            results[key] = done[key]
+        elif not retrain_all and previous is not None and previous['data_hash'] == digest:
+            results[key] = previous
+        else:
+            pending.append((producto, ciudad, values, *warm_start(previous)))
+
+    print(f"{len(results)} pairs up to date, {len(pending)} to search")
+
+    with open(checkpoint_path, "a+", encoding="utf-8") as checkpoint, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        # Terminate a line left half written by a crash before appending to it
+        if checkpoint.tell() > 0:
+            checkpoint.seek(checkpoint.tell() - 1)
+            if checkpoint.read(1) != "\n":
+                checkpoint.write("\n")
+        futures = [pool.submit(train_pair, *task) for task in pending]
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results[(result['producto'], result['ciudad'])] = result
+            checkpoint.write(json.dumps(result, default=float) + "\n")
+            checkpoint.flush()
+            print(f"[{i}/{len(pending)}] {result['producto']}, {result['ciudad']}: "
+                  f"order=({result['p']}, {result['d']}, {result['q']})")
+
+    # Pairs that no longer appear in the data keep their stored parameters
+    for key, row in stored.items():
+        results.setdefault(key, row)
+
+    trend_results = pd.DataFrame(list(results.values()))[PARAM_COLUMNS]
+    trend_results = trend_results.sort_values(['producto', 'ciudad']).reset_index(drop=True)
+
+    tmp_path = params_path + ".tmp"
+    trend_results.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, params_path)
+    os.remove(checkpoint_path)
+    return trend_results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default="data/dummy.csv", help="Raw SIPSA price CSV")
+    parser.add_argument("--params", default="data/parameters/arima_trend_params.csv",
+                        help="ARIMA parameter CSV to warm start from and update")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <params>.checkpoint)")
+    parser.add_argument("--retrain-all", action="store_true", help="Search every pair, even unchanged ones")
+    args = parser.parse_args()
+
+    trend_results = train(args.data, args.params, workers=args.workers,
+                          checkpoint_path=args.checkpoint, retrain_all=args.retrain_all)
     print(trend_results.head())
-
-except Exception as e:
-    print(f"Error in data processing: {e}")
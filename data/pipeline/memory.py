@@ -0,0 +1,73 @@
+import os
+import re
+import resource
+import threading
+
+_SIZE_UNITS = {'': 1, 'K': 2 ** 10, 'M': 2 ** 20, 'G': 2 ** 30, 'T': 2 ** 40}
+
+
+def resident_memory_bytes():
+    """Current resident set size of the process (peak size where /proc is not available)."""
+    try:
+        with open("/proc/self/statm") as handle:
+            return int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def parse_size(text):
+    """
+    Parses a byte size such as '512M', '4G' or '1.5GiB' (binary units).
+    Raises:
+        ValueError: If the text is not a size.
+    """
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*", str(text).upper())
+    if match is None:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+class MemoryMonitor:
+    """
+    Samples the resident memory on a background thread and keeps the peak seen while
+    each named span (e.g. a pipeline stage) was open.
+    """
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.current = resident_memory_bytes()
+        self._peaks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        current = resident_memory_bytes()
+        with self._lock:
+            self.current = current
+            for name, peak in self._peaks.items():
+                self._peaks[name] = max(peak, current)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def open(self, name):
+        self._sample()
+        with self._lock:
+            self._peaks[name] = self.current
+
+    def close(self, name):
+        """Closes a span and returns its (resident memory now, peak while open)."""
+        self._sample()
+        with self._lock:
+            return self.current, self._peaks.pop(name)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
@@ -0,0 +1,303 @@
+import glob
+import hashlib
+import json
+import os
+import shutil
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import MappingProxyType
+from typing import Callable, Mapping, NamedTuple
+
+import pandas as pd
+import pyarrow.feather as feather
+
+from pipeline.memory import MemoryMonitor
+
+
+class Stage(NamedTuple):
+    """
+    One step of a pipeline.
+
+    `func` is called with the results of the `inputs` stages (positionally, in order)
+    and the `params` as keyword arguments, and returns a DataFrame, or a dict of named
+    DataFrames that later stages take as 'stage.name' inputs. A stage with `outputs` is
+    a sink: it writes those paths itself and its result is not kept.
+    """
+    name: str
+    func: Callable
+    inputs: tuple = ()
+    params: Mapping = MappingProxyType({})  # Read-only, so no stage can change the default of the others
+    sources: tuple = ()   # Files or directories the stage reads, hashed into its key
+    outputs: tuple = ()   # Paths written by a sink stage
+    cache: bool = True    # False for cheap loaders whose result is not worth storing
+    version: int = 1      # Bumped when the stage's code changes its result
+
+
+def _stage_of(input_name):
+    # 'stage' or 'stage.part' -> 'stage'
+    return input_name.split(".", 1)[0]
+
+
+def _resolve(results, input_name):
+    stage_name, _, part = input_name.partition(".")
+    result = results[stage_name]
+    return result[part] if part else result
+
+
+def _hash_path(digest, path):
+    # Contents of a file, or of every file under a directory, in a stable order
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+    elif os.path.exists(path):
+        files = [path]
+    else:
+        digest.update(f"missing:{path}".encode("utf-8"))
+        return
+    for name in files:
+        digest.update(os.path.relpath(name, path).encode("utf-8"))
+        with open(name, "rb") as handle:
+            for block in iter(lambda: handle.read(1 << 20), b""):
+                digest.update(block)
+
+
+def stage_key(stage, input_keys):
+    """
+    Cache key of a stage: a hash of its definition, parameters and source files, and of
+    the keys of its inputs, so a change anywhere upstream changes every key below it.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    definition = [stage.name, stage.version, f"{stage.func.__module__}.{stage.func.__qualname__}",
+                  dict(stage.params), list(stage.inputs), list(stage.outputs), list(input_keys)]
+    digest.update(json.dumps(definition, sort_keys=True, default=str).encode("utf-8"))
+    for path in stage.sources:
+        _hash_path(digest, path)
+    return digest.hexdigest()
+
+
+def topological_order(stages):
+    """
+    Orders stages so every stage comes after its inputs.
+    Raises:
+        ValueError: On duplicate names, unknown inputs or cycles.
+    """
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage {stage.name!r}")
+        by_name[stage.name] = stage
+
+    ordered, state = [], {}
+
+    def visit(name, path):
+        if name not in by_name:
+            raise ValueError(f"Stage {path[-1]!r} depends on unknown stage {name!r}")
+        if state.get(name) == "done":
+            return
+        if state.get(name) == "visiting":
+            raise ValueError(f"Cycle between stages: {' -> '.join(path + [name])}")
+        state[name] = "visiting"
+        for dependency in by_name[name].inputs:
+            visit(_stage_of(dependency), path + [name])
+        state[name] = "done"
+        ordered.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name, [])
+    return ordered
+
+
+class StageCache:
+    """
+    Stage results stored as Feather files (a directory of them for a dict of frames) and
+    sink markers, one entry per stage.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _frame_path(self, name, key):
+        return os.path.join(self.directory, f"{name}-{key}.feather")
+
+    def _marker_path(self, name):
+        return os.path.join(self.directory, f"{name}.done")
+
+    def has(self, stage, key):
+        if stage.outputs:
+            marker = self._marker_path(stage.name)
+            if not all(os.path.exists(path) for path in stage.outputs) or not os.path.exists(marker):
+                return False
+            with open(marker) as handle:
+                return handle.read().strip() == key
+        return os.path.exists(self._frame_path(stage.name, key)) or os.path.isdir(self._parts_path(stage.name, key))
+
+    def _parts_path(self, name, key):
+        return os.path.join(self.directory, f"{name}-{key}")
+
+    def load(self, stage, key):
+        parts = self._parts_path(stage.name, key)
+        if os.path.isdir(parts):
+            return {name[:-len(".feather")]: feather.read_feather(os.path.join(parts, name))
+                    for name in sorted(os.listdir(parts))}
+        return feather.read_feather(self._frame_path(stage.name, key))
+
+    def store(self, stage, key, result):
+        if stage.outputs:
+            path = self._marker_path(stage.name)
+        elif isinstance(result, dict):
+            path = self._parts_path(stage.name, key)
+        else:
+            path = self._frame_path(stage.name, key)
+        tmp_path = path + ".tmp"
+        if stage.outputs:
+            with open(tmp_path, "w") as handle:
+                handle.write(key)
+        elif isinstance(result, dict):
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            for name, frame in result.items():
+                feather.write_feather(frame.reset_index(drop=True), os.path.join(tmp_path, f"{name}.feather"),
+                                      compression="lz4")
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            feather.write_feather(result.reset_index(drop=True), tmp_path, compression="lz4")
+        os.replace(tmp_path, path)
+
+        # Older results of the stage can never be hit again once its inputs moved on
+        for old in glob.glob(os.path.join(self.directory, glob.escape(stage.name) + "-*")):
+            if old == path or old.endswith(".tmp"):
+                continue
+            if os.path.isdir(old):
+                shutil.rmtree(old)
+            else:
+                os.remove(old)
+
+
+def run_stages(stages, cache_dir, max_workers=None, force=(), memory_budget=None):
+    """
+    Runs a pipeline, skipping every stage whose cached result is still valid.
+
+    Stages with all their inputs available run concurrently on a thread pool (the heavy
+    stages spend their time in NumPy, pandas or worker processes). Cached inputs are only
+    read when a stage that needs them has to run, and results are released as soon as
+    their last consumer finishes. With a memory budget, no further stage starts while the
+    resident memory is above it, so concurrent stages do not stack their peaks.
+    Args:
+        stages (list): Stage definitions.
+        cache_dir (str): Directory of the cached results.
+        max_workers (int): Concurrent stages (defaults to the executor's default).
+        force (iterable): Names of stages to run even when cached.
+        memory_budget (int): Resident memory, in bytes, above which no stage is started.
+    Returns:
+        list: One {stage, status, seconds, rows, rss, peak_rss, key} dict per stage, in
+        run order (rows of the largest frame for a stage returning several; resident
+        memory in bytes when the stage finished and the process peak while it ran), where
+        status is 'ran', 'loaded' (read from the cache for a stage that ran), 'cached'
+        (valid and not needed) or 'skipped' (an uncached stage nothing needed).
+    Raises:
+        ValueError: On an invalid stage graph or unknown forced stage.
+    """
+    ordered = topological_order(stages)
+    by_name = {stage.name: stage for stage in ordered}
+    unknown = set(force) - set(by_name)
+    if unknown:
+        raise ValueError(f"Unknown stages to force: {', '.join(sorted(unknown))}")
+    cache = StageCache(cache_dir)
+
+    keys = {}
+    for stage in ordered:
+        keys[stage.name] = stage_key(stage, [keys[_stage_of(name)] for name in stage.inputs])
+    dependencies = {stage.name: {_stage_of(name) for name in stage.inputs} for stage in ordered}
+
+    # Walk back from the stages that must run to the inputs they need
+    actions = {}
+    for stage in reversed(ordered):
+        needed = any(stage.name in dependencies[name] for name, action in actions.items() if action == "run")
+        if stage.name in force or (stage.cache or stage.outputs) and not cache.has(stage, keys[stage.name]):
+            actions[stage.name] = "run"
+        elif not stage.cache:
+            actions[stage.name] = "run" if needed else None
+        else:
+            actions[stage.name] = "load" if needed else None
+
+    consumers = {stage.name: sum(1 for other in ordered
+                                 if actions[other.name] == "run" and stage.name in dependencies[other.name])
+                 for stage in ordered}
+    results, report = {}, {}
+
+    def execute(stage):
+        start = time.perf_counter()
+        if actions[stage.name] == "load":
+            result = cache.load(stage, keys[stage.name])
+        else:
+            result = stage.func(*(_resolve(results, name) for name in stage.inputs), **dict(stage.params))
+            if stage.cache or stage.outputs:
+                cache.store(stage, keys[stage.name], result)
+        return result, time.perf_counter() - start
+
+    pending = [stage for stage in ordered if actions[stage.name] is not None]
+    for stage in ordered:
+        if actions[stage.name] is None:
+            report[stage.name] = {"stage": stage.name, "status": "cached" if stage.cache else "skipped",
+                                  "seconds": 0.0, "rows": None, "rss": None, "peak_rss": None,
+                                  "key": keys[stage.name]}
+
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool, MemoryMonitor() as monitor:
+        while pending or running:
+            for stage in [stage for stage in pending if dependencies[stage.name].issubset(results)]:
+                if running and memory_budget is not None and monitor.current >= memory_budget:
+                    break  # Wait for a running stage to finish and free its memory
+                pending.remove(stage)
+                monitor.open(stage.name)
+                running[pool.submit(execute, stage)] = stage
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                rss, peak_rss = monitor.close(stage.name)
+                try:
+                    result, seconds = future.result()
+                except Exception:
+                    print(f"Stage {stage.name} failed, waiting for running stages to finish")
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+                if not stage.outputs and consumers[stage.name]:
+                    results[stage.name] = result
+                elif not stage.outputs:
+                    results[stage.name] = None  # Nothing downstream needs it
+                frames = result.values() if isinstance(result, dict) else [result]
+                rows = [len(frame) for frame in frames if isinstance(frame, pd.DataFrame)]
+                report[stage.name] = {
+                    "stage": stage.name, "status": "ran" if actions[stage.name] == "run" else "loaded",
+                    "seconds": seconds, "rows": max(rows) if rows else None, "rss": rss, "peak_rss": peak_rss,
+                    "key": keys[stage.name],
+                }
+                if memory_budget is not None and peak_rss > memory_budget:
+                    print(f"Stage {stage.name} peaked at {peak_rss / 2 ** 20:,.0f} MiB, "
+                          f"above the {memory_budget / 2 ** 20:,.0f} MiB budget")
+                for name in dependencies[stage.name]:
+                    consumers[name] -= 1
+                    if consumers[name] == 0:
+                        results[name] = None  # Last consumer is done, release the frame
+                if stage.outputs:
+                    results[stage.name] = None
+
+    return [report[stage.name] for stage in ordered]
+
+
+def _mib(value):
+    return "" if value is None else f"{value / 2 ** 20:,.0f}"
+
+
+def print_report(report, elapsed=None):
+    """
+    Prints one line per stage with its status, wall time, rows and resident memory
+    (MiB when it finished and peak while it ran), then the total wall time.
+    """
+    print(f"{'stage':<16} {'status':<8} {'seconds':>9} {'rows':>12} {'rss MiB':>9} {'peak MiB':>9}")
+    for entry in report:
+        rows = "" if entry["rows"] is None else f"{entry['rows']:,}"
+        print(f"{entry['stage']:<16} {entry['status']:<8} {entry['seconds']:>9.2f} {rows:>12} "
+              f"{_mib(entry['rss']):>9} {_mib(entry['peak_rss']):>9}")
+    if elapsed is not None:
+        print(f"{'total':<16} {'':<8} {elapsed:>9.2f}")
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analysis.indicators import INDICATOR_COLUMNS, indicator_columns
+from analysis.trend import POOL_CONTEXT, compute_trend_slopes
+from analysis.user_metrics import price_drop_columns, monthly_price_averages
+
+# Columns every shard reads, and the row-aligned columns it writes back
+SHARD_INPUTS = ('producto', 'ciudad', 'año', 'mes', 'precioPromedio')
+ROW_OUTPUTS = {'indicators': INDICATOR_COLUMNS, 'price_drops': ['prev_price', 'price_drop']}
+
+# Peak memory of the chain per shard row: its inputs, the derived columns and the
+# temporaries of the rolling windows (about 110 bytes measured), with some headroom
+SHARD_BYTES_PER_ROW = 160
+
+
+def shard_bounds(product_codes, n_shards):
+    """
+    Splits rows grouped by product into at most `n_shards` contiguous ranges of whole
+    products with similar row counts.
+    Returns:
+        np.ndarray: Row boundaries, from 0 to the number of rows.
+    """
+    n = len(product_codes)
+    starts = np.flatnonzero(np.r_[True, product_codes[1:] != product_codes[:-1]]) if n else np.zeros(1, np.int64)
+    targets = np.arange(1, n_shards) * (n / n_shards)
+    cuts = starts[np.minimum(np.searchsorted(starts, targets), len(starts) - 1)]
+    return np.unique(np.r_[0, cuts, n])
+
+
+def _shard_path(directory, name, shard=None):
+    return os.path.join(directory, f"{name}.npy" if shard is None else f"{name}-{shard}.npy")
+
+
+def analyze_shard(directory, shard, lo, hi, dtypes, windows, trend_kwargs):
+    """
+    Runs the indicator, price drop, trend and seasonality chain on rows [lo, hi) of the
+    memory-mapped input columns. Row-aligned results are written next to the inputs;
+    the per-pair tables, which are small, are returned.
+    """
+    columns = {}
+    for column in SHARD_INPUTS:
+        values = np.load(_shard_path(directory, column), mmap_mode='r')[lo:hi]
+        dtype = dtypes[column]
+        if isinstance(dtype, pd.CategoricalDtype):
+            columns[column] = pd.Categorical.from_codes(values, dtype=dtype)
+        else:
+            columns[column] = np.asarray(values)
+    data = pd.DataFrame(columns)
+
+    # Each group of derived columns goes to disk before the next one is computed
+    for derive, kwargs in ((indicator_columns, windows), (price_drop_columns, {})):
+        for column, values in derive(data, **kwargs).items():
+            np.save(_shard_path(directory, column, shard), values)
+
+    trends = compute_trend_slopes(data, n_jobs=1, **trend_kwargs)
+    return trends, monthly_price_averages(data)
+
+
+def analyze_sharded(data, n_workers=None, n_shards=None, windows=None, trend_kwargs=None, workdir=None,
+                    memory_budget=None):
+    """
+    Runs the per-pair analysis chain on shards of whole products in a process pool.
+
+    The input columns are written once as .npy files that every worker memory-maps, so
+    shards are never pickled, and workers write their row-aligned results to files too.
+    Shards are contiguous row ranges merged back in order, so the result does not depend
+    on the number of workers and equals the chain run on the whole frame.
+    Args:
+        data (pd.DataFrame): Frame with 'producto', 'ciudad', 'año', 'mes' and
+            'precioPromedio' columns, every pair in date order.
+        n_workers (int): Worker processes (defaults to the number of cores; 1 runs serially
+            on the main thread).
+        n_shards (int): Shards (defaults to 4 per worker, so slow shards even out).
+        windows (dict): Windows passed to `compute_indicators`.
+        trend_kwargs (dict): Keyword arguments of `compute_trend_slopes` (n_jobs excluded).
+        workdir (str): Parent directory of the temporary shard files.
+        memory_budget (int): Bytes the workers may use together; shards are made small
+            enough that `n_workers` of them fit (the merged result comes on top).
+    Returns:
+        dict: 'indicators' and 'price_drops' frames aligned with the rows of `data`, and the
+        per-pair 'trends' and per-month 'seasonality' tables.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    n_shards = n_shards or n_workers * 4
+    if memory_budget:
+        n_shards = max(n_shards, -(-len(data) * SHARD_BYTES_PER_ROW * n_workers // memory_budget))
+    windows, trend_kwargs = windows or {}, trend_kwargs or {}
+
+    # Shards are ranges of whole products, so rows of one product must be contiguous
+    product_codes = data['producto'].cat.codes.to_numpy()
+    order = None
+    if len(product_codes) and (np.diff(product_codes) < 0).any():
+        order = np.argsort(product_codes, kind='stable')
+        product_codes = product_codes[order]
+    bounds = shard_bounds(product_codes, n_shards)
+
+    with tempfile.TemporaryDirectory(prefix="shards-", dir=workdir) as directory:
+        dtypes = {}
+        for column in SHARD_INPUTS:
+            values = data[column]
+            dtypes[column] = values.dtype
+            values = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.to_numpy()
+            np.save(_shard_path(directory, column), values if order is None else values[order])
+
+        tasks = [(directory, shard, lo, hi, dtypes, windows, trend_kwargs)
+                 for shard, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:]))]
+        # Off the main thread (a stage of the pipeline runner) even one worker is a process:
+        # the trend fits can only be timed out on a main thread
+        on_main_thread = threading.current_thread() is threading.main_thread()
+        if not tasks or ((n_workers == 1 or len(tasks) <= 1) and on_main_thread):
+            tables = [analyze_shard(*task) for task in tasks]
+        else:
+            # Workers reopen the inputs by path, so nothing needs to be inherited through fork()
+            with ProcessPoolExecutor(max_workers=min(n_workers, len(tasks)), mp_context=POOL_CONTEXT) as pool:
+                tables = list(pool.map(analyze_shard, *zip(*tasks)))
+
+        # Shard results are copied straight into preallocated full-length columns
+        result = {}
+        for name, columns in ROW_OUTPUTS.items():
+            frame = {}
+            for column in columns:
+                values = None
+                for _, shard, lo, hi, *_ in tasks:
+                    part = np.load(_shard_path(directory, column, shard), mmap_mode='r')
+                    if values is None:
+                        values = np.empty(len(data), dtype=part.dtype)
+                    values[slice(lo, hi) if order is None else order[lo:hi]] = part
+                frame[column] = values
+            result[name] = pd.DataFrame(frame, index=data.index, copy=False)
+
+    result['trends'] = pd.concat([trends for trends, _ in tables], ignore_index=True)
+    result['seasonality'] = pd.concat([seasonality for _, seasonality in tables], ignore_index=True)
+    return result
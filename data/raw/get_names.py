@@ -1,6 +1,60 @@
+import csv
+import os
+
 import pandas as pd
 
-data = pd.read_csv("dummy.csv")
-data[["ciudad"]].drop_duplicates().to_csv("location.csv", index = False)
-data[['codProducto', 'producto']].drop_duplicates().to_csv("food.csv",
-                                                              index = False)
+# Dimension files and the columns identifying one of their entries
+DIMENSIONS = {
+    'location.csv': ['ciudad'],
+    'food.csv': ['codProducto', 'producto'],
+}
+
+
+def update_dimensions(records, directory="."):
+    """
+    Appends the cities and products of new price records that are not yet in location.csv
+    and food.csv, without rereading the price history.
+    Args:
+        records (list): New promediosSipsaCiudad rows, as dicts.
+        directory (str): Directory of the dimension files.
+    Returns:
+        dict: Number of entries added to each file.
+    """
+    added = {}
+    for name, columns in DIMENSIONS.items():
+        path = os.path.join(directory, name)
+        known = set()
+        if os.path.exists(path):
+            with open(path, newline="", encoding="utf-8") as handle:
+                known = {tuple(row[c] for c in columns) for row in csv.DictReader(handle)}
+
+        new = []
+        for record in records:
+            key = tuple(str(record[c]) for c in columns)
+            if key not in known:
+                known.add(key)
+                new.append(key)
+
+        if new:
+            exists = os.path.exists(path) and os.path.getsize(path) > 0
+            if exists:
+                # Terminate a last line written without a newline before appending to it
+                with open(path, "rb+") as handle:
+                    handle.seek(-1, os.SEEK_END)
+                    if handle.read(1) != b"\n":
+                        handle.write(b"\n")
+            with open(path, "a", newline="", encoding="utf-8") as handle:
+                writer = csv.writer(handle, lineterminator="\n")
+                if not exists:
+                    writer.writerow(columns)
+                writer.writerows(new)
+        added[name] = len(new)
+    return added
+
+
+if __name__ == "__main__":
+    # Full rebuild from a complete dump
+    data = pd.read_csv("dummy.csv")
+    data[["ciudad"]].drop_duplicates().to_csv("location.csv", index = False)
+    data[['codProducto', 'producto']].drop_duplicates().to_csv("food.csv",
+                                                                  index = False)
@@ -0,0 +1,507 @@
+"""
+Downloads the SIPSA web service methods concurrently into the raw store.
+
+Every method runs in its own thread. All threads share one zeep client whose HTTP
+session keeps a pool of connections to the service. Failed calls are retried with
+exponential backoff, and each result is written to <out>/<method>.csv as soon as it
+arrives.
+
+With --incremental, only the rows dated on or after the method's watermark (the latest
+fechaCaptura/fechaMesIni already stored) and not already in the append-only log
+<out>/<method>.log.csv are appended to it, and new products and cities are added to
+food.csv and location.csv. Watermarks are whole days or months that the service keeps
+publishing rows for, so their period is fetched again and matched against the log.
+The service has no date filter, so the response is still downloaded in full, but
+nothing already stored is rewritten.
+
+Usage (from the repository root):
+    python data/raw/harvester.py --out data/raw/sipsa --workers 3
+    python data/raw/harvester.py --methods promediosSipsaCiudad
+    python data/raw/harvester.py --incremental   # daily refresh, only rows not stored by the last run
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import shutil
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+import urllib3
+from lxml import etree
+from requests import RequestException, Session
+from requests.adapters import HTTPAdapter
+from zeep import Client, Settings, helpers
+from zeep.exceptions import Fault, TransportError
+from zeep.wsdl.bindings.soap import Soap12Binding
+from zeep.transports import Transport
+
+# Make the sibling get_names module importable when this file is imported from elsewhere
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from get_names import update_dimensions
+
+SIPSA_WSDL = "https://appweb.dane.gov.co/sipsaWS/SrvSipsaUpraBeanService?WSDL"
+
+# Methods of raw/documentation/dane.md; none of them take arguments
+SIPSA_METHODS = (
+    'promediosSipsaCiudad',
+    'promediosSipsaSemanaMadr',
+    'promediosSipsaMesMadr',
+    'promediosSipsaParcial',
+    'promedioAbasSipsaMesMadr',
+    'consultarInsumosSipsaMesMadr',
+)
+
+# Date that orders the rows of each method, used as its incremental watermark
+WATERMARK_FIELDS = {
+    'promediosSipsaCiudad': 'fechaCaptura',
+    'promediosSipsaSemanaMadr': 'fechaIni',
+    'promediosSipsaMesMadr': 'fechaMesIni',
+    'promediosSipsaParcial': 'enmaFecha',
+    'promedioAbasSipsaMesMadr': 'fechaMesIni',
+    'consultarInsumosSipsaMesMadr': 'fechaMesIni',
+}
+
+# urllib3 errors surface unwrapped when the response body is read as a stream
+RETRYABLE_ERRORS = (RequestException, TransportError, urllib3.exceptions.HTTPError)
+# Overload and gateway statuses; zeep would otherwise try to parse their bodies as SOAP
+RETRYABLE_STATUS = (429, 502, 503, 504)
+
+
+class SipsaTransport(Transport):
+    """zeep transport that turns overload responses into retryable errors."""
+
+    def post(self, address, message, headers):
+        response = super().post(address, message, headers)
+        if response.status_code in RETRYABLE_STATUS:
+            raise TransportError(f"HTTP {response.status_code}", status_code=response.status_code,
+                                 content=response.content)
+        return response
+
+
+def make_client(wsdl=SIPSA_WSDL, pool_size=4, timeout=60, operation_timeout=600):
+    """
+    Builds a zeep client over a pooled HTTP session, to be shared by the harvesting threads.
+    Args:
+        wsdl (str): WSDL URL of the service.
+        pool_size (int): Connections kept open to the service (one per concurrent call).
+        timeout (int): Seconds allowed to load the WSDL.
+        operation_timeout (int): Seconds allowed to each call; the large methods take minutes.
+    Returns:
+        zeep.Client: The client.
+    """
+    session = Session()
+    session.headers.update({'Accept-Encoding': 'identity'})  # Disable chunked encoding
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    transport = SipsaTransport(session=session, timeout=timeout, operation_timeout=operation_timeout)
+    settings = Settings(strict=False, xml_huge_tree=True)
+    # Loading the WSDL is an HTTP call like any other and fails the same way
+    return call_with_retry(lambda: Client(wsdl=wsdl, transport=transport, settings=settings), label="WSDL")
+
+
+def call_with_retry(call, retries=3, backoff=2.0, label=""):
+    """
+    Runs `call`, retrying network and HTTP errors with exponential backoff and jitter.
+    SOAP faults are not retried: the service answered, and would answer the same again.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return call()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            wait = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+            print(f"{label}: {e!r}, retrying in {wait:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(wait)
+
+
+def write_rows(rows, path):
+    """
+    Writes the rows of a SOAP response to a CSV file, replacing it once complete.
+    Returns:
+        int: Number of rows written.
+    """
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", newline="", encoding="utf-8") as handle:
+        writer = None
+        for row in rows or []:
+            record = helpers.serialize_object(row, dict)
+            if writer is None:
+                writer = csv.DictWriter(handle, fieldnames=list(record))
+                writer.writeheader()
+            writer.writerow(record)
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_watermarks(out_dir):
+    path = os.path.join(out_dir, "watermarks.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as handle:
+        return {method: datetime.fromisoformat(value) for method, value in json.load(handle).items()}
+
+
+def write_watermarks(out_dir, watermarks):
+    path = os.path.join(out_dir, "watermarks.json")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as handle:
+        json.dump({method: value.isoformat() for method, value in watermarks.items()}, handle, indent=2)
+    os.replace(tmp_path, path)
+
+
+def drop_partial_line(path):
+    """
+    Truncates a log back to its last complete line. A crash mid-append leaves a cut-off
+    record whose values may still parse (a price of 30 instead of 3050), so it is removed
+    rather than terminated; the rows it belonged to are fetched again.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as handle:
+        end = handle.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(position - 65536, 0)
+            handle.seek(start)
+            block = handle.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                position = start + newline + 1
+                break
+            position = start
+        if position < end:
+            handle.truncate(position)
+
+
+def row_key(values):
+    # Logged rows are compared as the text the CSV writer stores
+    return tuple('' if value is None else str(value) for value in values)
+
+
+def read_logged_rows(path, date_field, since=None):
+    """
+    Counts the rows of a log dated on or after `since` (every row when None), the period
+    a run fetches again. Counts rather than a set, since a method can send identical rows.
+    Returns:
+        tuple: (column names of the log or None when there is no log, Counter of row keys).
+    """
+    logged = Counter()
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return None, logged
+    with open(path, newline="", encoding="utf-8") as handle:
+        reader = csv.reader(handle)
+        fieldnames = next(reader)
+        position = fieldnames.index(date_field)
+        for row in reader:
+            text = row[position]
+            if since is None or (text and datetime.fromisoformat(text) >= since):
+                logged[row_key(row)] += 1
+    return fieldnames, logged
+
+
+def is_logged(key, logged):
+    # Consumes one logged copy of the row, so a row sent twice and logged once is kept once
+    if logged[key] > 0:
+        logged[key] -= 1
+        return True
+    return False
+
+
+def append_new_rows(rows, path, date_field, watermark=None):
+    """
+    Appends the rows dated on or after `watermark` that are not in an append-only CSV log yet.
+    Args:
+        rows (list): Rows of a SOAP response.
+        path (str): Log file, created with a header on first use.
+        date_field (str): Date column compared with the watermark.
+        watermark (datetime): Latest date already in the log (None keeps every row not logged).
+    Returns:
+        tuple: (rows appended, new watermark, list of appended records).
+    """
+    drop_partial_line(path)
+    fieldnames, logged = read_logged_rows(path, date_field, watermark)
+    new_records = []
+    latest = watermark
+    for row in rows or []:
+        date = row[date_field]
+        if date is None or (watermark is not None and date < watermark):
+            continue
+        record = helpers.serialize_object(row, dict)
+        if fieldnames is not None and is_logged(row_key(record.get(name) for name in fieldnames), logged):
+            continue
+        new_records.append(record)
+        latest = date if latest is None else max(latest, date)
+
+    if new_records:
+        exists = fieldnames is not None
+        if not exists:
+            fieldnames = list(new_records[0])
+        # Keep the column order of the log, whatever the order of the response
+        with open(path, "a", newline="", encoding="utf-8") as handle:
+            writer = csv.DictWriter(handle, fieldnames=fieldnames, extrasaction="ignore")
+            if not exists:
+                writer.writeheader()
+            writer.writerows(new_records)
+            handle.flush()
+            os.fsync(handle.fileno())
+    return len(new_records), latest, new_records
+
+
+def append_file(part_path, log_path):
+    """Appends the rows of a CSV file (header skipped when the log already has one) to a log."""
+    drop_partial_line(log_path)
+    exists = os.path.exists(log_path) and os.path.getsize(log_path) > 0
+    with open(part_path, "rb") as source, open(log_path, "ab") as target:
+        header = source.readline()
+        if not exists:
+            target.write(header)
+        shutil.copyfileobj(source, target)
+        target.flush()
+        os.fsync(target.fileno())
+
+
+def _port(client):
+    service = next(iter(client.wsdl.services.values()))
+    return next(iter(service.ports.values()))
+
+
+def row_fields(client, method):
+    # Column order of the rows of a method, from the type of its <return> element in the WSDL
+    try:
+        response_type = _port(client).binding.get(method).output.body.type
+        return [name for name, _ in response_type.elements[0][1].type.elements]
+    except (AttributeError, IndexError, KeyError, ValueError):
+        return None
+
+
+def post_streaming(client, method):
+    """
+    Sends a no-argument SOAP call and returns the HTTP response unread, for streaming its body.
+    The envelope and endpoint come from the WSDL, as with zeep's own calls.
+    """
+    port = _port(client)
+    binding = port.binding
+    envelope = etree.tostring(client.create_message(client.service, method))
+    soapaction = binding.get(method).soapaction or ""
+    if isinstance(binding, Soap12Binding):
+        headers = {'Content-Type': f'application/soap+xml; charset=utf-8; action="{soapaction}"'}
+    else:
+        headers = {'Content-Type': 'text/xml; charset=utf-8', 'SOAPAction': f'"{soapaction}"'}
+
+    transport = client.transport
+    response = transport.session.post(port.binding_options['address'], data=envelope, headers=headers,
+                                      timeout=transport.operation_timeout, stream=True)
+    if response.status_code in RETRYABLE_STATUS:
+        response.close()
+        raise TransportError(f"HTTP {response.status_code}", status_code=response.status_code)
+    if response.status_code != 200:
+        # SOAP faults are small, read them whole
+        raise Fault(response.text[:1000], code=str(response.status_code))
+    response.raw.decode_content = True
+    return response
+
+
+def iter_row_batches(source, batch_size=50_000, fields=None):
+    """
+    Parses <return> rows from a SOAP response as it is read, into column buffers.
+    Args:
+        source: File-like object with the response body.
+        batch_size (int): Rows per yielded batch.
+        fields (list): Columns to collect (those of the first row when None).
+    Yields:
+        dict: Column name to list of text values (None where a row lacks the element).
+    """
+    columns, count = None, 0
+    for _, element in etree.iterparse(source, events=("end",), tag="{*}return", huge_tree=True):
+        values = {etree.QName(child).localname: child.text for child in element}
+        if fields is None:
+            fields = list(values)
+        if columns is None:
+            columns = {name: [] for name in fields}
+        for name, buffer in columns.items():
+            buffer.append(values.get(name))
+        count += 1
+
+        # Drop the parsed row and the siblings before it, so the tree never grows
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+        if count == batch_size:
+            yield columns
+            columns, count = None, 0
+    if count:
+        yield columns
+
+
+def stream_method(client, method, path, batch_size=50_000, date_field=None, watermark=None, logged=None):
+    """
+    Streams one SIPSA method into a CSV file in batches of `batch_size` rows, without ever
+    holding the whole response. With `date_field`, only rows dated on or after `watermark`
+    are kept, minus those counted in `logged` (see `read_logged_rows`), which is consumed.
+    Returns:
+        tuple: (rows written, latest date seen, distinct cities and products of the rows written).
+    """
+    fields = row_fields(client, method)
+    latest = watermark
+    dimensions = set()
+    count = 0
+    with post_streaming(client, method) as response, \
+            open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = None
+        for columns in iter_row_batches(response.raw, batch_size, fields):
+            names = list(columns)
+            if writer is None:
+                writer = csv.writer(handle)
+                writer.writerow(names)
+
+            rows = list(zip(*columns.values()))
+            if date_field is not None:
+                dates = [datetime.fromisoformat(text) if text else None for text in columns[date_field]]
+                rows = [row for row, date in zip(rows, dates)
+                        if date is not None and (watermark is None or date >= watermark)]
+                if logged:
+                    rows = [row for row in rows if not is_logged(row_key(row), logged)]
+                valid = [date for date in dates if date is not None]
+                if valid:
+                    latest = max(valid) if latest is None else max(latest, max(valid))
+
+            keys = [names.index(c) for c in ('ciudad', 'codProducto', 'producto') if c in names]
+            if len(keys) == 3:
+                dimensions.update(tuple(row[i] for i in keys) for row in rows)
+            writer.writerows(rows)
+            count += len(rows)
+    return count, latest, dimensions
+
+
+def harvest_method(client, method, out_dir, retries=3, backoff=2.0, incremental=False, watermark=None,
+                   streaming=True, batch_size=50_000):
+    """
+    Calls one SIPSA method and stores its rows: in <out_dir>/<method>.csv, or when `incremental`
+    only the rows from `watermark` on that are not logged yet, appended to <out_dir>/<method>.log.csv.
+    With `streaming`, the response is parsed as it arrives and written in batches of
+    `batch_size` rows, instead of being built into zeep objects first.
+    Returns:
+        dict: Method, rows written and seconds taken (plus the new watermark and records when incremental).
+    """
+    start = time.perf_counter()
+    date_field = WATERMARK_FIELDS[method] if incremental else None
+    snapshot_path = os.path.join(out_dir, f"{method}.csv")
+    log_path = os.path.join(out_dir, f"{method}.log.csv")
+
+    if streaming:
+        logged = None
+        if incremental:
+            drop_partial_line(log_path)
+            _, logged = read_logged_rows(log_path, date_field, watermark)
+        # A failure mid-stream retries the whole call, rewriting the partial file
+        tmp_path = (log_path if incremental else snapshot_path) + ".tmp"
+        count, watermark, dimensions = call_with_retry(
+            lambda: stream_method(client, method, tmp_path, batch_size, date_field, watermark,
+                                  logged and Counter(logged)),
+            retries=retries, backoff=backoff, label=method)
+        if incremental:
+            append_file(tmp_path, log_path)
+            os.remove(tmp_path)
+            records = [dict(zip(('ciudad', 'codProducto', 'producto'), key)) for key in dimensions]
+        else:
+            os.replace(tmp_path, snapshot_path)
+    else:
+        operation = getattr(client.service, method)
+        rows = call_with_retry(operation, retries=retries, backoff=backoff, label=method)
+        if incremental:
+            count, watermark, records = append_new_rows(rows, log_path, date_field, watermark)
+        else:
+            count = write_rows(rows, snapshot_path)
+
+    result = {'method': method, 'rows': count}
+    if incremental:
+        result.update(watermark=watermark, records=records)
+    result['seconds'] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def harvest(methods=SIPSA_METHODS, out_dir="data/raw/sipsa", wsdl=SIPSA_WSDL, workers=3, retries=3, backoff=2.0,
+            incremental=False, dimensions_dir=None, streaming=True, batch_size=50_000):
+    """
+    Downloads several SIPSA methods concurrently.
+    Args:
+        methods (tuple): Methods to call.
+        out_dir (str): Raw store directory, one CSV per method.
+        wsdl (str): WSDL URL (point it to `sipsa_stub.py` to run offline).
+        workers (int): Methods called at the same time.
+        retries (int): Retries of a failed call before giving up on its method.
+        backoff (float): Seconds before the first retry, doubled on each attempt.
+        incremental (bool): Append only the rows from each method's watermark on that are not
+            logged yet to its log, instead of rewriting its full snapshot. Watermarks live in
+            <out_dir>/watermarks.json.
+        dimensions_dir (str): Directory of food.csv and location.csv, extended with the products
+            and cities of new promediosSipsaCiudad rows (incremental mode only).
+        streaming (bool): Parse responses as they arrive and write them in batches of `batch_size`
+            rows, keeping memory flat whatever the payload size.
+    Returns:
+        list: One summary dict per method, with the error of the methods that failed.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    client = make_client(wsdl, pool_size=workers)
+    watermarks = read_watermarks(out_dir) if incremental else {}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(harvest_method, client, method, out_dir, retries, backoff,
+                               incremental, watermarks.get(method), streaming, batch_size): method
+                   for method in methods}
+        for future in as_completed(futures):
+            method = futures[future]
+            try:
+                result = future.result()
+                print(f"{method}: {result['rows']} rows in {result['seconds']}s")
+            except Exception as e:
+                # One failing method does not stop the others
+                result = {'method': method, 'rows': 0, 'error': repr(e)}
+                print(f"{method}: failed with {e!r}")
+                results.append(result)
+                continue
+
+            if incremental:
+                records = result.pop('records')
+                if method == 'promediosSipsaCiudad' and dimensions_dir is not None:
+                    update_dimensions(records, dimensions_dir)
+                # The watermark only moves once the rows it covers are on disk
+                if result['watermark'] is not None:
+                    watermarks[method] = result['watermark']
+                    write_watermarks(out_dir, watermarks)
+            results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--wsdl", default=SIPSA_WSDL, help="WSDL URL of the service")
+    parser.add_argument("--out", default="data/raw/sipsa", help="Raw store directory")
+    parser.add_argument("--methods", nargs="+", default=list(SIPSA_METHODS), choices=SIPSA_METHODS)
+    parser.add_argument("--workers", type=int, default=3, help="Methods called at the same time")
+    parser.add_argument("--retries", type=int, default=3, help="Retries of a failed call")
+    parser.add_argument("--backoff", type=float, default=2.0, help="Seconds before the first retry")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Append only rows not yet in <method>.log.csv, from the stored watermarks on")
+    parser.add_argument("--dimensions", default="data/raw",
+                        help="Directory of food.csv and location.csv, updated in incremental mode")
+    parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=True,
+                        help="Parse responses as they arrive instead of through zeep objects")
+    parser.add_argument("--batch-size", type=int, default=50_000, help="Rows written per batch when streaming")
+    args = parser.parse_args()
+
+    harvest(args.methods, out_dir=args.out, wsdl=args.wsdl, workers=args.workers,
+            retries=args.retries, backoff=args.backoff, incremental=args.incremental,
+            dimensions_dir=args.dimensions, streaming=args.streaming, batch_size=args.batch_size)
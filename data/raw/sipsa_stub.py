@@ -0,0 +1,226 @@
+"""
+Local stand-in for the SIPSA SOAP web service, for running the harvester offline.
+
+Serves a canned WSDL describing the methods of raw/documentation/dane.md and answers
+each method with canned rows built from the examples of that document.
+
+Usage (from the repository root):
+    python data/raw/sipsa_stub.py --port 8088 --rows 1000
+    python data/raw/harvester.py --wsdl "http://127.0.0.1:8088/sipsaWS/SrvSipsaUpraBeanService?WSDL"
+"""
+import argparse
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+NAMESPACE = "http://servicios.sipsa.co.dane.gov/"
+
+# Fields of the rows returned by each method, with their XML Schema type and a sample value
+METHODS = {
+    'promedioAbasSipsaMesMadr': [
+        ('artiId', 'long', '547'), ('artiNombre', 'string', 'Basa'), ('cantidadTon', 'double', '77'),
+        ('fechaMesIni', 'dateTime', '2016-10-01T00:00:00-05:00'), ('fuenId', 'long', '36'),
+        ('fuenNombre', 'string', 'Bucaramanga, Centroabastos'), ('futiId', 'long', '78'),
+    ],
+    'consultarInsumosSipsaMesMadr': [
+        ('deptNombre', 'string', 'ANTIOQUIA'), ('fechaMesIni', 'dateTime', '2014-12-01T00:00:00-05:00'),
+        ('insumoNombre', 'string', 'Malathion 57 Ec, 1 litro'), ('muniId', 'string', '05001'),
+        ('muniNombre', 'string', 'MEDELLÍN'), ('promedio', 'double', '20366'), ('tireId', 'long', '4'),
+        ('tireNombre', 'string', 'INSUMOS AGRICOLAS'),
+    ],
+    'promediosSipsaSemanaMadr': [
+        ('artiId', 'long', '64'), ('artiNombre', 'string', 'Calabaza'),
+        ('fechaIni', 'dateTime', '2018-01-06T00:00:00-05:00'), ('fuenId', 'long', '56'),
+        ('fuenNombre', 'string', 'Medellín, Central Mayorista de Antioquia'), ('futiId', 'long', '56'),
+        ('maximoKg', 'double', '800'), ('minimoKg', 'double', '700'), ('promedioKg', 'double', '733'),
+    ],
+    'promediosSipsaParcial': [
+        ('artiNombre', 'string', 'Pimentón'), ('deptNombre', 'string', 'MAGDALENA'),
+        ('enmaFecha', 'dateTime', '2017-03-29T00:00:00-05:00'), ('fuenId', 'long', '1836'),
+        ('fuenNombre', 'string', 'Santa Marta (Magdalena)'), ('futiId', 'long', '3896'),
+        ('grupNombre', 'string', 'VERDURAS Y HORTALIZAS'), ('idArtiSemana', 'long', '10'),
+        ('maximoKg', 'double', '1666.67'), ('minimoKg', 'double', '1500'), ('muniId', 'string', '47001'),
+        ('muniNombre', 'string', 'SANTA MARTA'), ('promedioKg', 'double', '1583'),
+    ],
+    'promediosSipsaCiudad': [
+        ('ciudad', 'string', 'CÚCUTA'), ('codProducto', 'long', '8'), ('enviado', 'long', '0'),
+        ('fechaCaptura', 'dateTime', '2017-11-23T00:00:00-05:00'),
+        ('fechaCreacion', 'dateTime', '2017-11-23T14:00:00-05:00'), ('precioPromedio', 'double', '2083'),
+        ('producto', 'string', 'Pimentón'), ('regId', 'long', '212186'),
+    ],
+    'promediosSipsaMesMadr': [
+        ('artiId', 'long', '64'), ('artiNombre', 'string', 'Calabaza'), ('enviado', 'long', '0'),
+        ('fechaCreacion', 'dateTime', '2017-11-23T14:00:00-05:00'),
+        ('fechaMesIni', 'dateTime', '2018-01-06T00:00:00-05:00'), ('fuenId', 'long', '1836'),
+        ('fuenNombre', 'string', 'Santa Marta (Magdalena)'), ('futiId', 'long', '56'),
+        ('maximoKg', 'double', '800'), ('minimoKg', 'double', '700'), ('promedioKg', 'double', '733'),
+        ('tmpMayoMesId', 'long', '212186'),
+    ],
+}
+
+
+def build_wsdl(location):
+    """Document/literal SOAP 1.1 WSDL with one no-argument operation per method."""
+    types, messages, operations, bindings = [], [], [], []
+    for method, fields in METHODS.items():
+        elements = "".join(f'<xs:element name="{name}" type="xs:{kind}" minOccurs="0"/>' for name, kind, _ in fields)
+        types.append(
+            f'<xs:element name="{method}" type="tns:{method}"/>'
+            f'<xs:complexType name="{method}"><xs:sequence/></xs:complexType>'
+            f'<xs:element name="{method}Response" type="tns:{method}Response"/>'
+            f'<xs:complexType name="{method}Response"><xs:sequence>'
+            f'<xs:element name="return" type="tns:{method}Row" minOccurs="0" maxOccurs="unbounded"/>'
+            f'</xs:sequence></xs:complexType>'
+            f'<xs:complexType name="{method}Row"><xs:sequence>{elements}</xs:sequence></xs:complexType>'
+        )
+        messages.append(
+            f'<message name="{method}"><part name="parameters" element="tns:{method}"/></message>'
+            f'<message name="{method}Response"><part name="parameters" element="tns:{method}Response"/></message>'
+        )
+        operations.append(
+            f'<operation name="{method}"><input message="tns:{method}"/>'
+            f'<output message="tns:{method}Response"/></operation>'
+        )
+        bindings.append(
+            f'<operation name="{method}"><soap:operation soapAction=""/>'
+            f'<input><soap:body use="literal"/></input><output><soap:body use="literal"/></output></operation>'
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"'
+        f' xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:tns="{NAMESPACE}" targetNamespace="{NAMESPACE}"'
+        ' name="SrvSipsaUpraBeanService">'
+        f'<types><xs:schema targetNamespace="{NAMESPACE}" elementFormDefault="unqualified">{"".join(types)}'
+        '</xs:schema></types>'
+        f'{"".join(messages)}'
+        f'<portType name="SrvSipsaUpraBean">{"".join(operations)}</portType>'
+        '<binding name="SrvSipsaUpraBeanPortBinding" type="tns:SrvSipsaUpraBean">'
+        '<soap:binding transport="http://schemas.xmlsoap.org/soap/http" style="document"/>'
+        f'{"".join(bindings)}</binding>'
+        '<service name="SrvSipsaUpraBeanService"><port name="SrvSipsaUpraBeanPort" binding="tns:SrvSipsaUpraBeanPortBinding">'
+        f'<soap:address location="{escape(location)}"/></port></service>'
+        '</definitions>'
+    )
+
+
+def iter_response(method, n_rows, rows_per_day=None, batch_size=1000):
+    """
+    SOAP envelope answering `method` with `n_rows` copies of its sample row (ids made unique),
+    generated in pieces of `batch_size` rows so large responses are never held in memory.
+    With `rows_per_day`, dates advance one day every `rows_per_day` rows, so a larger `n_rows`
+    looks like the same history with newer days appended.
+    """
+    fields = METHODS[method]
+    dates = {name: datetime.fromisoformat(sample) for name, kind, sample in fields if kind == 'dateTime'}
+    yield ('<?xml version="1.0" encoding="UTF-8"?>'
+           '<S:Envelope xmlns:S="http://schemas.xmlsoap.org/soap/envelope/"><S:Body>'
+           f'<ns2:{method}Response xmlns:ns2="{NAMESPACE}">')
+    for batch_start in range(0, n_rows, batch_size):
+        rows = []
+        for i in range(batch_start, min(batch_start + batch_size, n_rows)):
+            values = []
+            for name, kind, sample in fields:
+                value = sample
+                if name in ('regId', 'tmpMayoMesId'):
+                    value = str(int(sample) + i)
+                elif kind == 'dateTime' and rows_per_day:
+                    value = (dates[name] + timedelta(days=i // rows_per_day)).isoformat()
+                values.append(f"<{name}>{escape(value)}</{name}>")
+            rows.append(f"<return>{''.join(values)}</return>")
+        yield "".join(rows)
+    yield f'</ns2:{method}Response></S:Body></S:Envelope>'
+
+
+def build_response(method, n_rows, rows_per_day=None):
+    return "".join(iter_response(method, n_rows, rows_per_day))
+
+
+class SipsaStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, so pooled connections are reused
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="text/xml; charset=utf-8"):
+        body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # The WSDL, at ...?WSDL as on the real service
+        location = f"http://{self.headers['Host']}{self.path.split('?')[0]}"
+        self._send(200, build_wsdl(location))
+
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        server = self.server
+        with server.lock:
+            server.calls += 1
+            fail = server.calls <= server.fail_first
+        if server.delay:
+            time.sleep(server.delay)
+        if fail:
+            self._send(503, "Service Unavailable", content_type="text/plain")
+            return
+        # The operation is the first element of the SOAP body
+        match = re.search(r"Body[^>]*>\s*<(?:[\w-]+:)?(\w+)", request)
+        method = match.group(1) if match else None
+        if method not in METHODS:
+            self._send(500, "Unknown method", content_type="text/plain")
+            return
+        # Chunked, as the real service streams its multi-hundred-MB answers
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for piece in iter_response(method, server.rows, server.rows_per_day):
+            piece = piece.encode("utf-8")
+            self.wfile.write(f"{len(piece):x}\r\n".encode("ascii") + piece + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def start_stub_server(port=0, rows=100, delay=0.0, fail_first=0, rows_per_day=None):
+    """
+    Starts the stand-in server in a background thread.
+    Args:
+        port (int): Port to listen on (0 picks a free one).
+        rows (int): Rows returned by each method.
+        delay (float): Seconds each SOAP call takes, to mimic the slow real service.
+        fail_first (int): Number of initial SOAP calls answered with HTTP 503, to exercise retries.
+        rows_per_day (int): Rows per capture date (all rows share one date when None).
+    Returns:
+        tuple: (server, WSDL URL). `server.rows` can be raised to publish new days.
+        Stop the server with `server.shutdown()`.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), SipsaStubHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.calls = 0
+    server.rows, server.delay, server.fail_first = rows, delay, fail_first
+    server.rows_per_day = rows_per_day
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/sipsaWS/SrvSipsaUpraBeanService?WSDL"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--rows", type=int, default=100, help="Rows returned by each method")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds each call takes")
+    parser.add_argument("--fail-first", type=int, default=0, help="Initial calls answered with HTTP 503")
+    parser.add_argument("--rows-per-day", type=int, default=None, help="Rows per capture date")
+    args = parser.parse_args()
+
+    server, wsdl = start_stub_server(args.port, rows=args.rows, delay=args.delay, fail_first=args.fail_first,
+                                     rows_per_day=args.rows_per_day)
+    print(f"SIPSA stand-in serving {wsdl}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
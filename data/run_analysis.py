@@ -1,20 +1,173 @@
+"""
+Runs the price analysis as a graph of cached stages: every stage is skipped while its
+inputs and parameters are unchanged, and independent stages run concurrently. With
+--processes, the per-pair stages run as one chain per product shard in a process pool.
+With --memory-budget, stages wait for memory to be freed before starting and the
+per-pair chain runs in shards small enough to fit.
+
+With --daily, only the indicators of the rows captured since the last run are computed,
+from the rolling indicator state the full analysis leaves, instead of running the graph.
+"""
+import argparse
+import os
+import time
+
 import pandas as pd
 
-from analysis.inflation import compute_daily_inflation
-from analysis.moving_avs_and_vol import add_moving_averages
-from analysis.anomalies import detect_anomalies
-from analysis.trend import compute_trends
-from analysis.user_metrics import detect_price_drops, detect_seasonal_patterns
-
-def run():
-    df = pd.read_csv("data/processed/cleaned_data.csv", parse_dates=["fechaCaptura"])
-    df = compute_daily_inflation(df)
-    df = add_moving_averages(df)
-    df = detect_anomalies(df)
-    df = compute_trends(df)
-    df = detect_price_drops(df)
-    df = detect_seasonal_patterns(df)
-    df.to_csv("data/outputs/full_analysis.csv", index=False)
+from data_cleaning.clean_data import load_cleaned_data
+from storage.columnar import save_frame
+from storage.analysis_snapshot import SNAPSHOT_FORMAT, source_signature, write_analysis_snapshot
+from analysis.broadcast import broadcast_table
+from analysis.indicators import indicator_columns, INDICATOR_COLUMNS
+from analysis.indicator_state import (build_indicator_state, empty_indicator_state, load_indicator_state,
+                                      update_indicators)
+from analysis.trend import compute_trend_slopes
+from analysis.user_metrics import MONTHLY_AVG_COLUMN, price_drop_columns, monthly_price_averages
+from pipeline.memory import parse_size
+from pipeline.runner import Stage, run_stages, print_report
+from pipeline.sharded import analyze_sharded
+
+CLEANED_PATH = "data/processed/cleaned_data.parquet"
+SNAPSHOT_DIR = "data/processed/analysis_snapshot"  # Opened by the backend at startup
+SNAPSHOT_COLUMNS = ['producto', 'ciudad', 'fechaCaptura', 'precioPromedio'] + INDICATOR_COLUMNS
+STAGE_CACHE_DIR = "data/processed/stage_cache"
+INDICATOR_STATE_PATH = "data/processed/indicator_state.npz"  # Rolling state for daily updates
+TREND_PARAMS_PATH = "data/parameters/arima_trend_params.csv"
+FULL_ANALYSIS_PATH = "data/outputs/full_analysis.parquet"
+PRICE_DROPS_PATH = "data/outputs/price_drops.parquet"
+DAILY_INDICATORS_PATH = "data/outputs/daily_indicators.parquet"
+
+TREND_STATE_DIR = "data/parameters/arima_state"
+PAIR_KEYS = ['producto', 'ciudad']
+
+
+# Stages only read the columns they need from `cleaned` and never modify or copy it:
+# concurrent stages share the frame, and derived columns are new arrays wrapped in
+# frames without copying
+
+def _columns_frame(*sources):
+    # One frame over the columns of several frames or dicts of arrays, without copying them
+    columns = {}
+    for source in sources:
+        columns.update(source.items())
+    return pd.DataFrame(columns, copy=False)
+
+def indicators_stage(cleaned, **windows):
+    return _columns_frame(indicator_columns(cleaned, **windows))
+
+def indicator_state_stage(cleaned, path):
+    build_indicator_state(cleaned).save(path)
+
+def trends_stage(cleaned, **kwargs):
+    return compute_trend_slopes(cleaned, **kwargs)
+
+def price_drops_stage(cleaned):
+    return _columns_frame(price_drop_columns(cleaned))
+
+def seasonality_stage(cleaned):
+    return monthly_price_averages(cleaned)
+
+def sharded_stage(cleaned, n_workers, trend_kwargs, memory_budget=None):
+    return analyze_sharded(cleaned, n_workers=n_workers, trend_kwargs=trend_kwargs, memory_budget=memory_budget)
+
+def snapshot_stage(cleaned, indicators, directory, sources):
+    data = _columns_frame({column: cleaned[column] for column in SNAPSHOT_COLUMNS[:4]}, indicators)
+    write_analysis_snapshot(data, directory, sources)
+
+def full_analysis_stage(cleaned, indicators, price_drops, trends, seasonality, path, drops_path):
+    # Per-pair and per-month values are broadcast by group code instead of merged
+    data = _columns_frame(
+        cleaned, indicators, price_drops,
+        broadcast_table(cleaned, trends, PAIR_KEYS, ['trend_slope']),
+        broadcast_table(cleaned, seasonality, PAIR_KEYS + ['mes'], [MONTHLY_AVG_COLUMN]),
+    )
+    save_frame(data, path, partition_by='producto')
+    save_frame(data[data['price_drop']], drops_path, partition_by='producto')
+
+
+def analysis_stages(processes=None, memory_budget=None):
+    """
+    The analysis graph. With `processes` or a `memory_budget` (bytes), indicators, price
+    drops, trends and seasonality come from one sharded stage instead of four
+    whole-frame stages, with shards sized to the budget.
+    """
+    trend_kwargs = {'param_path': TREND_PARAMS_PATH, 'state_dir': TREND_STATE_DIR}
+    stages = [
+        Stage('cleaned', load_cleaned_data, params={'filepath': CLEANED_PATH}, sources=(CLEANED_PATH,),
+              cache=False),
+        Stage('indicator_state', indicator_state_stage, inputs=('cleaned',), outputs=(INDICATOR_STATE_PATH,),
+              params={'path': INDICATOR_STATE_PATH}, version=2),
+    ]
+    if processes or memory_budget:
+        stages.append(Stage('sharded', sharded_stage, inputs=('cleaned',), sources=(TREND_PARAMS_PATH,),
+                            params={'n_workers': processes or 1, 'trend_kwargs': trend_kwargs,
+                                    'memory_budget': memory_budget}, version=2))
+        per_pair = {name: f"sharded.{name}" for name in ('indicators', 'price_drops', 'trends', 'seasonality')}
+    else:
+        stages += [
+            Stage('indicators', indicators_stage, inputs=('cleaned',)),
+            Stage('trends', trends_stage, inputs=('cleaned',), sources=(TREND_PARAMS_PATH,), params=trend_kwargs),
+            Stage('price_drops', price_drops_stage, inputs=('cleaned',)),
+            Stage('seasonality', seasonality_stage, inputs=('cleaned',), version=2),
+        ]
+        per_pair = {name: name for name in ('indicators', 'price_drops', 'trends', 'seasonality')}
+
+    stages += [
+        # The signature is what the backend checks the snapshot against, so it is a parameter;
+        # the format is the version, so a layout change rewrites the snapshot
+        Stage('snapshot', snapshot_stage, inputs=('cleaned', per_pair['indicators']), outputs=(SNAPSHOT_DIR,),
+              params={'directory': SNAPSHOT_DIR, 'sources': source_signature([CLEANED_PATH])},
+              version=SNAPSHOT_FORMAT),
+        Stage('full_analysis', full_analysis_stage,
+              inputs=('cleaned', per_pair['indicators'], per_pair['price_drops'], per_pair['trends'],
+                      per_pair['seasonality']),
+              outputs=(FULL_ANALYSIS_PATH, PRICE_DROPS_PATH),
+              params={'path': FULL_ANALYSIS_PATH, 'drops_path': PRICE_DROPS_PATH}),
+    ]
+    return stages
+
+def run(cache_dir=STAGE_CACHE_DIR, max_workers=None, force=(), processes=None, memory_budget=None):
+    start = time.perf_counter()
+    report = run_stages(analysis_stages(processes, memory_budget), cache_dir, max_workers=max_workers,
+                        force=force, memory_budget=memory_budget)
+    print_report(report, time.perf_counter() - start)
+    return report
+
+def daily_update(cleaned_path=CLEANED_PATH, state_path=INDICATOR_STATE_PATH, output_path=DAILY_INDICATORS_PATH):
+    """
+    Daily refresh of the indicators: reads only the rows captured since the saved indicator
+    state, computes their indicators from it and writes the updated state back, so the cost
+    follows the new rows rather than the history. Without a saved state, every row is new.
+    Returns:
+        pd.DataFrame: The new rows with their indicator columns, also saved to `output_path`.
+    """
+    start = time.perf_counter()
+    state = load_indicator_state(state_path) if os.path.exists(state_path) else empty_indicator_state()
+    since = state.latest_date()
+    # The last capture day is read again: pairs behind the others may have rows on it
+    filters = None if since is None else [('fechaCaptura', '>=', since)]
+    rows = state.unseen_rows(load_cleaned_data(cleaned_path, columns=SNAPSHOT_COLUMNS[:4], filters=filters))
+
+    indicators, state = update_indicators(state, rows)
+    state.save(state_path)
+    data = _columns_frame(rows, indicators)
+    save_frame(data, output_path)
+    print(f"Indicators of {len(rows)} new rows saved to {output_path} in {time.perf_counter() - start:.2f}s")
+    return data
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cache-dir", default=STAGE_CACHE_DIR, help="Directory of cached stage results")
+    parser.add_argument("--workers", type=int, default=None, help="Stages run at once")
+    parser.add_argument("--force", nargs="*", default=(), help="Stages to rerun even when cached")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Run the per-pair stages sharded by product over this many processes")
+    parser.add_argument("--memory-budget", type=parse_size, default=None,
+                        help="Peak resident memory to stay under, e.g. 2G")
+    parser.add_argument("--daily", action="store_true",
+                        help="Only compute the indicators of the rows captured since the last run")
+    args = parser.parse_args()
+    if args.daily:
+        daily_update()
+    else:
+        run(args.cache_dir, args.workers, args.force, args.processes, args.memory_budget)
@@ -0,0 +1,138 @@
+import json
+import os
+import shutil
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from analysis.series_index import SeriesIndex, build_series_index
+
+# Bumped whenever the layout below or the analyzed columns change, making older snapshots stale
+SNAPSHOT_FORMAT = 2
+INDEX_ARRAYS = ('product_offsets', 'pair_offsets', 'pair_product', 'pair_city')
+
+
+def source_signature(paths):
+    """Modification time and size of each input file or directory, to detect stale outputs."""
+    signature = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            signature.append([path, stat.st_mtime_ns, stat.st_size])
+        else:
+            signature.append([path, None, None])
+    return signature
+
+
+def _arrow_table(data):
+    # Floats keep NaN as a value instead of becoming nulls: a column with a validity bitmap
+    # is copied when converted back to pandas, one without is a view of the mapped file
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if values.dtype.kind == 'f':
+            columns[column] = pa.array(values.to_numpy(), from_pandas=False)
+        else:
+            columns[column] = pa.Array.from_pandas(values)
+    return pa.table(columns)
+
+
+def _mapped_bytes(table, data):
+    # Bytes of the columns of `data` that are views of the table's buffers, not copies
+    mapped = 0
+    for column in data.columns:
+        values = data[column]
+        array = values.cat.codes.to_numpy() if isinstance(values.dtype, pd.CategoricalDtype) else values.array
+        array = np.asarray(getattr(array, '_ndarray', array))
+        chunks = table.column(column).chunks
+        if len(chunks) == 1 and array.__array_interface__['data'][0] == chunks[0].buffers()[-1].address:
+            mapped += array.nbytes
+    return mapped
+
+
+def write_analysis_snapshot(data, directory, sources):
+    """
+    Writes an analyzed frame and its series index as a snapshot the backend opens without
+    recomputing anything.
+
+    The frame is an uncompressed Arrow IPC file of a single record batch and the index
+    arrays are .npy files, so both are memory-mapped on open. manifest.json records the
+    version, the format and the signature of the inputs the frame was computed from.
+    Args:
+        data (pd.DataFrame): Analyzed frame sorted by producto, ciudad and fechaCaptura.
+        directory (str): Snapshot directory (replaced once the new one is complete).
+        sources (list): `source_signature` of the inputs the frame was computed from.
+    Returns:
+        dict: The manifest.
+    """
+    series_index = build_series_index(data)
+    tmp_dir = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    # One record batch, since columns split into chunks are concatenated (copied) on open
+    table = _arrow_table(data)
+    feather.write_feather(table, os.path.join(tmp_dir, "frame.arrow"), compression="uncompressed",
+                          chunksize=max(len(data), 1))
+    for name in INDEX_ARRAYS:
+        np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(series_index, name), dtype=np.int64))
+
+    created_at = datetime.now()
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'version': created_at.strftime("%Y%m%d%H%M%S%f"),
+        'created_at': created_at.isoformat(),
+        'rows': len(data),
+        'columns': list(data.columns),
+        'products': [str(name) for name in series_index.products],
+        'cities': [str(name) for name in series_index.cities],
+        'sources': sources,
+    }
+    with open(os.path.join(tmp_dir, "manifest.json"), "w", encoding="utf-8") as handle:
+        json.dump(manifest, handle, ensure_ascii=False)
+
+    # Swap the complete snapshot in; readers see the old one or the new one
+    old_dir = f"{directory}.old-{os.getpid()}"
+    if os.path.exists(directory):
+        os.replace(directory, old_dir)
+    os.replace(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(directory):
+    path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def open_analysis_snapshot(directory, sources=None):
+    """
+    Opens a snapshot written by `write_analysis_snapshot`.
+    Args:
+        directory (str): Snapshot directory.
+        sources (list): Current `source_signature` of the inputs; the snapshot is stale
+            when it was computed from different ones.
+    Returns:
+        tuple: (frame, SeriesIndex, manifest, mapped bytes), or None when the snapshot is
+        missing or stale. Mapped bytes are those of the columns read in place from the
+        file (all but booleans, which Arrow stores as bits); the others are copies.
+    """
+    manifest = read_manifest(directory)
+    if manifest is None or manifest.get('format') != SNAPSHOT_FORMAT:
+        return None
+    if sources is not None and manifest['sources'] != sources:
+        return None
+
+    # Memory-mapped: pages are read from the page cache on demand rather than parsed. Unsplit
+    # blocks would consolidate the columns into copies; split, they stay read-only views
+    table = feather.read_table(os.path.join(directory, "frame.arrow"), memory_map=True)
+    data = table.to_pandas(split_blocks=True)
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r') for name in INDEX_ARRAYS}
+    series_index = SeriesIndex(products=manifest['products'], cities=manifest['cities'], **arrays)
+    return data, series_index, manifest, _mapped_bytes(table, data)
@@ -0,0 +1,183 @@
+import os
+import shutil
+from urllib.parse import quote, unquote
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+
+CATEGORICAL_COLUMNS = ('producto', 'ciudad')
+DATE_COLUMNS = ('fechaCaptura', 'fechaCreacion')
+
+
+def compact_dtypes(data, categorical=CATEGORICAL_COLUMNS):
+    """
+    Shrinks column dtypes without changing any value.
+    Args:
+        data (pd.DataFrame): Frame to convert (left untouched).
+        categorical (tuple): String columns stored as categoricals.
+    Returns:
+        pd.DataFrame: New frame with categorical keys, downcast integers and float32
+        floats wherever float32 represents every value exactly (e.g. whole-peso prices);
+        columns that keep their dtype share memory with `data` instead of being copied.
+    """
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if column in categorical and values.dtype == object:
+            values = values.astype('category')
+        elif pd.api.types.is_integer_dtype(values) and not isinstance(values.dtype, pd.CategoricalDtype):
+            values = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values) and values.dtype != np.float32:
+            as_float32 = values.to_numpy().astype(np.float32)
+            if np.array_equal(as_float32.astype(values.dtype), values.to_numpy(), equal_nan=True):
+                values = pd.Series(as_float32, index=data.index, name=column)
+        columns[column] = values
+    return pd.DataFrame(columns, index=data.index, columns=data.columns, copy=False)
+
+
+def _partition_dir(root, column, value):
+    return os.path.join(root, f"{column}={quote(str(value), safe='')}")
+
+
+def _split_filters(filters, partition_col):
+    # Filters on the partition column prune directories, the rest are pushed to the Parquet reader
+    keep, row_filters = None, []
+    for column, op, value in filters or []:
+        if column == partition_col and op in ('=', '==', 'in'):
+            values = set(value) if op == 'in' else {value}
+            keep = values if keep is None else keep & values
+        else:
+            row_filters.append((column, op, value))
+    return keep, row_filters
+
+
+def write_partition(part, root, partition_col, value, compression='zstd'):
+    """Writes the rows of one `partition_col` value into its directory of a partitioned dataset."""
+    directory = _partition_dir(root, partition_col, value)
+    os.makedirs(directory, exist_ok=True)
+    table = pa.Table.from_pandas(compact_dtypes(part.drop(columns=partition_col, errors='ignore')), preserve_index=False)
+    pq.write_table(table, os.path.join(directory, "part-0.parquet"), compression=compression)
+
+
+def write_partitioned(data, root, partition_col='producto', compression='zstd'):
+    """
+    Writes a frame as a hive-style Parquet dataset with one directory per `partition_col` value.
+    The dataset is built next to `root` and swapped in once complete.
+    """
+    tmp_root = root + ".tmp"
+    shutil.rmtree(tmp_root, ignore_errors=True)
+    os.makedirs(tmp_root)
+
+    data = compact_dtypes(data)
+    for value, part in data.groupby(partition_col, sort=True, observed=True):
+        write_partition(part, tmp_root, partition_col, value, compression=compression)
+
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp_root, root)
+
+
+def read_partitioned(root, columns=None, filters=None):
+    """
+    Reads a dataset written by `write_partitioned`, partitions in sorted order.
+    Args:
+        root (str): Dataset directory.
+        columns (list): Columns to load (all when None).
+        filters (list): Conjunction of (column, op, value) tuples, as in `pyarrow.parquet.read_table`.
+    Returns:
+        pd.DataFrame: The selected rows and columns, the partition column as a categorical.
+    """
+    # Sort on the decoded values so rows come back in the order they were written
+    entries = sorted((unquote(name.split("=", 1)[1]), name) for name in os.listdir(root) if "=" in name)
+    if not entries:
+        return pd.DataFrame(columns=columns)
+    partition_col = entries[0][1].split("=", 1)[0]
+    values = [value for value, _ in entries]
+
+    keep, row_filters = _split_filters(filters, partition_col)
+    file_columns = None if columns is None else [c for c in columns if c != partition_col]
+
+    frames = []
+    for code, (value, name) in enumerate(entries):
+        if keep is not None and value not in keep:
+            continue
+        path = os.path.join(root, name, "part-0.parquet")
+        part = pq.read_table(path, columns=file_columns, filters=row_filters or None).to_pandas()
+        if columns is None or partition_col in columns:
+            codes = np.full(len(part), code, dtype=np.int32)
+            part.insert(0, partition_col, pd.Categorical.from_codes(codes, categories=values))
+        frames.append(part)
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    data = pd.concat(frames, ignore_index=True)
+    # Partitions written separately may carry different categories, which concat turns into objects
+    for column in CATEGORICAL_COLUMNS:
+        if column in data.columns and data[column].dtype == object:
+            data[column] = data[column].astype('category')
+    return data if columns is None else data[columns]
+
+
+def save_frame(data, path, partition_by=None):
+    """
+    Saves a frame in the format given by the path: '.csv' and '.feather' files, otherwise
+    Parquet (a directory partitioned by `partition_by` when given).
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if path.endswith(".csv"):
+        data.to_csv(path, index=False)
+    elif path.endswith(".feather"):
+        # Feather needs a default index; setting it avoids the copy of reset_index
+        data = compact_dtypes(data)
+        data.index = pd.RangeIndex(len(data))
+        feather.write_feather(data, path, compression="zstd")
+    elif partition_by is not None:
+        write_partitioned(data, path, partition_col=partition_by)
+    else:
+        pq.write_table(pa.Table.from_pandas(compact_dtypes(data), preserve_index=False), path, compression="zstd")
+
+
+def load_frame(path, columns=None, filters=None):
+    """
+    Loads a frame saved by `save_frame`, reading only the requested columns and rows.
+    Args:
+        path (str): CSV, Feather or Parquet file, or partitioned Parquet directory.
+        columns (list): Columns to load (all when None).
+        filters (list): Conjunction of (column, op, value) tuples, e.g.
+            [('producto', '==', 'arroz'), ('fechaCaptura', '>=', pd.Timestamp('2024-01-01'))].
+    Returns:
+        pd.DataFrame: The loaded frame.
+    """
+    if os.path.isdir(path):
+        return read_partitioned(path, columns=columns, filters=filters)
+    if path.endswith(".csv"):
+        header = pd.read_csv(path, nrows=0).columns
+        wanted = header if columns is None else columns
+        data = pd.read_csv(path, usecols=columns, parse_dates=[c for c in DATE_COLUMNS if c in wanted])
+    elif path.endswith(".feather"):
+        data = feather.read_feather(path, columns=columns)
+    else:
+        return pq.read_table(path, columns=columns, filters=filters or None).to_pandas()
+
+    # CSV and Feather have no predicate pushdown, so filter after loading
+    for column, op, value in filters or []:
+        data = data[_mask(data[column], op, value)]
+    return data
+
+
+def _mask(values, op, value):
+    if op in ('=', '=='):
+        return values == value
+    if op == '!=':
+        return values != value
+    if op == 'in':
+        return values.isin(value)
+    if op == 'not in':
+        return ~values.isin(value)
+    return {'<': values.__lt__, '<=': values.__le__, '>': values.__gt__, '>=': values.__ge__}[op](value)
@@ -0,0 +1,162 @@
+import sqlite3
+import threading
+
+import pandas as pd
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    cod_producto INTEGER
+);
+CREATE TABLE IF NOT EXISTS cities (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+-- Clustered on (product, city, date): one series is a contiguous range of the primary key
+CREATE TABLE IF NOT EXISTS prices (
+    product_id INTEGER NOT NULL REFERENCES products(id),
+    city_id INTEGER NOT NULL REFERENCES cities(id),
+    fecha_captura TEXT NOT NULL,
+    precio_promedio REAL,
+    fecha_creacion TEXT,
+    PRIMARY KEY (product_id, city_id, fecha_captura)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS prices_city_product_date ON prices (city_id, product_id, fecha_captura);
+"""
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _format_dates(values):
+    values = pd.to_datetime(values)
+    if values.dt.tz is not None:
+        values = values.dt.tz_localize(None)
+    return values.dt.strftime(DATE_FORMAT)
+
+
+class PriceStore:
+    """
+    SQLite store of SIPSA prices, normalized into products, cities and prices tables.
+
+    Series lookups walk the (product, city, fecha_captura) primary key, so reading one
+    series costs the same whatever the total size of the history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _dimension_ids(self, table, names, codes=None):
+        # Inserts unseen names and returns the id of every name
+        rows = [(name,) for name in names] if codes is None else list(zip(names, codes))
+        if codes is None:
+            self._conn.executemany(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", rows)
+        else:
+            self._conn.executemany(f"INSERT OR IGNORE INTO {table} (name, cod_producto) VALUES (?, ?)", rows)
+        return dict(self._conn.execute(f"SELECT name, id FROM {table}"))
+
+    def upsert_prices(self, data, batch_size=50_000):
+        """
+        Bulk inserts cleaned prices, replacing the price of rows already stored for the same
+        product, city and capture date.
+        Args:
+            data (pd.DataFrame): Cleaned data with producto, ciudad, fechaCaptura and precioPromedio
+                (codProducto and fechaCreacion are stored when present).
+            batch_size (int): Rows sent to SQLite per executemany call.
+        Returns:
+            int: Number of rows written.
+        """
+        if data.empty:
+            return 0
+
+        products = data.drop_duplicates('producto')
+        product_codes = products['codProducto'].tolist() if 'codProducto' in data.columns else None
+
+        with self._lock, self._conn:
+            product_ids = self._dimension_ids('products', products['producto'].astype(str).tolist(), product_codes)
+            city_ids = self._dimension_ids('cities', data['ciudad'].astype(str).unique().tolist())
+
+            rows = pd.DataFrame({
+                'product_id': data['producto'].astype(str).map(product_ids),
+                'city_id': data['ciudad'].astype(str).map(city_ids),
+                'fecha_captura': _format_dates(data['fechaCaptura']),
+                'precio_promedio': data['precioPromedio'].astype(float),
+                'fecha_creacion': (_format_dates(data['fechaCreacion']) if 'fechaCreacion' in data.columns
+                                   else None),
+            })
+            rows = rows.astype(object).where(rows.notna(), None)
+
+            statement = """
+                INSERT INTO prices (product_id, city_id, fecha_captura, precio_promedio, fecha_creacion)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (product_id, city_id, fecha_captura) DO UPDATE SET
+                    precio_promedio = excluded.precio_promedio,
+                    fecha_creacion = excluded.fecha_creacion
+            """
+            records = rows.itertuples(index=False, name=None)
+            written = 0
+            while True:
+                batch = [record for _, record in zip(range(batch_size), records)]
+                if not batch:
+                    break
+                self._conn.executemany(statement, batch)
+                written += len(batch)
+        return written
+
+    def _query(self, sql, params):
+        with self._lock:
+            return pd.read_sql_query(sql, self._conn, params=params, parse_dates=['fechaCaptura'])
+
+    @staticmethod
+    def _date_range(start, end):
+        # Optional bounds on fecha_captura, both inclusive
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("AND p.fecha_captura >= ?")
+            params.append(pd.Timestamp(start).strftime(DATE_FORMAT))
+        if end is not None:
+            clauses.append("AND p.fecha_captura <= ?")
+            params.append(pd.Timestamp(end).strftime(DATE_FORMAT))
+        return " ".join(clauses), params
+
+    def get_series(self, producto, ciudad, start=None, end=None):
+        """Prices of one (producto, ciudad) pair between two optional dates, in date order."""
+        range_sql, range_params = self._date_range(start, end)
+        sql = f"""
+            SELECT p.fecha_captura AS fechaCaptura, p.precio_promedio AS precioPromedio
+            FROM prices p
+            WHERE p.product_id = (SELECT id FROM products WHERE name = ?)
+              AND p.city_id = (SELECT id FROM cities WHERE name = ?)
+              {range_sql}
+            ORDER BY p.fecha_captura
+        """
+        return self._query(sql, [producto, ciudad, *range_params])
+
+    def get_product(self, producto, start=None, end=None):
+        """Prices of a product in every city between two optional dates, ordered by city and date."""
+        range_sql, range_params = self._date_range(start, end)
+        sql = f"""
+            SELECT c.name AS ciudad, p.fecha_captura AS fechaCaptura, p.precio_promedio AS precioPromedio
+            FROM prices p JOIN cities c ON c.id = p.city_id
+            WHERE p.product_id = (SELECT id FROM products WHERE name = ?)
+              {range_sql}
+            ORDER BY c.name, p.fecha_captura
+        """
+        return self._query(sql, [producto, *range_params])
+
+    def products(self):
+        with self._lock:
+            return [name for (name,) in self._conn.execute("SELECT name FROM products ORDER BY name")]
+
+    def cities(self):
+        with self._lock:
+            return [name for (name,) in self._conn.execute("SELECT name FROM cities ORDER BY name")]
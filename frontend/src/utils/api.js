@@ -39,9 +39,53 @@ export const fetchPriceData = async (productId, cityName) => {
 };
 
 /**
- * Fetches product purchase recommendations
+ * Fetches the daily prices of many product-city pairs in one request.
+ * The backend streams one NDJSON line per pair; onSeries is called with each series
+ * as soon as it arrives, so charts can render before the whole batch is read.
+ * Each series is { productId, city, dates, prices } or { productId, city, error }.
  */
-export const fetchRecommendations = async () => {
+export const fetchPriceSeriesBatch = async (pairs, { start, end, onSeries } = {}) => {
+  const series = [];
+  try {
+    const response = await fetch(`${API_BASE_URL}/price-series`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ pairs, start, end }),
+    });
+    
+    if (!response.ok) {
+      throw new Error(`API error: ${response.status}`);
+    }
+    
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffered = '';
+    const handleLine = (line) => {
+      if (!line.trim()) return;
+      const item = JSON.parse(line);
+      series.push(item);
+      if (onSeries) onSeries(item);
+    };
+    
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffered += decoder.decode(value, { stream: true });
+      const lines = buffered.split('\n');
+      buffered = lines.pop();
+      lines.forEach(handleLine);
+    }
+    handleLine(buffered + decoder.decode());
+  } catch (error) {
+    console.error('Error fetching price series:', error);
+  }
+  return series;
+};
+
+/**
+ * Fetches product purchase recommendations for a city, strongest trends first
+ */
+export const fetchRecommendations = async (cityName = 'bogotá, d.c.', limit = 3, offset = 0) => {
   if (!USE_REAL_DATA) {
     // Use mock data (original implementation)
     await new Promise(resolve => setTimeout(resolve, 700));
@@ -50,7 +94,8 @@ export const fetchRecommendations = async () => {
   
   try {
     // Use real API
-    const response = await fetch(`${API_BASE_URL}/recommendations`);
+    const params = new URLSearchParams({ city: cityName, limit, offset });
+    const response = await fetch(`${API_BASE_URL}/recommendations?${params}`);
     
     if (!response.ok) {
       throw new Error(`API error: ${response.status}`);
@@ -0,0 +1,55 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "data"))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+CITIES = ["bogotá, d.c.", "medellín"]
+PRODUCTS = ["arroz", "papa"]
+
+
+def price_frame(days=90):
+    """Small cleaned-looking frame: every product in every city, one price per day."""
+    rng = np.random.default_rng(0)
+    dates = pd.date_range("2023-11-01", periods=days, freq="D", tz="America/Bogota")
+    frames = []
+    for producto in PRODUCTS:
+        for ciudad in CITIES:
+            frames.append(pd.DataFrame({
+                'producto': producto,
+                'ciudad': ciudad,
+                'fechaCaptura': dates,
+                'precioPromedio': np.round(rng.uniform(1000, 5000) * np.exp(np.cumsum(rng.normal(0, 0.02, days)))),
+            }))
+    return pd.concat(frames, ignore_index=True)
+
+
+@pytest.fixture
+def build_client(tmp_path, monkeypatch):
+    """
+    Returns a function that serves a frame through the API and gives a TestClient for it.
+    With a `snapshot_dir`, the first call writes the analysis snapshot and later ones open it.
+    """
+    from fastapi.testclient import TestClient
+    from data_cleaning.clean_data import save_cleaned_data
+    from snapshot import build_snapshot
+    import main
+
+    def build(data, snapshot_dir=None):
+        cleaned_path = str(tmp_path / "cleaned")
+        params_path = str(tmp_path / "params.csv")
+        if not os.path.exists(cleaned_path):
+            save_cleaned_data(data, cleaned_path)
+            pd.DataFrame(columns=['producto', 'ciudad', 'p', 'd', 'q']).to_csv(params_path, index=False)
+        snapshot = build_snapshot(str(tmp_path / "raw.csv"), cleaned_path, params_path, snapshot_dir)
+        monkeypatch.setattr(main, "snapshot", snapshot)
+        main.response_cache.set_version(snapshot.version)
+        # Not entered as a context manager, so the startup reload does not run
+        return TestClient(main.app)
+
+    return build
@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from conftest import price_frame
+from analysis.indicators import compute_indicators
+from storage.analysis_snapshot import open_analysis_snapshot, write_analysis_snapshot
+
+
+def test_columns_are_read_in_place(tmp_path):
+    data = compute_indicators(price_frame().astype({'producto': 'category', 'ciudad': 'category'}))
+    write_analysis_snapshot(data, str(tmp_path), sources=[])
+    opened, series_index, manifest, mapped_bytes = open_analysis_snapshot(str(tmp_path), sources=[])
+
+    pd.testing.assert_frame_equal(opened, data.reset_index(drop=True))
+    # Every column but the booleans is a read-only view of the file
+    in_place = [column for column in data.columns if data[column].dtype != bool]
+    expected = sum(opened[column].cat.codes.nbytes if opened[column].dtype == 'category' else opened[column].array.nbytes
+                   for column in in_place)
+    assert mapped_bytes == expected
+    assert not np.asarray(opened['precioPromedio']).flags.writeable
+
+
+def test_api_serves_an_opened_snapshot(build_client, tmp_path):
+    snapshot_dir = str(tmp_path / "snapshot")
+    build_client(price_frame(), snapshot_dir)
+    client = build_client(None, snapshot_dir)  # Opens what the first build wrote
+
+    import main
+    assert main.snapshot.mapped_bytes > 0
+    assert main.snapshot.data_bytes < main.snapshot.mapped_bytes
+    for path in ("/recommendations", "/product-detail/0", "/price-data/0/medellín"):
+        assert client.get(path).status_code == 200, path
+    response = client.post("/price-series", json={"pairs": [{"productId": 1, "city": "bogotá, d.c."}]})
+    assert response.status_code == 200
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import price_frame
+from data_cleaning.clean_data import clean_data_streaming, load_and_clean_data, load_cleaned_data
+
+
+def raw_frame():
+    """Raw-looking prices: messy names, missing dates, zero and missing prices, and duplicates far apart."""
+    data = price_frame(days=30).sample(frac=1, random_state=0).reset_index(drop=True)
+    rng = np.random.default_rng(2)
+    data['producto'] = np.where(rng.random(len(data)) < 0.3, data['producto'].str.upper() + " ", data['producto'])
+    data.loc[rng.random(len(data)) < 0.1, 'precioPromedio'] = 0
+    data.loc[rng.random(len(data)) < 0.05, 'precioPromedio'] = np.nan
+    data.loc[rng.random(len(data)) < 0.05, 'ciudad'] = " "
+    dates = data['fechaCaptura'].map(lambda date: date.isoformat())
+    dates[rng.random(len(data)) < 0.05] = None
+    raw = pd.DataFrame({
+        'producto': data['producto'],
+        'ciudad': data['ciudad'],
+        'precioPromedio': data['precioPromedio'],
+        'fechaCaptura': dates,
+        'fechaCreacion': dates,
+    })
+    # Every tenth row again at the end, in other chunks than the first copy
+    return pd.concat([raw, raw.iloc[::10]], ignore_index=True)
+
+
+@pytest.mark.filterwarnings("error::pandas.errors.SettingWithCopyWarning")
+@pytest.mark.parametrize("chunksize", [7, 50])
+def test_streaming_matches_in_memory_cleaning(tmp_path, chunksize):
+    raw_path = tmp_path / "raw.csv"
+    raw_frame().to_csv(raw_path, index=False)
+    output_path = str(tmp_path / "cleaned")
+
+    stats = clean_data_streaming(str(raw_path), output_path, chunksize=chunksize)
+    expected = load_and_clean_data(str(raw_path))
+    assert stats['duplicates'] > 0
+    assert stats['rows_written'] == len(expected)
+
+    streamed = load_cleaned_data(output_path)
+    expected = expected[streamed.columns].reset_index(drop=True)
+    for column in ('producto', 'ciudad'):
+        streamed[column] = streamed[column].astype(str)
+        expected[column] = expected[column].astype(str)
+    pd.testing.assert_frame_equal(streamed, expected, check_dtype=False)
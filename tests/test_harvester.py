@@ -0,0 +1,58 @@
+import csv
+
+import pytest
+
+from raw.harvester import SIPSA_METHODS, harvest
+from raw.sipsa_stub import start_stub_server
+
+
+@pytest.fixture
+def stub():
+    # Five rows per capture date: 12 rows end two rows into the third day
+    server, wsdl = start_stub_server(rows=12, rows_per_day=5)
+    yield server, wsdl
+    server.shutdown()
+
+
+def read_log(path):
+    with open(path, newline="", encoding="utf-8") as handle:
+        return list(csv.reader(handle))
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_rows_published_later_on_the_watermark_day_are_kept(stub, tmp_path, streaming):
+    server, wsdl = stub
+    methods = list(SIPSA_METHODS)
+    harvest(methods, out_dir=str(tmp_path), wsdl=wsdl, workers=2, incremental=True, streaming=streaming)
+    # Three more rows of the watermark day, then a new day
+    server.rows = 20
+    harvest(methods, out_dir=str(tmp_path), wsdl=wsdl, workers=2, incremental=True, streaming=streaming)
+    # Nothing new
+    results = harvest(methods, out_dir=str(tmp_path), wsdl=wsdl, workers=2, incremental=True, streaming=streaming)
+    assert [result['rows'] for result in results] == [0] * len(methods)
+
+    for method in methods:
+        header, *rows = read_log(tmp_path / f"{method}.log.csv")
+        assert len(rows) == 20, method
+    header, *rows = read_log(tmp_path / "promediosSipsaCiudad.log.csv")
+    ids = [int(row[header.index('regId')]) for row in rows]
+    assert sorted(ids) == list(range(212186, 212186 + 20))
+
+
+def test_partial_last_line_is_dropped(stub, tmp_path):
+    server, wsdl = stub
+    method = 'promediosSipsaCiudad'
+    log_path = tmp_path / f"{method}.log.csv"
+    harvest([method], out_dir=str(tmp_path), wsdl=wsdl, incremental=True)
+    complete = log_path.read_bytes()
+    # A crash mid-append: the row is cut off in its price, and the watermark was not moved
+    server.rows = 14
+    harvest([method], out_dir=str(tmp_path / "other"), wsdl=wsdl, incremental=True)
+    next_row = (tmp_path / "other" / f"{method}.log.csv").read_bytes().splitlines(keepends=True)[13]
+    log_path.write_bytes(complete + next_row[:next_row.index(b"2083") + 2])
+
+    harvest([method], out_dir=str(tmp_path), wsdl=wsdl, incremental=True)
+    header, *rows = read_log(log_path)
+    assert all(len(row) == len(header) for row in rows)
+    assert sorted(int(row[header.index('regId')]) for row in rows) == list(range(212186, 212186 + 14))
+    assert {row[header.index('precioPromedio')] for row in rows} == {'2083'}
@@ -0,0 +1,58 @@
+import numpy as np
+
+from conftest import price_frame
+from analysis.indicators import INDICATOR_COLUMNS, compute_indicators
+from analysis.indicator_state import build_indicator_state, update_indicators
+from data_cleaning.clean_data import save_cleaned_data
+import run_analysis
+
+# Rolling standard deviations, within the tolerance documented by `update_indicators`
+APPROXIMATE_COLUMNS = ('volatility', 'z_score')
+
+
+def assert_indicators_equal(expected, result):
+    for column in INDICATOR_COLUMNS:
+        want, got = expected[column].to_numpy(dtype=np.float64), result[column].to_numpy(dtype=np.float64)
+        if column in APPROXIMATE_COLUMNS:
+            assert np.allclose(want, got, rtol=1e-7, atol=0, equal_nan=True), column
+        else:
+            assert np.array_equal(want, got, equal_nan=True), column
+
+
+def with_gaps(data):
+    prices = data['precioPromedio'].to_numpy(dtype=np.float64).copy()
+    prices[np.random.default_rng(1).random(len(prices)) < 0.05] = np.nan
+    return data.assign(precioPromedio=prices)
+
+
+def test_history_plus_one_update_matches_full_recompute():
+    data = with_gaps(price_frame())
+    is_new = (data['fechaCaptura'] == data['fechaCaptura'].max()).to_numpy()
+    state = build_indicator_state(data[~is_new])
+
+    result, state = update_indicators(state, state.unseen_rows(data))
+    expected = compute_indicators(data.copy())
+    assert result.index.equals(data.index[is_new])
+    assert_indicators_equal(expected[is_new], result)
+    assert state.latest_date() == data['fechaCaptura'].max()
+
+
+def test_daily_update_applies_only_the_new_rows(tmp_path):
+    data = price_frame()
+    cleaned_path, state_path = str(tmp_path / "cleaned"), str(tmp_path / "state.npz")
+    output_path = str(tmp_path / "daily.parquet")
+    # The full analysis leaves the state of the history...
+    is_new = (data['fechaCaptura'] == data['fechaCaptura'].max()).to_numpy()
+    save_cleaned_data(data[~is_new], cleaned_path)
+    run_analysis.indicator_state_stage(run_analysis.load_cleaned_data(cleaned_path), state_path)
+
+    # ...then a new day is cleaned
+    save_cleaned_data(data, cleaned_path)
+    daily = run_analysis.daily_update(cleaned_path, state_path, output_path)
+    assert len(daily) == is_new.sum()
+    assert (daily['fechaCaptura'] == data['fechaCaptura'].max()).all()
+    expected = compute_indicators(data.copy())[is_new]
+    assert_indicators_equal(expected.reset_index(drop=True), daily.reset_index(drop=True))
+
+    # Nothing new the next day
+    assert run_analysis.daily_update(cleaned_path, state_path, output_path).empty
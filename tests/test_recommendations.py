@@ -0,0 +1,16 @@
+from conftest import price_frame
+
+
+def test_default_city_is_served(build_client):
+    client = build_client(price_frame())
+    response = client.get("/recommendations")
+    assert response.status_code == 200
+    body = response.json()
+    assert 0 < len(body) <= 3
+    assert {item['product'] for item in body} <= {'arroz', 'papa'}
+
+
+def test_city_is_matched_case_insensitively(build_client):
+    client = build_client(price_frame())
+    assert client.get("/recommendations", params={"city": " MEDELLÍN "}).status_code == 200
+    assert client.get("/recommendations", params={"city": "cali"}).status_code == 404
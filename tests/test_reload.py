@@ -0,0 +1,27 @@
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+from snapshot import empty_snapshot
+
+
+def test_empty_snapshots_share_no_mutable_defaults():
+    first, second = empty_snapshot(), empty_snapshot()
+    assert first.sources == () and second.sources == ()
+    assert not isinstance(first.stage_seconds, dict)
+
+
+def test_finished_reload_tasks_are_released(monkeypatch):
+    async def reload_data(force=False):
+        return False
+
+    monkeypatch.setattr(main, "reload_data", reload_data)
+    monkeypatch.setattr(main, "refresh_seconds", 0)
+    with TestClient(main.app) as client:
+        for _ in range(5):
+            assert client.post("/data-reload", params={"force": True}).status_code == 200
+        deadline = time.monotonic() + 5
+        while main.app.state.background_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert not main.app.state.background_tasks
@@ -0,0 +1,21 @@
+import pandas as pd
+import pytest
+
+from pipeline.runner import Stage, run_stages, stage_key
+
+
+def constant(value=1):
+    return pd.DataFrame({'value': [value]})
+
+
+def test_default_params_are_not_shared_state(tmp_path):
+    stage = Stage('constant', constant)
+    with pytest.raises(TypeError):
+        stage.params['value'] = 2
+    # A read-only default hashes like an empty dict, so existing cache keys stay valid
+    assert stage_key(stage, []) == stage_key(stage._replace(params={}), [])
+
+    stages = [stage, Stage('other', constant, params={'value': 3})]
+    assert {entry['status'] for entry in run_stages(stages, str(tmp_path))} == {'ran'}
+    assert {entry['status'] for entry in run_stages(stages, str(tmp_path))} == {'cached'}
+    assert Stage('again', constant).params == {}
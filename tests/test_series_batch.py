@@ -0,0 +1,23 @@
+import json
+
+import numpy as np
+
+from conftest import price_frame
+
+
+def reject_constant(token):
+    # JSON.parse rejects NaN and Infinity, which Python's json accepts by default
+    raise ValueError(f"invalid JSON constant {token}")
+
+
+def test_missing_prices_are_valid_json(build_client):
+    data = price_frame(days=5)
+    data.loc[2, 'precioPromedio'] = np.nan  # Third day of the first pair
+    client = build_client(data)
+
+    response = client.post("/price-series", json={"pairs": [{"productId": 0, "city": "bogotá, d.c."}]})
+    assert response.status_code == 200
+    line = json.loads(response.content.splitlines()[0], parse_constant=reject_constant)
+    assert len(line["dates"]) == len(line["prices"]) == 5
+    assert line["prices"][2] is None
+    assert all(isinstance(price, float) for i, price in enumerate(line["prices"]) if i != 2)
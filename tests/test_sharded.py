@@ -0,0 +1,26 @@
+import pandas as pd
+
+from conftest import price_frame
+from test_trend import in_thread
+from pipeline.sharded import analyze_sharded
+
+
+def shard_input():
+    data = price_frame()
+    data['año'] = data['fechaCaptura'].dt.year.astype('int16')
+    data['mes'] = data['fechaCaptura'].dt.month.astype('int8')
+    return data[['producto', 'ciudad', 'año', 'mes', 'precioPromedio']].astype({'producto': 'category', 'ciudad': 'category'})
+
+
+def test_workers_and_threads_match_serial(tmp_path):
+    data = shard_input()
+    # No ARIMA orders, so only the vectorized stages run
+    params = tmp_path / "params.csv"
+    pd.DataFrame(columns=['producto', 'ciudad', 'p', 'd', 'q']).to_csv(params, index=False)
+    kwargs = {'n_shards': 2, 'trend_kwargs': {'param_path': str(params)}}
+
+    serial = analyze_sharded(data, n_workers=1, **kwargs)
+    for result in (analyze_sharded(data, n_workers=2, **kwargs), in_thread(analyze_sharded, data, n_workers=1, **kwargs)):
+        assert result.keys() == serial.keys()
+        for name, frame in result.items():
+            pd.testing.assert_frame_equal(frame, serial[name], obj=name)
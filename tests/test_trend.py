@@ -0,0 +1,40 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import price_frame
+from analysis.trend import compute_trend_slopes
+
+
+@pytest.fixture
+def param_path(tmp_path):
+    path = tmp_path / "params.csv"
+    pairs = price_frame()[['producto', 'ciudad']].drop_duplicates()
+    pairs.assign(p=1, d=1, q=0).to_csv(path, index=False)
+    return str(path)
+
+
+def in_thread(func, *args, **kwargs):
+    # Runs `func` off the main thread, as the stages of the pipeline runner do
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=func(*args, **kwargs)))
+    thread.start()
+    thread.join()
+    return result['value']
+
+
+def test_pool_and_thread_match_serial(param_path):
+    data = price_frame()
+    serial = compute_trend_slopes(data, param_path, n_jobs=1)
+    assert serial['trend_slope'].notna().any()
+    pd.testing.assert_frame_equal(compute_trend_slopes(data, param_path, n_jobs=2, chunksize=1), serial)
+    pd.testing.assert_frame_equal(in_thread(compute_trend_slopes, data, param_path, n_jobs=1), serial)
+
+
+def test_fit_timeout_is_enforced_off_the_main_thread(param_path):
+    data = price_frame()
+    assert compute_trend_slopes(data, param_path, n_jobs=1)['trend_slope'].notna().any()
+    slopes = in_thread(compute_trend_slopes, data, param_path, n_jobs=1, fit_timeout=1e-6)
+    assert np.isnan(slopes['trend_slope']).all()